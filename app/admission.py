@@ -0,0 +1,201 @@
+import asyncio
+import math
+import os
+import re
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Deque, Dict, List, Optional
+from urllib.parse import parse_qs
+
+from anyio import to_thread
+from starlette.responses import JSONResponse
+
+from .database import THREADPOOL_SIZE
+
+# --- Controllo di ammissione ---
+# Gli endpoint sincroni condividono il threadpool di Starlette (THREADPOOL_SIZE
+# thread, dimensione a cui è legato anche il pool di connessioni in database.py).
+# Senza limiti una raffica di richieste pesanti (liste con limit alto, export,
+# match) occupa tutti i thread e anche /api/health resta in coda. Il middleware
+# assegna ogni richiesta a una classe con il proprio limite di concorrenza:
+# oltre il limite la richiesta attende in coda al più ADMISSION_<CLASSE>_QUEUE_TIMEOUT
+# secondi (e la coda non supera ADMISSION_<CLASSE>_MAX_QUEUE), poi riceve 503 con
+# Retry-After invece di far crescere la latenza di tutte le altre.
+# I limiti di default sommati restano sotto THREADPOOL_SIZE: i thread liberi
+# servono le route escluse (health, metriche, stream delle modifiche, frontend).
+# Occupazione, code e rifiuti sono esposti su /api/metrics. Valori per processo.
+ADMISSION_CONTROL_ENABLED = os.getenv("ADMISSION_CONTROL_ENABLED", "true").lower() in ("1", "true", "yes")
+# GET /api/resources con limit oltre questa soglia è considerata pesante
+ADMISSION_HEAVY_LIMIT = int(os.getenv("ADMISSION_HEAVY_LIMIT", "1000"))
+# Thread lasciati alle route escluse dal controllo
+RESERVED_THREADS = 4
+
+# Richieste mai accodate: sonde, metriche, stream di lunga durata e frontend
+EXEMPT_PATHS = {"/api/health", "/api/metrics", "/api/changes"}
+HEAVY_ROUTES = [
+    re.compile(r"^/api/export/"),
+    re.compile(r"^/api/import/"),
+    re.compile(r"^/api/batch$"),
+    re.compile(r"^/api/match$"),
+    re.compile(r"^/api/history/trend$"),
+    re.compile(r"^/api/resources/\d+/similar$"),
+    re.compile(r"^/api/skills/\d+/related$"),
+]
+READ_METHODS = ("GET", "HEAD")
+
+
+def _setting(class_name: str, key: str, default: float) -> float:
+    return float(os.getenv(f"ADMISSION_{class_name.upper()}_{key}", str(default)))
+
+
+@dataclass
+class RouteClass:
+    name: str
+    limit: int
+    queue_timeout: float
+    max_queue: int
+    active: int = 0
+    admitted: int = 0
+    # motivo ("queue_full", "timeout") -> richieste rifiutate
+    rejected: Dict[str, int] = field(default_factory=lambda: {"queue_full": 0, "timeout": 0})
+    _waiters: Deque[asyncio.Future] = field(default_factory=deque)
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    # Eseguiti solo sull'event loop: non servono lock
+    async def acquire(self) -> Optional[str]:
+        """None se la richiesta può procedere, altrimenti il motivo del rifiuto"""
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            self.admitted += 1
+            return None
+        if len(self._waiters) >= self.max_queue or self.queue_timeout <= 0:
+            self.rejected["queue_full"] += 1
+            return "queue_full"
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            # shield: il posto potrebbe arrivare proprio mentre scade il timeout
+            await asyncio.wait_for(asyncio.shield(waiter), self.queue_timeout)
+        except asyncio.TimeoutError:
+            if not waiter.done():
+                waiter.cancel()
+                self._discard(waiter)
+                self.rejected["timeout"] += 1
+                return "timeout"
+        except asyncio.CancelledError:
+            # Client disconnesso in coda: se il posto era già stato ceduto va restituito
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            else:
+                waiter.cancel()
+                self._discard(waiter)
+            raise
+        self.admitted += 1
+        return None
+
+    def release(self):
+        # Il posto passa direttamente al primo in coda ancora in attesa
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+    def _discard(self, waiter: asyncio.Future):
+        try:
+            self._waiters.remove(waiter)
+        except ValueError:
+            pass
+
+
+def _default_classes() -> Dict[str, RouteClass]:
+    heavy = max(1, THREADPOOL_SIZE // 10)
+    write = max(1, THREADPOOL_SIZE // 5)
+    light = max(1, THREADPOOL_SIZE - RESERVED_THREADS - heavy - write)
+    defaults = [
+        # (nome, concorrenza, attesa massima in coda (s), lunghezza massima della coda)
+        ("light", light, 2.0, 200),
+        ("heavy", heavy, 1.0, 8),
+        ("write", write, 5.0, 50),
+    ]
+    return {
+        name: RouteClass(
+            name=name,
+            limit=int(_setting(name, "CONCURRENCY", limit)),
+            queue_timeout=_setting(name, "QUEUE_TIMEOUT", timeout),
+            max_queue=int(_setting(name, "MAX_QUEUE", max_queue)),
+        )
+        for name, limit, timeout, max_queue in defaults
+    }
+
+route_classes = _default_classes()
+
+
+def classify(method: str, path: str, query_string: bytes) -> Optional[str]:
+    """Classe della richiesta, oppure None se è esclusa dal controllo"""
+    if method == "OPTIONS" or not path.startswith("/api/") or path in EXEMPT_PATHS:
+        return None
+    if any(pattern.match(path) for pattern in HEAVY_ROUTES):
+        return "heavy"
+    if method not in READ_METHODS:
+        return "write"
+    if path == "/api/resources" and query_string:
+        limits = parse_qs(query_string.decode("latin-1")).get("limit", [])
+        if any(value.isdigit() and int(value) > ADMISSION_HEAVY_LIMIT for value in limits):
+            return "heavy"
+    return "light"
+
+
+def configure_threadpool():
+    """Dimensiona il threadpool di Starlette; va chiamata con l'event loop attivo (lifespan)"""
+    to_thread.current_default_thread_limiter().total_tokens = THREADPOOL_SIZE
+
+
+class AdmissionControlMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        name = classify(scope["method"], scope["path"], scope.get("query_string", b""))
+        if name is None:
+            return await self.app(scope, receive, send)
+
+        route_class = route_classes[name]
+        reason = await route_class.acquire()
+        if reason is not None:
+            retry_after = max(1, math.ceil(route_class.queue_timeout))
+            response = JSONResponse(
+                status_code=503,
+                content={"detail": "Servizio sovraccarico: riprovare più tardi."},
+                headers={"Retry-After": str(retry_after), "X-Admission-Class": name},
+            )
+            return await response(scope, receive, send)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            route_class.release()
+
+
+def render_metrics() -> List[str]:
+    """Righe in formato Prometheus per /api/metrics"""
+    classes = sorted(route_classes.values(), key=lambda c: c.name)
+    lines = ["# HELP admission_limit Richieste contemporanee ammesse per classe.", "# TYPE admission_limit gauge"]
+    lines += [f'admission_limit{{class="{c.name}"}} {c.limit}' for c in classes]
+    lines += ["# HELP admission_active Richieste in esecuzione per classe.", "# TYPE admission_active gauge"]
+    lines += [f'admission_active{{class="{c.name}"}} {c.active}' for c in classes]
+    lines += ["# HELP admission_queued Richieste in coda per classe.", "# TYPE admission_queued gauge"]
+    lines += [f'admission_queued{{class="{c.name}"}} {c.queued}' for c in classes]
+    lines += ["# HELP admission_admitted_total Richieste ammesse per classe.", "# TYPE admission_admitted_total counter"]
+    lines += [f'admission_admitted_total{{class="{c.name}"}} {c.admitted}' for c in classes]
+    lines += ["# HELP admission_rejected_total Richieste rifiutate con 503 per classe e motivo.", "# TYPE admission_rejected_total counter"]
+    lines += [
+        f'admission_rejected_total{{class="{c.name}",reason="{reason}"}} {count}'
+        for c in classes for reason, count in sorted(c.rejected.items())
+    ]
+    return lines
@@ -0,0 +1,238 @@
+import heapq
+import re
+import threading
+import unicodedata
+from bisect import bisect_left, insort
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy.orm import Session
+
+from . import events, models
+
+# --- Ricerca mentre si digita (GET /api/autocomplete) ---
+# Indice in memoria su nome, cognome ed email delle risorse e sui nomi di skill
+# e business unit. I testi sono normalizzati (minuscole, senza accenti) e divisi
+# in token: una lista ordinata di token risolve i prefissi con una ricerca
+# binaria, un indice di trigrammi trova le sottostringhe interne alle parole
+# ("ross" in "De Rossi"). Come gli altri indici viene costruito al primo
+# utilizzo e poi aggiornato dagli eventi emessi da crud.py.
+
+TYPES = ("resource", "skill", "business_unit")
+
+Key = Tuple[str, int]
+
+
+@dataclass
+class Entry:
+    type: str
+    id: int
+    label: str
+    detail: Optional[str]
+    tokens: Tuple[str, ...]
+    normalized_label: str
+
+
+def normalize(text: str) -> str:
+    decomposed = unicodedata.normalize("NFKD", text or "")
+    return "".join(char for char in decomposed if not unicodedata.combining(char)).lower()
+
+def tokenize(text: str) -> List[str]:
+    return [token for token in re.split(r"[^0-9a-z]+", normalize(text)) if token]
+
+def _trigrams(token: str) -> Set[str]:
+    return {token[i:i + 3] for i in range(len(token) - 2)}
+
+
+class AutocompleteIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: Dict[Key, Entry] = {}
+        self._tokens: List[Tuple[str, str, int]] = [] # (token, tipo, id) ordinati
+        self._trigrams: Dict[str, Set[Key]] = {}
+        self.loaded = False
+        # Incrementato da ogni caricamento completato e da reset()
+        self._generation = 0
+        self._loading = 0
+        # Eventi notificati mentre un caricamento è in corso
+        self._pending: Optional[List[events.ChangeEvent]] = None
+
+    # --- Costruzione ---
+    def load(self, db: Session, only_if_unloaded: bool = False):
+        # Query e costruzione fuori dal lock, poi scambio e riapplicazione degli
+        # eventi arrivati nel frattempo, come in search_index.SkillIndex.load
+        with self._lock:
+            generation = self._generation
+            self._loading += 1
+            if self._pending is None:
+                self._pending = []
+        try:
+            fresh = AutocompleteIndex()
+            for resource_id, nome, cognome, email in db.query(
+                models.Resource.id, models.Resource.nome, models.Resource.cognome, models.Resource.email
+            ):
+                fresh._add(_resource_entry(resource_id, nome, cognome, email), sort=False)
+            for skill_id, name in db.query(models.Skill.id, models.Skill.name):
+                fresh._add(_named_entry("skill", skill_id, name), sort=False)
+            for bu_id, name in db.query(models.BusinessUnit.id, models.BusinessUnit.name):
+                fresh._add(_named_entry("business_unit", bu_id, name), sort=False)
+            fresh._tokens.sort()
+            with self._lock:
+                # Un altro caricamento o un reset() arrivati nel frattempo hanno la precedenza;
+                # da ensure_loaded non si sostituisce un indice caricato nel frattempo
+                if self._generation == generation and not (only_if_unloaded and self.loaded):
+                    self._entries, self._tokens, self._trigrams = fresh._entries, fresh._tokens, fresh._trigrams
+                    for event in self._pending:
+                        self._apply(event)
+                    self._generation += 1
+                    self.loaded = True
+        finally:
+            with self._lock:
+                self._loading -= 1
+                if not self._loading:
+                    self._pending = None
+
+    def ensure_loaded(self, db: Session):
+        if not self.loaded:
+            self.load(db, only_if_unloaded=True)
+
+    def reset(self):
+        with self._lock:
+            self._entries, self._tokens, self._trigrams = {}, [], {}
+            self._generation += 1
+            self.loaded = False
+
+    # --- Manutenzione (chiamate con il lock acquisito) ---
+    def _add(self, entry: Entry, sort: bool = True):
+        key = (entry.type, entry.id)
+        self._remove(key)
+        self._entries[key] = entry
+        for token in set(entry.tokens):
+            if sort:
+                insort(self._tokens, (token, entry.type, entry.id))
+            else:
+                self._tokens.append((token, entry.type, entry.id))
+            for gram in _trigrams(token):
+                self._trigrams.setdefault(gram, set()).add(key)
+
+    def _remove(self, key: Key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for token in set(entry.tokens):
+            pos = bisect_left(self._tokens, (token, entry.type, entry.id))
+            if pos < len(self._tokens) and self._tokens[pos] == (token, entry.type, entry.id):
+                del self._tokens[pos]
+            for gram in _trigrams(token):
+                keys = self._trigrams.get(gram)
+                if keys is not None:
+                    keys.discard(key)
+                    if not keys:
+                        del self._trigrams[gram]
+
+    def _apply(self, event: events.ChangeEvent):
+        if event.op == "delete":
+            if event.entity in TYPES:
+                self._remove((event.entity, event.id))
+            if event.entity == "business_unit" and event.data.get("action") != "migrate":
+                for resource_id in event.data.get("resource_ids", []):
+                    self._remove(("resource", resource_id))
+        # Gli eventi senza i campi testuali non cambiano nulla di ciò che è indicizzato
+        elif event.op in ("create", "update") and event.entity == "resource" and "email" in event.data:
+            self._add(_resource_entry(event.id, event.data.get("nome"), event.data.get("cognome"), event.data["email"]))
+        elif event.op in ("create", "update") and event.entity in ("skill", "business_unit") and "name" in event.data:
+            self._add(_named_entry(event.entity, event.id, event.data["name"]))
+
+    def handle_event(self, event: events.ChangeEvent):
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append(event)
+            if self.loaded:
+                self._apply(event)
+
+    # --- Interrogazione ---
+    def _candidates(self, term: str) -> Iterable[Tuple[Key, Optional[int]]]:
+        """
+        Elementi con un token uguale al termine (punti 0), poi con un token che
+        inizia con il termine (1): nella lista ordinata sono due tratti contigui.
+        Infine quelli che potrebbero contenerlo (punti da verificare, None).
+        """
+        pos = bisect_left(self._tokens, (term,))
+        while pos < len(self._tokens) and self._tokens[pos][0].startswith(term):
+            token, type_, entity_id = self._tokens[pos]
+            yield (type_, entity_id), 0 if token == term else 1
+            pos += 1
+        if len(term) >= 3:
+            # Basta scorrere la lista più corta tra quelle dei trigrammi del termine
+            for key in min((self._trigrams.get(gram, set()) for gram in _trigrams(term)), key=len):
+                yield key, None
+
+    def search(self, query: str, limit: int = 10, types: Iterable[str] = ()) -> List[Entry]:
+        """
+        Ogni parola della query deve comparire nell'elemento come token (0 punti),
+        prefisso di un token (1) o sottostringa (2). Si parte dalla parola più lunga,
+        la più selettiva, e si valutano tutti gli elementi che la contengono: i primi
+        `limit` escono da un heap limitato. Ordinamento: punti, etichetta che inizia
+        con la query, etichetta più corta, alfabetico.
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+        wanted = set(types) or set(TYPES)
+        normalized_query = " ".join(terms)
+        anchor = max(terms, key=len)
+        others = [term for term in terms if term != anchor]
+        with self._lock:
+            seen: Set[Key] = set()
+            ranked = []
+            for key, score in self._candidates(anchor):
+                # Un elemento compare una volta per token: il primo passaggio ha i punti migliori
+                if key in seen or key[0] not in wanted:
+                    continue
+                seen.add(key)
+                entry = self._entries[key]
+                if score is None:
+                    score = _tier(entry.tokens, anchor)
+                    if score is None:
+                        continue
+                for term in others:
+                    tier = _tier(entry.tokens, term)
+                    if tier is None:
+                        break
+                    score += tier
+                else:
+                    ranked.append((
+                        score,
+                        not entry.normalized_label.startswith(normalized_query),
+                        len(entry.label),
+                        entry.normalized_label,
+                        TYPES.index(entry.type),
+                        entry.id,
+                        entry,
+                    ))
+            # L'ultima colonna non viene mai confrontata: (tipo, id) è già univoco
+            return [item[-1] for item in heapq.nsmallest(limit, ranked)]
+
+
+def _tier(tokens: Tuple[str, ...], term: str) -> Optional[int]:
+    if term in tokens:
+        return 0
+    if any(token.startswith(term) for token in tokens):
+        return 1
+    if any(term in token for token in tokens):
+        return 2
+    return None
+
+def _resource_entry(resource_id: int, nome: Optional[str], cognome: Optional[str], email: str) -> Entry:
+    label = " ".join(part for part in (nome, cognome) if part)
+    return Entry(
+        "resource", resource_id, label, email,
+        tuple(tokenize(label) + tokenize(email)), " ".join(tokenize(label)),
+    )
+
+def _named_entry(type_: str, entity_id: int, name: str) -> Entry:
+    return Entry(type_, entity_id, name, None, tuple(tokenize(name)), " ".join(tokenize(name)))
+
+
+autocomplete_index = AutocompleteIndex()
+events.subscribe(autocomplete_index.handle_event)
@@ -0,0 +1,238 @@
+import csv
+import io
+import json
+from itertools import islice
+from typing import IO, Callable, Iterator, List, Optional, Tuple, Union
+
+from pydantic import ValidationError
+from sqlalchemy import insert
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from . import crud, events, history, models
+
+# --- Import massivo di risorse e competenze ---
+# Le righe vengono lette in streaming (CSV o NDJSON) e processate a blocchi:
+# per ogni blocco BU, skill ed email già esistenti si risolvono con poche
+# query IN, gli inserimenti usano executemany e c'è un solo commit.
+#
+# CSV: colonne nome, cognome, email, numero, business_unit | business_unit_id, skills
+#      dove skills è "Java:3;Python:4" (label opzionali: "Java:3:backend|senior")
+# NDJSON: un oggetto ResourceImportRow per riga, con skills come lista di oggetti
+
+DEFAULT_CHUNK_SIZE = 1000
+MAX_REPORTED_ERRORS = 1000
+
+ParsedRow = Tuple[int, Union[models.ResourceImportRow, str]]
+
+
+def _parse_csv_skills(value: str) -> List[dict]:
+    skills = []
+    for item in filter(None, (part.strip() for part in (value or "").split(";"))):
+        name, _, rest = item.partition(":")
+        level, _, labels = rest.partition(":")
+        skill = {"level": level, "labels": [label for label in labels.split("|") if label.strip()] or None}
+        if name.strip().isdigit():
+            skill["skill_id"] = int(name)
+        else:
+            skill["skill"] = name.strip()
+        skills.append(skill)
+    return skills
+
+def _validate(data: dict) -> Union[models.ResourceImportRow, str]:
+    try:
+        return models.ResourceImportRow.model_validate(data)
+    except ValidationError as e:
+        return "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors())
+
+def parse_rows(stream: IO[bytes], fmt: str) -> Iterator[ParsedRow]:
+    """Restituisce (numero riga, riga valida oppure messaggio di errore)"""
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    if fmt == "csv":
+        for index, record in enumerate(csv.DictReader(text), start=1):
+            data = {key.strip(): (value.strip() if isinstance(value, str) else value)
+                    for key, value in record.items() if key}
+            data = {key: value for key, value in data.items() if value not in ("", None)}
+            data["skills"] = _parse_csv_skills(data.get("skills", ""))
+            yield index, _validate(data)
+    elif fmt == "ndjson":
+        index = 0
+        for line in text:
+            if not line.strip():
+                continue
+            index += 1
+            try:
+                data = json.loads(line)
+            except json.JSONDecodeError as e:
+                yield index, f"JSON non valido: {e.msg}"
+                continue
+            if not isinstance(data, dict):
+                yield index, "Ogni riga deve essere un oggetto JSON"
+                continue
+            yield index, _validate(data)
+    else:
+        raise ValueError("Formato non supportato: usare 'csv' o 'ndjson'.")
+
+
+class _Importer:
+    def __init__(self, db: Session, create_missing: bool):
+        self.db = db
+        self.create_missing = create_missing
+        self.result = models.ImportResult()
+        self.seen_emails = set()
+
+    def fail(self, row: int, error: str, email: Optional[str] = None):
+        self.result.failed += 1
+        if len(self.result.errors) < MAX_REPORTED_ERRORS:
+            self.result.errors.append(models.ImportRowError(row=row, email=email, error=error))
+
+    def _fail_all(self, errors: List[Tuple[int, str, Optional[str]]]):
+        for index, error, email in errors:
+            self.fail(index, error, email)
+
+    def _resolve_names(self, model, names, created_events: list) -> dict:
+        """{nome: id} per BU o skill, creando quelle mancanti se richiesto"""
+        if not names:
+            return {}
+        ids = dict(self.db.query(model.name, model.id).filter(model.name.in_(names)).all())
+        missing = [name for name in names if name not in ids]
+        if missing and self.create_missing:
+            objects = [model(name=name) for name in missing]
+            self.db.add_all(objects)
+            self.db.flush()
+            for obj in objects:
+                ids[obj.name] = obj.id
+                created_events.append((obj.id, obj.name))
+        return ids
+
+    def _existing_ids(self, model, ids) -> set:
+        if not ids:
+            return set()
+        return {id_ for (id_,) in self.db.query(model.id).filter(model.id.in_(ids))}
+
+    def process_chunk(self, chunk: List[ParsedRow]):
+        self.result.processed += len(chunk)
+        rows = []
+        for index, row in chunk:
+            if isinstance(row, str):
+                self.fail(index, row)
+            else:
+                rows.append((index, row))
+        if not rows:
+            return
+
+        # Gli errori del blocco diventano definitivi solo dopo il commit
+        errors: List[Tuple[int, str, Optional[str]]] = []
+        created_bus, created_skills = [], []
+        try:
+            bu_by_name = self._resolve_names(
+                models.BusinessUnit, sorted({r.business_unit for _, r in rows if r.business_unit}), created_bus)
+            bu_ids = self._existing_ids(
+                models.BusinessUnit, {r.business_unit_id for _, r in rows if r.business_unit_id is not None})
+            skill_by_name = self._resolve_names(
+                models.Skill, sorted({s.skill for _, r in rows for s in r.skills if s.skill}), created_skills)
+            skill_ids = self._existing_ids(
+                models.Skill, {s.skill_id for _, r in rows for s in r.skills if s.skill_id is not None})
+            emails = [r.email for _, r in rows]
+            existing_emails = {
+                email for (email,) in
+                self.db.query(models.Resource.email).filter(models.Resource.email.in_(emails))
+            }
+
+            accepted = []
+            for index, row in rows:
+                if row.email in existing_emails or row.email in self.seen_emails:
+                    errors.append((index, "Resource with this email already registered", row.email))
+                    continue
+                bu_id = bu_by_name.get(row.business_unit) if row.business_unit else row.business_unit_id
+                if bu_id is None or (not row.business_unit and bu_id not in bu_ids):
+                    errors.append((index, f"Business Unit non trovata: {row.business_unit or row.business_unit_id}", row.email))
+                    continue
+                skills = {}
+                error = None
+                for skill in row.skills:
+                    skill_id = skill_by_name.get(skill.skill) if skill.skill else skill.skill_id
+                    if skill_id is None or (not skill.skill and skill_id not in skill_ids):
+                        error = f"Skill non trovata: {skill.skill or skill.skill_id}"
+                        break
+                    skills[skill_id] = skill
+                if error:
+                    errors.append((index, error, row.email))
+                    continue
+                existing_emails.add(row.email)
+                accepted.append((row, bu_id, skills))
+
+            if accepted:
+                self.db.execute(insert(models.Resource), [
+                    {"nome": row.nome, "cognome": row.cognome, "email": row.email,
+                     "numero": row.numero, "business_unit_id": bu_id}
+                    for row, bu_id, _ in accepted
+                ])
+                resource_ids = dict(
+                    self.db.query(models.Resource.email, models.Resource.id)
+                    .filter(models.Resource.email.in_([row.email for row, _, _ in accepted])).all()
+                )
+                link_rows = [
+                    {"resource_id": resource_ids[row.email], "skill_id": skill_id, "level": skill.level}
+                    for row, _, skills in accepted for skill_id, skill in skills.items()
+                ]
+                if link_rows:
+                    self.db.execute(insert(models.ResourceSkillLink), link_rows)
+                    history.record_changes(self.db, [
+                        (resource_ids[row.email], bu_id, {}, {skill_id: s.level for skill_id, s in skills.items()})
+                        for row, bu_id, skills in accepted
+                    ])
+                label_names = [name for _, _, skills in accepted for s in skills.values() for name in (s.labels or [])]
+                if label_names:
+                    labels = {label.name: label for label in crud.resolve_labels(self.db, label_names)}
+                    self.db.flush()
+                    label_rows = {
+                        (resource_ids[row.email], skill_id, labels[name.strip()].id)
+                        for row, _, skills in accepted for skill_id, s in skills.items()
+                        for name in (s.labels or []) if name.strip()
+                    }
+                    self.db.execute(insert(models.resource_skill_link_labels), [
+                        {"resource_id": r, "skill_id": s, "label_id": l} for r, s, l in label_rows
+                    ])
+            self.db.commit()
+        except SQLAlchemyError as e:
+            self.db.rollback()
+            self._fail_all([(index, f"Errore database: {e.__class__.__name__}", row.email) for index, row in rows])
+            return
+
+        self._fail_all(errors)
+        self.result.created += len(accepted)
+        self.seen_emails.update(row.email for row, _, _ in accepted)
+        for bu_id, name in created_bus:
+            events.emit("business_unit", "create", bu_id, {"name": name})
+        for skill_id, name in created_skills:
+            events.emit("skill", "create", skill_id, {"name": name})
+        for row, bu_id, skills in accepted:
+            resource_id = resource_ids[row.email]
+            events.emit("resource", "create", resource_id, {
+                "business_unit_id": bu_id, "nome": row.nome, "cognome": row.cognome, "email": row.email,
+            })
+            if skills:
+                events.emit("resource_skills", "update", resource_id, {
+                    "before": {},
+                    "after": {skill_id: s.level for skill_id, s in skills.items()},
+                })
+
+
+def import_resources(
+    db: Session,
+    rows: Iterator[ParsedRow],
+    create_missing: bool = False,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    on_progress: Optional[Callable[[int], None]] = None,
+) -> models.ImportResult:
+    importer = _Importer(db, create_missing)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+        importer.process_chunk(chunk)
+        if on_progress:
+            on_progress(importer.result.processed)
+    importer.result.errors.sort(key=lambda e: e.row)
+    return importer.result
@@ -0,0 +1,114 @@
+import asyncio
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from dataclasses import asdict, dataclass, field
+from typing import Any, Deque, Dict, List, Set, Tuple
+
+from . import events
+
+# --- Feed delle modifiche (GET /api/changes) ---
+# Ogni evento emesso da crud.py dopo il commit viene copiato in un buffer
+# circolare di CHANGES_BUFFER_SIZE elementi con un numero di sequenza crescente.
+# I client ricevono i nuovi eventi in streaming (Server-Sent Events) o li
+# chiedono con ?since=<seq>, e aggiornano solo gli elementi cambiati invece di
+# rileggere le liste complete. Se il client è rimasto indietro oltre il buffer,
+# o il processo è stato riavviato (epoch diversa), riceve 'reset' e ricarica tutto.
+# Il feed è per processo: con più worker ognuno ha la propria sequenza.
+CHANGES_BUFFER_SIZE = int(os.getenv("CHANGES_BUFFER_SIZE", "1000"))
+CHANGES_HEARTBEAT_SECONDS = float(os.getenv("CHANGES_HEARTBEAT_SECONDS", "15"))
+
+# Dati dell'evento originale riportati nel feed (il resto resta nel processo)
+FEED_DATA = {
+    ("resource", "create"): ("business_unit_id",),
+    ("resource", "update"): ("business_unit_id", "previous_business_unit_id"),
+    ("business_unit", "delete"): ("action", "target_bu_id"),
+}
+
+
+@dataclass
+class FeedEvent:
+    seq: int
+    entity: str
+    op: str
+    id: int
+    version: int # Numero di modifiche dell'elemento viste da questo processo
+    timestamp: float
+    data: Dict[str, Any] = field(default_factory=dict)
+
+
+class ChangeFeed:
+    def __init__(self, size: int = CHANGES_BUFFER_SIZE):
+        self._lock = threading.Lock()
+        self._buffer: Deque[FeedEvent] = deque(maxlen=size)
+        self._versions: Dict[Tuple[str, int], int] = {}
+        self._waiters: Set[Tuple[asyncio.AbstractEventLoop, asyncio.Event]] = set()
+        self.epoch = uuid.uuid4().hex[:8]
+        self.seq = 0
+        self.closed = False
+
+    def handle_event(self, event: events.ChangeEvent):
+        with self._lock:
+            key = (event.entity, event.id)
+            version = self._versions.get(key, 0) + 1
+            if event.op == "delete":
+                self._versions.pop(key, None)
+            else:
+                self._versions[key] = version
+            self.seq += 1
+            keys = FEED_DATA.get((event.entity, event.op), ())
+            self._buffer.append(FeedEvent(
+                seq=self.seq, entity=event.entity, op=event.op, id=event.id, version=version,
+                timestamp=time.time(), data={k: event.data[k] for k in keys if k in event.data},
+            ))
+            waiters = list(self._waiters)
+        self._wake(waiters)
+
+    def since(self, seq: int) -> Tuple[bool, List[FeedEvent]]:
+        """(reset, eventi con sequenza > seq); reset=True se quelli intermedi non sono più disponibili"""
+        with self._lock:
+            oldest = self._buffer[0].seq if self._buffer else self.seq + 1
+            if seq > self.seq or seq < oldest - 1:
+                return True, []
+            return False, [event for event in self._buffer if event.seq > seq]
+
+    async def wait(self, seq: int, timeout: float):
+        """Attende un evento successivo a seq (o il timeout) senza occupare thread"""
+        waiter = (asyncio.get_running_loop(), asyncio.Event())
+        with self._lock:
+            if self.seq > seq or self.closed:
+                return
+            self._waiters.add(waiter)
+        try:
+            await asyncio.wait_for(waiter[1].wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            with self._lock:
+                self._waiters.discard(waiter)
+
+    def close(self):
+        """Allo spegnimento: chiude gli stream aperti"""
+        with self._lock:
+            self.closed = True
+            waiters = list(self._waiters)
+        self._wake(waiters)
+
+    @staticmethod
+    def _wake(waiters):
+        # Gli eventi arrivano anche dai thread del threadpool
+        for loop, ready in waiters:
+            try:
+                loop.call_soon_threadsafe(ready.set)
+            except RuntimeError:
+                pass # loop già chiuso
+
+
+def to_dict(event: FeedEvent) -> Dict[str, Any]:
+    return asdict(event)
+
+
+change_feed = ChangeFeed()
+events.subscribe(change_feed.handle_event)
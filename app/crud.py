@@ -1,6 +1,126 @@
-from sqlalchemy.orm import Session, joinedload
-from typing import List
-from . import models
+from contextlib import contextmanager
+from sqlalchemy import and_, or_, func, distinct, select, update, delete, insert
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session, joinedload, selectinload
+from typing import Any, Callable, Dict, List, Optional
+from . import models, events, history
+from .search_index import skill_index, SEARCH_INDEX_ENABLED
+
+# --- Transazioni ---
+# Le funzioni di scrittura confermano da sole la propria transazione ed emettono
+# gli eventi dopo il commit. Dentro `transaction(db)` (POST /api/batch) il commit
+# diventa un flush: le operazioni successive vedono le modifiche precedenti, il
+# commit avviene una sola volta alla fine e gli eventi partono solo se riesce.
+_PENDING_EVENTS = "pending_events"
+
+def _commit(db: Session):
+    if _PENDING_EVENTS in db.info:
+        db.flush()
+    else:
+        db.commit()
+
+def _emit(db: Session, entity: str, op: str, entity_id: int, data: Optional[Dict[str, Any]] = None):
+    pending = db.info.get(_PENDING_EVENTS)
+    if pending is None:
+        events.emit(entity, op, entity_id, data)
+    else:
+        pending.append((entity, op, entity_id, data))
+
+@contextmanager
+def transaction(db: Session):
+    """Esegue più funzioni di scrittura in un'unica transazione (tutto o niente)"""
+    pending = db.info[_PENDING_EVENTS] = []
+    try:
+        yield
+        del db.info[_PENDING_EVENTS]
+        db.commit()
+    except BaseException:
+        db.rollback()
+        raise
+    finally:
+        db.info.pop(_PENDING_EVENTS, None)
+    for event in pending:
+        events.emit(*event)
+
+# --- Paginazione ---
+def _keyset(query, id_column, skip: int, limit: int, after_id: Optional[int]):
+    # Con un cursore si riparte dall'ultimo id visto invece di scorrere l'OFFSET
+    if after_id is not None:
+        query = query.filter(id_column > after_id)
+    query = query.order_by(id_column)
+    if skip:
+        query = query.offset(skip)
+    return query.limit(limit)
+
+def count_rows(db: Session, model) -> int:
+    return db.query(func.count(model.id)).scalar()
+
+# --- Upsert per chiave naturale ---
+# PUT per email (risorse) o per nome (skill, BU). Una lettura IN dello stato
+# attuale (con FOR UPDATE dove il database lo supporta) separa elementi nuovi,
+# modificati e invariati: serve a storico ed eventi, che hanno bisogno del prima.
+# Nuovi e modificati sono scritti con un solo INSERT ... ON CONFLICT DO UPDATE
+# (SQLite) / ON DUPLICATE KEY UPDATE (MySQL/MariaDB) per blocco, con RETURNING
+# dove disponibile; gli invariati non vengono scritti. Se un processo concorrente
+# inserisce la stessa chiave nel frattempo, l'inserimento diventa un
+# aggiornamento invece di fallire con un errore di unicità.
+MAX_UPSERT_ITEMS = 1000
+UPSERT_CHUNK_SIZE = 500
+
+def _chunks(items: list, size: int = UPSERT_CHUNK_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+def _check_unique_keys(keys: List[str], name: str):
+    seen = set()
+    for key in keys:
+        if key in seen:
+            raise ValueError(f"Duplicate {name} in request: {key}")
+        seen.add(key)
+
+def _existing_by_key(db: Session, key_column, columns, keys: List[str]) -> Dict[str, tuple]:
+    """{chiave: (colonne...)} per le chiavi già presenti, con le righe bloccate fino al commit"""
+    existing = {}
+    for chunk in _chunks(keys):
+        for row in db.query(key_column, *columns).filter(key_column.in_(chunk)).with_for_update():
+            existing[row[0]] = tuple(row[1:])
+    return existing
+
+def _upsert(db: Session, model, key: str, rows: List[dict], update_columns: List[str]) -> Dict[str, int]:
+    """Scrive rows con un INSERT ... ON CONFLICT per blocco e restituisce {chiave: id}"""
+    if not rows:
+        return {}
+    table = model.__table__
+    dialect = db.get_bind().dialect
+    # Senza altre colonne si riscrive la chiave stessa: la riga esistente viene comunque restituita
+    update_columns = update_columns or [key]
+    ids: Dict[str, int] = {}
+    for chunk in _chunks(rows):
+        if dialect.name == "sqlite":
+            stmt = sqlite_insert(table).values(chunk)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[table.c[key]], set_={column: stmt.excluded[column] for column in update_columns},
+            )
+        elif dialect.name in ("mysql", "mariadb"):
+            stmt = mysql_insert(table).values(chunk)
+            stmt = stmt.on_duplicate_key_update({column: stmt.inserted[column] for column in update_columns})
+        else:
+            raise NotImplementedError(f"Upsert non supportato per il database '{dialect.name}'")
+        if dialect.insert_returning:
+            ids.update(db.execute(stmt.returning(table.c[key], table.c.id)).tuples().all())
+        else:
+            # MySQL (a differenza di MariaDB) non ha RETURNING: gli id si rileggono per chiave
+            db.execute(stmt)
+            ids.update(db.query(table.c[key], table.c.id).filter(table.c[key].in_([row[key] for row in chunk])).all())
+    # Gli oggetti già caricati nella sessione (es. in POST /api/batch) vanno riletti
+    db.expire_all()
+    return ids
+
+def _upsert_status(key: str, existing: dict, changed: set) -> str:
+    if key not in existing:
+        return "created"
+    return "updated" if key in changed else "unchanged"
 
 # --- Business Unit ---
 def get_business_unit(db: Session, bu_id: int):
@@ -9,39 +129,148 @@ def get_business_unit(db: Session, bu_id: int):
 def get_business_unit_by_name(db: Session, name: str):
     return db.query(models.BusinessUnit).filter(models.BusinessUnit.name == name).first()
 
-def get_business_units(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.BusinessUnit).offset(skip).limit(limit).all()
+def get_business_units(db: Session, skip: int = 0, limit: int = 100, after_id: Optional[int] = None):
+    query = db.query(models.BusinessUnit)
+    return _keyset(query, models.BusinessUnit.id, skip, limit, after_id).all()
 
 def create_business_unit(db: Session, bu: models.BusinessUnitCreate):
     db_bu = models.BusinessUnit(name=bu.name)
     db.add(db_bu)
-    db.commit()
+    _commit(db)
     db.refresh(db_bu)
+    _emit(db, "business_unit", "create", db_bu.id, {"name": db_bu.name})
     return db_bu
 
-def delete_business_unit(db: Session, bu_id: int, options: models.BuDeleteOptions):
-    db_bu = get_business_unit(db, bu_id)
-    if not db_bu:
-        return None
+def upsert_business_units(db: Session, bus: List[models.BusinessUnitCreate]) -> List[models.UpsertResult]:
+    """Crea le BU mancanti per nome; quelle esistenti restano invariate"""
+    names = [bu.name for bu in bus]
+    _check_unique_keys(names, "name")
+    existing = {name: bu_id for name, (bu_id,) in _existing_by_key(
+        db, models.BusinessUnit.name, [models.BusinessUnit.id], names).items()}
+    new = [name for name in names if name not in existing]
+    ids = {**existing, **_upsert(db, models.BusinessUnit, "name", [{"name": name} for name in new], [])}
+    _commit(db)
+    for name in new:
+        _emit(db, "business_unit", "create", ids[name], {"name": name})
+    return [models.UpsertResult(id=ids[name], key=name, status=_upsert_status(name, existing, set())) for name in names]
+
+def _check_business_units_exist(db: Session, bu_ids):
+    bu_ids = set(bu_ids)
+    if not bu_ids:
+        return
+    found = {bu_id for (bu_id,) in db.query(models.BusinessUnit.id).filter(models.BusinessUnit.id.in_(bu_ids))}
+    missing = sorted(bu_ids - found)
+    if missing:
+        raise ValueError(f"Business Unit with ID {missing[0]} not found.")
+
+BU_CHUNK_SIZE = 1000
 
-    resources_in_bu = db.query(models.Resource).filter(models.Resource.business_unit_id == bu_id).all()
+def count_business_unit_resources(db: Session, bu_id: int) -> int:
+    return db.query(func.count(models.Resource.id)).filter(models.Resource.business_unit_id == bu_id).scalar()
 
+def check_business_unit_delete(db: Session, bu_id: int, options: models.BuDeleteOptions):
+    """Valida le opzioni di eliminazione, sollevando ValueError se non sono applicabili"""
     if options.action == "migrate":
         if not options.target_bu_id:
             raise ValueError("Target Business Unit ID is required for migration.")
-        target_bu = get_business_unit(db, options.target_bu_id)
-        if not target_bu:
+        if options.target_bu_id == bu_id:
+            raise ValueError("Target Business Unit must be different from the deleted one.")
+        if not get_business_unit(db, options.target_bu_id):
             raise ValueError("Target Business Unit not found.")
-        for resource in resources_in_bu:
-            resource.business_unit_id = options.target_bu_id
-    elif options.action == "delete":
-        for resource in resources_in_bu:
-            db.delete(resource)
-
-    db.delete(db_bu)
-    db.commit()
+    elif options.action != "delete":
+        raise ValueError("Action must be 'migrate' or 'delete'.")
+
+def delete_business_unit(
+    db: Session,
+    bu_id: int,
+    options: models.BuDeleteOptions,
+    on_progress: Optional[Callable[[int, int], None]] = None,
+):
+    """
+    Elimina la BU con statement set-based, senza caricare le risorse come oggetti:
+    con 'migrate' un UPDATE le sposta nella BU di destinazione, con 'delete' vengono
+    eliminati label dei link, link e risorse. Le risorse sono elaborate a blocchi
+    di BU_CHUNK_SIZE id (per riportare l'avanzamento) in un'unica transazione.
+    """
+    db_bu = get_business_unit(db, bu_id)
+    if not db_bu:
+        return None
+    check_business_unit_delete(db, bu_id, options)
+
+    resource_ids = [
+        resource_id for (resource_id,) in db.query(models.Resource.id)
+        .filter(models.Resource.business_unit_id == bu_id)
+        .order_by(models.Resource.id)
+    ]
+    # La riga viene eliminata con uno statement: l'oggetto resta leggibile per la risposta
+    db.expunge(db_bu)
+
+    total = len(resource_ids)
+    for start in range(0, total, BU_CHUNK_SIZE):
+        chunk = resource_ids[start:start + BU_CHUNK_SIZE]
+        in_chunk = and_(
+            models.Resource.business_unit_id == bu_id,
+            models.Resource.id.between(chunk[0], chunk[-1]),
+        )
+        chunk_ids = select(models.Resource.id).where(in_chunk)
+        links_in_chunk = models.ResourceSkillLink.resource_id.in_(chunk_ids)
+        if options.action == "migrate":
+            history.record_links(db, links_in_chunk, target_business_unit_id=options.target_bu_id)
+            db.execute(
+                update(models.Resource).where(in_chunk).values(business_unit_id=options.target_bu_id),
+                execution_options={"synchronize_session": False},
+            )
+        else:
+            history.record_links(db, links_in_chunk)
+            db.execute(delete(models.resource_skill_link_labels)
+                       .where(models.resource_skill_link_labels.c.resource_id.in_(chunk_ids)))
+            db.execute(
+                delete(models.ResourceSkillLink).where(links_in_chunk),
+                execution_options={"synchronize_session": False},
+            )
+            db.execute(delete(models.Resource).where(in_chunk), execution_options={"synchronize_session": False})
+        if on_progress:
+            on_progress(start + len(chunk), total)
+
+    db.execute(
+        delete(models.BusinessUnit).where(models.BusinessUnit.id == bu_id),
+        execution_options={"synchronize_session": False},
+    )
+    _commit(db)
+    _emit(db, "business_unit", "delete", bu_id, {
+        "action": options.action,
+        "target_bu_id": options.target_bu_id,
+        "resource_ids": resource_ids,
+    })
     return db_bu
 
+# --- Label ---
+def resolve_labels(db: Session, names: List[str]) -> List[models.Label]:
+    """Restituisce le Label per nome (una sola query IN), creando quelle mancanti"""
+    names = list(dict.fromkeys(name.strip() for name in names if name and name.strip()))
+    if not names:
+        return []
+    existing = {
+        label.name: label
+        for label in db.query(models.Label).filter(models.Label.name.in_(names))
+    }
+    for name in names:
+        if name not in existing:
+            existing[name] = models.Label(name=name)
+            db.add(existing[name])
+    return [existing[name] for name in names]
+
+def get_all_labels(db: Session) -> List[str]:
+    # Solo le label effettivamente in uso da skill o link risorsa-skill
+    used_by_skill = db.query(models.skill_labels.c.label_id).filter(
+        models.skill_labels.c.label_id == models.Label.id
+    ).exists()
+    used_by_link = db.query(models.resource_skill_link_labels.c.label_id).filter(
+        models.resource_skill_link_labels.c.label_id == models.Label.id
+    ).exists()
+    rows = db.query(models.Label.name).filter(or_(used_by_skill, used_by_link)).order_by(models.Label.name)
+    return [name for (name,) in rows]
+
 # --- Skill ---
 def get_skill(db: Session, skill_id: int):
     return db.query(models.Skill).filter(models.Skill.id == skill_id).first()
@@ -49,43 +278,105 @@ def get_skill(db: Session, skill_id: int):
 def get_skill_by_name(db: Session, name: str):
     return db.query(models.Skill).filter(models.Skill.name == name).first()
 
-def get_skills(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.Skill).offset(skip).limit(limit).all()
+def get_skill_names(db: Session, skill_ids: List[int]) -> Dict[int, str]:
+    if not skill_ids:
+        return {}
+    return dict(db.query(models.Skill.id, models.Skill.name).filter(models.Skill.id.in_(skill_ids)).all())
+
+def get_skills(db: Session, skip: int = 0, limit: int = 100, after_id: Optional[int] = None):
+    query = db.query(models.Skill)
+    return _keyset(query, models.Skill.id, skip, limit, after_id).all()
 
 def create_skill(db: Session, skill: models.SkillCreate):
     db_skill = models.Skill(name=skill.name)
     if skill.labels is not None:
-        db_skill.set_labels_from_list(skill.labels)
+        db_skill.labels = resolve_labels(db, skill.labels)
     db.add(db_skill)
-    db.commit()
+    _commit(db)
     db.refresh(db_skill)
+    _emit(db, "skill", "create", db_skill.id, {"name": db_skill.name})
     return db_skill
 
+def _skill_label_names(db: Session, skill_ids: List[int]) -> Dict[int, set]:
+    labels: Dict[int, set] = {}
+    for chunk in _chunks(skill_ids):
+        rows = db.query(models.skill_labels.c.skill_id, models.Label.name).join(
+            models.Label, models.Label.id == models.skill_labels.c.label_id
+        ).filter(models.skill_labels.c.skill_id.in_(chunk))
+        for skill_id, name in rows:
+            labels.setdefault(skill_id, set()).add(name)
+    return labels
+
+def upsert_skills(db: Session, skills: List[models.SkillUpsert]) -> List[models.UpsertResult]:
+    """Crea le skill mancanti per nome; con 'labels' le label vengono sostituite"""
+    names = [skill.name for skill in skills]
+    _check_unique_keys(names, "name")
+    existing = {name: skill_id for name, (skill_id,) in _existing_by_key(
+        db, models.Skill.name, [models.Skill.id], names).items()}
+    wanted = {
+        skill.name: list(dict.fromkeys(label.strip() for label in skill.labels if label and label.strip()))
+        for skill in skills if skill.labels is not None
+    }
+    current = _skill_label_names(db, [existing[name] for name in wanted if name in existing])
+    relabelled = {name for name in wanted if name in existing and set(wanted[name]) != current.get(existing[name], set())}
+    new = [name for name in names if name not in existing]
+
+    ids = {**existing, **_upsert(db, models.Skill, "name", [{"name": name} for name in new], [])}
+    targets = {ids[name]: wanted[name] for name in wanted if name in relabelled or (name not in existing and wanted[name])}
+    if targets:
+        relabelled_ids = [ids[name] for name in relabelled]
+        for chunk in _chunks(relabelled_ids):
+            db.execute(delete(models.skill_labels).where(models.skill_labels.c.skill_id.in_(chunk)))
+        labels = {label.name: label for label in resolve_labels(db, [name for label_names in targets.values() for name in label_names])}
+        db.flush()
+        rows = [{"skill_id": skill_id, "label_id": labels[name].id} for skill_id, label_names in targets.items() for name in label_names]
+        if rows:
+            db.execute(insert(models.skill_labels), rows)
+        db.expire_all()
+    _commit(db)
+    for name in new:
+        _emit(db, "skill", "create", ids[name], {"name": name})
+    for name in relabelled:
+        _emit(db, "skill", "update", ids[name])
+    return [models.UpsertResult(id=ids[name], key=name, status=_upsert_status(name, existing, relabelled)) for name in names]
+
+def get_skills_by_label(db: Session, label: str, skip: int = 0, limit: int = 100):
+    return db.query(models.Skill).join(
+        models.skill_labels, models.skill_labels.c.skill_id == models.Skill.id
+    ).join(
+        models.Label, models.Label.id == models.skill_labels.c.label_id
+    ).filter(models.Label.name == label.strip()).order_by(models.Skill.id).offset(skip).limit(limit).all()
+
 def delete_skill(db: Session, skill_id: int):
     db_skill = get_skill(db, skill_id)
     if db_skill:
+        history.record_links(db, models.ResourceSkillLink.skill_id == skill_id)
         db.delete(db_skill)
-        db.commit()
+        _commit(db)
+        _emit(db, "skill", "delete", skill_id)
     return db_skill
 
 def update_skill_labels(db: Session, skill_id: int, labels: List[str]):
     db_skill = get_skill(db, skill_id)
     if not db_skill:
         return None
-    db_skill.set_labels_from_list(labels)
+    db_skill.labels = resolve_labels(db, labels)
     db.add(db_skill)
-    db.commit()
+    _commit(db)
     db.refresh(db_skill)
+    _emit(db, "skill", "update", skill_id)
     return db_skill
 
 def add_skill_label(db: Session, skill_id: int, label: str):
     db_skill = get_skill(db, skill_id)
     if not db_skill:
         return None
-    db_skill.add_label(label)
+    for db_label in resolve_labels(db, [label]):
+        db_skill.add_label(db_label)
     db.add(db_skill)
-    db.commit()
+    _commit(db)
     db.refresh(db_skill)
+    _emit(db, "skill", "update", skill_id)
     return db_skill
 
 def remove_skill_label(db: Session, skill_id: int, label: str):
@@ -94,8 +385,9 @@ def remove_skill_label(db: Session, skill_id: int, label: str):
         return None
     db_skill.remove_label(label)
     db.add(db_skill)
-    db.commit()
+    _commit(db)
     db.refresh(db_skill)
+    _emit(db, "skill", "update", skill_id)
     return db_skill
 
 # --- Resource ---
@@ -109,12 +401,91 @@ def get_resource(db: Session, resource_id: int):
         joinedload(models.Resource.skill_links).joinedload(models.ResourceSkillLink.skill)
     ).filter(models.Resource.id == resource_id).first()
 
-def get_resources(db: Session, skip: int = 0, limit: int = 100):
-    # Eager load business_unit and skill_links
+def get_resources(db: Session, skip: int = 0, limit: int = 100, after_id: Optional[int] = None):
+    # Eager load business_unit; skill_links con selectinload (una query IN separata)
+    # così il LIMIT non costringe SQLAlchemy a incapsulare la join in una subquery
+    query = db.query(models.Resource).options(
+        joinedload(models.Resource.business_unit),
+        selectinload(models.Resource.skill_links).joinedload(models.ResourceSkillLink.skill)
+    )
+    return _keyset(query, models.Resource.id, skip, limit, after_id).all()
+
+def get_resources_by_ids(db: Session, resource_ids: List[int]):
+    if not resource_ids:
+        return []
     return db.query(models.Resource).options(
         joinedload(models.Resource.business_unit),
-        joinedload(models.Resource.skill_links).joinedload(models.ResourceSkillLink.skill)
-    ).offset(skip).limit(limit).all()
+        selectinload(models.Resource.skill_links).joinedload(models.ResourceSkillLink.skill)
+    ).filter(models.Resource.id.in_(resource_ids)).order_by(models.Resource.id).all()
+
+# --- Lettura veloce (solo colonne, senza identity map) ---
+# Costruisce direttamente i dict della risposta (stessa forma di ResourceSchema)
+# con tre query a sole colonne: nessun oggetto ORM viene creato.
+def _resource_columns(db: Session):
+    return db.query(
+        models.Resource.id, models.Resource.nome, models.Resource.cognome,
+        models.Resource.email, models.Resource.numero,
+        models.BusinessUnit.id, models.BusinessUnit.name,
+    ).outerjoin(models.BusinessUnit, models.BusinessUnit.id == models.Resource.business_unit_id)
+
+def _resource_rows_to_dicts(db: Session, rows) -> List[dict]:
+    ids = [row[0] for row in rows]
+    if not ids:
+        return []
+    link = models.ResourceSkillLink
+    link_labels = models.resource_skill_link_labels
+
+    labels = {}
+    label_rows = db.query(link_labels.c.resource_id, link_labels.c.skill_id, models.Label.name).join(
+        models.Label, models.Label.id == link_labels.c.label_id
+    ).filter(link_labels.c.resource_id.in_(ids)).order_by(models.Label.name)
+    for resource_id, skill_id, name in label_rows:
+        labels.setdefault((resource_id, skill_id), []).append(name)
+
+    skills = {}
+    link_rows = db.query(link.resource_id, link.skill_id, link.level, models.Skill.name).join(
+        models.Skill, models.Skill.id == link.skill_id
+    ).filter(link.resource_id.in_(ids)).order_by(link.resource_id, link.skill_id)
+    for resource_id, skill_id, level, name in link_rows:
+        skills.setdefault(resource_id, []).append({
+            "skill_id": skill_id,
+            "level": level,
+            "name": name,
+            "labels": labels.get((resource_id, skill_id), []),
+        })
+
+    return [
+        {
+            "id": resource_id,
+            "nome": nome,
+            "cognome": cognome,
+            "email": email,
+            "numero": numero,
+            "business_unit": {"name": bu_name, "id": bu_id} if bu_id is not None else None,
+            "skills": skills.get(resource_id, []),
+        }
+        for resource_id, nome, cognome, email, numero, bu_id, bu_name in rows
+    ]
+
+def get_resource_dicts(db: Session, skip: int = 0, limit: int = 100, after_id: Optional[int] = None) -> List[dict]:
+    rows = _keyset(_resource_columns(db), models.Resource.id, skip, limit, after_id).all()
+    return _resource_rows_to_dicts(db, rows)
+
+def get_resource_dicts_by_ids(db: Session, resource_ids: List[int]) -> List[dict]:
+    if not resource_ids:
+        return []
+    rows = _resource_columns(db).filter(models.Resource.id.in_(resource_ids)).order_by(models.Resource.id).all()
+    return _resource_rows_to_dicts(db, rows)
+
+def get_resource_skill_levels(db: Session, resource_id: int) -> Optional[Dict[int, int]]:
+    """skill_id -> livello della risorsa, None se la risorsa non esiste"""
+    if not _resource_exists(db, resource_id):
+        return None
+    return dict(
+        db.query(models.ResourceSkillLink.skill_id, models.ResourceSkillLink.level)
+        .filter(models.ResourceSkillLink.resource_id == resource_id)
+        .all()
+    )
 
 def create_resource(db: Session, resource: models.ResourceCreate):
     db_resource = models.Resource(
@@ -125,44 +496,231 @@ def create_resource(db: Session, resource: models.ResourceCreate):
         business_unit_id=resource.business_unit_id
     )
     db.add(db_resource)
-    db.commit()
+    _commit(db)
     db.refresh(db_resource)
+    _emit(db, "resource", "create", db_resource.id, {
+        "business_unit_id": db_resource.business_unit_id,
+        "nome": db_resource.nome,
+        "cognome": db_resource.cognome,
+        "email": db_resource.email,
+    })
     return db_resource
 
+def upsert_resources(db: Session, resources: List[models.ResourceCreate]) -> List[models.UpsertResult]:
+    """Crea o aggiorna le risorse per email; le skill non vengono toccate"""
+    emails = [resource.email for resource in resources]
+    _check_unique_keys(emails, "email")
+    R = models.Resource
+    # email -> (id, nome, cognome, numero, business_unit_id)
+    existing = _existing_by_key(db, R.email, [R.id, R.nome, R.cognome, R.numero, R.business_unit_id], emails)
+
+    def fields(resource: models.ResourceCreate) -> tuple:
+        return (resource.nome, resource.cognome, resource.numero, resource.business_unit_id)
+
+    new = [r for r in resources if r.email not in existing]
+    changed = [r for r in resources if r.email in existing and fields(r) != existing[r.email][1:]]
+    moved = [r for r in changed if r.business_unit_id != existing[r.email][4]]
+    _check_business_units_exist(db, {r.business_unit_id for r in new + moved})
+
+    # Lo storico dei livelli segue la risorsa nella nuova BU (prima dell'upsert, che cambia la BU precedente)
+    targets: Dict[int, List[int]] = {}
+    for r in moved:
+        targets.setdefault(r.business_unit_id, []).append(existing[r.email][0])
+    for target_bu_id, resource_ids in targets.items():
+        for chunk in _chunks(resource_ids):
+            history.record_links(db, models.ResourceSkillLink.resource_id.in_(chunk), target_business_unit_id=target_bu_id)
+
+    ids = _upsert(db, R, "email", [
+        {"nome": r.nome, "cognome": r.cognome, "email": r.email, "numero": r.numero, "business_unit_id": r.business_unit_id}
+        for r in new + changed
+    ], ["nome", "cognome", "numero", "business_unit_id"])
+    _commit(db)
+    for r in new + changed:
+        data = {"business_unit_id": r.business_unit_id, "nome": r.nome, "cognome": r.cognome, "email": r.email}
+        if r.email in existing:
+            data["previous_business_unit_id"] = existing[r.email][4]
+        _emit(db, "resource", "update" if r.email in existing else "create", ids[r.email], data)
+    changed_emails = {r.email for r in changed}
+    return [
+        models.UpsertResult(
+            id=ids.get(email) or existing[email][0], key=email, status=_upsert_status(email, existing, changed_emails),
+        )
+        for email in emails
+    ]
+
 def delete_resource(db: Session, resource_id: int):
     db_resource = db.query(models.Resource).filter(models.Resource.id == resource_id).first()
     if db_resource:
+        removed = {
+            "business_unit_id": db_resource.business_unit_id,
+            "skills": {link.skill_id: link.level for link in db_resource.skill_links},
+        }
+        history.record_changes(db, [(resource_id, removed["business_unit_id"], removed["skills"], {})])
         db.delete(db_resource)
-        db.commit()
+        _commit(db)
+        _emit(db, "resource", "delete", resource_id, removed)
     return db_resource
 
+def _check_skills_exist(db: Session, skill_ids):
+    # Una sola query IN per tutte le skill referenziate
+    skill_ids = set(skill_ids)
+    if not skill_ids:
+        return
+    found = {skill_id for (skill_id,) in db.query(models.Skill.id).filter(models.Skill.id.in_(skill_ids))}
+    missing = sorted(skill_ids - found)
+    if missing:
+        raise ValueError(f"Skill with ID {missing[0]} not found.")
+
+def _apply_skill_changes(
+    db: Session,
+    resource_id: int,
+    upserts: List[models.ResourceSkillUpdate],
+    removals: List[int],
+    keep_missing_labels: bool,
+):
+    """
+    Applica solo la differenza rispetto ai link esistenti: inserisce i nuovi,
+    aggiorna livello/label solo se cambiati ed elimina quelli rimossi.
+    Con keep_missing_labels=True (PATCH) labels=None lascia invariate le label.
+    Restituisce i livelli (prima, dopo) per gli eventi.
+    """
+    _check_skills_exist(db, [sd.skill_id for sd in upserts])
+    links = {
+        link.skill_id: link
+        for link in db.query(models.ResourceSkillLink).filter(models.ResourceSkillLink.resource_id == resource_id)
+    }
+    before = {skill_id: link.level for skill_id, link in links.items()}
+
+    upserted = {sd.skill_id for sd in upserts}
+    for skill_id in removals:
+        # Se una skill è sia da rimuovere che da aggiornare prevale l'aggiornamento
+        if skill_id in upserted:
+            continue
+        link = links.pop(skill_id, None)
+        if link is not None:
+            db.delete(link)
+
+    # Risolve tutte le label in un'unica query
+    labels_by_name = {
+        label.name: label
+        for label in resolve_labels(db, [name for sd in upserts for name in (sd.labels or [])])
+    }
+    for skill_data in upserts:
+        link = links.get(skill_data.skill_id)
+        if link is None:
+            link = models.ResourceSkillLink(resource_id=resource_id, skill_id=skill_data.skill_id, level=skill_data.level)
+            db.add(link)
+            links[skill_data.skill_id] = link
+        elif link.level != skill_data.level:
+            link.level = skill_data.level
+
+        if skill_data.labels is None and keep_missing_labels:
+            continue
+        names = [name.strip() for name in dict.fromkeys(skill_data.labels or []) if name.strip()]
+        if set(names) != set(link.labels_list):
+            link.labels = [labels_by_name[name] for name in names]
+
+    after = {skill_id: link.level for skill_id, link in links.items()}
+    return before, after
+
+def _resource_exists(db: Session, resource_id: int) -> bool:
+    return _resource_business_unit_id(db, resource_id) is not None
+
+def _resource_business_unit_id(db: Session, resource_id: int) -> Optional[int]:
+    """BU della risorsa, None se la risorsa non esiste"""
+    row = db.query(models.Resource.business_unit_id).filter(models.Resource.id == resource_id).first()
+    return row[0] if row else None
+
 def update_resource_skills(db: Session, resource_id: int, skills_data: List[models.ResourceSkillUpdate]):
-    db_resource = get_resource(db, resource_id)
-    if not db_resource:
+    """Sostituisce l'insieme delle skill (PUT), scrivendo solo le righe cambiate"""
+    bu_id = _resource_business_unit_id(db, resource_id)
+    if bu_id is None:
         return None
+    current = {skill_id for (skill_id,) in db.query(models.ResourceSkillLink.skill_id).filter(
+        models.ResourceSkillLink.resource_id == resource_id
+    )}
+    submitted = {sd.skill_id for sd in skills_data}
+    before, after = _apply_skill_changes(
+        db, resource_id, skills_data, sorted(current - submitted), keep_missing_labels=False
+    )
+    history.record_changes(db, [(resource_id, bu_id, before, after)])
+    _commit(db)
+    _emit(db, "resource_skills", "update", resource_id, {"before": before, "after": after})
+    return get_resource(db, resource_id)
+
+def patch_resource_skills(db: Session, resource_id: int, patch: models.ResourceSkillPatch):
+    """Aggiorna/inserisce e rimuove solo le skill indicate (PATCH)"""
+    bu_id = _resource_business_unit_id(db, resource_id)
+    if bu_id is None:
+        return None
+    before, after = _apply_skill_changes(
+        db, resource_id, patch.upsert, patch.remove, keep_missing_labels=True
+    )
+    history.record_changes(db, [(resource_id, bu_id, before, after)])
+    _commit(db)
+    _emit(db, "resource_skills", "update", resource_id, {"before": before, "after": after})
+    return get_resource(db, resource_id)
+
+# --- Ricerca ---
+def _normalize_criteria(criteria: List[models.SkillCriterion], match_all: bool) -> List[models.SkillCriterion]:
+    # Una stessa skill ripetuta: in AND vale il livello più alto, in OR il più basso
+    by_skill = {}
+    for c in criteria:
+        current = by_skill.get(c.skill_id)
+        if current is None:
+            by_skill[c.skill_id] = c.min_level
+        else:
+            by_skill[c.skill_id] = max(current, c.min_level) if match_all else min(current, c.min_level)
+    return [models.SkillCriterion(skill_id=k, min_level=v) for k, v in by_skill.items()]
 
-    # Clear existing skill links
-    db_resource.skill_links.clear()
-
-    # Add new skill links
-    for skill_data in skills_data:
-        # Check if the skill exists
-        db_skill = get_skill(db, skill_data.skill_id)
-        if not db_skill:
-            raise ValueError(f"Skill with ID {skill_data.skill_id} not found.")
-
-        # Create new link
-        link = models.ResourceSkillLink(
-            resource_id=resource_id,
-            skill_id=skill_data.skill_id,
-            level=skill_data.level,
+def _resources_with_link_label(db: Session, label: str):
+    # Join indicizzata labels.name -> resource_skill_link_labels.label_id
+    link_labels = models.resource_skill_link_labels
+    return db.query(link_labels.c.resource_id).join(
+        models.Label, models.Label.id == link_labels.c.label_id
+    ).filter(models.Label.name == label.strip())
+
+def search_resource_ids(
+    db: Session,
+    criteria: List[models.SkillCriterion],
+    match: str = "all",
+    business_unit_id: Optional[int] = None,
+    labels: Optional[List[str]] = None,
+    skip: int = 0,
+    limit: int = 100,
+):
+    if match not in ("all", "any"):
+        raise ValueError("Il parametro 'match' deve essere 'all' o 'any'.")
+    match_all = match == "all"
+    criteria = _normalize_criteria(criteria, match_all)
+    labels = [label for label in (labels or []) if label.strip()]
+
+    # Percorso veloce: l'indice in memoria risolve i filtri su skill e BU
+    if SEARCH_INDEX_ENABLED and not labels:
+        skill_index.ensure_loaded(db)
+        ids = skill_index.search(criteria, match_all=match_all, business_unit_id=business_unit_id)
+        return ids[skip:skip + limit]
+
+    # Percorso SQL: sfrutta l'indice (skill_id, level) su resource_skill_link
+    query = db.query(models.Resource.id)
+    if criteria:
+        link = models.ResourceSkillLink
+        matching = db.query(link.resource_id).filter(
+            or_(*[and_(link.skill_id == c.skill_id, link.level >= c.min_level) for c in criteria])
+        ).group_by(link.resource_id)
+        if match_all:
+            matching = matching.having(func.count(distinct(link.skill_id)) == len(criteria))
+        query = query.filter(models.Resource.id.in_(matching))
+    if business_unit_id is not None:
+        query = query.filter(models.Resource.business_unit_id == business_unit_id)
+    for label in labels:
+        query = query.filter(
+            models.Resource.id.in_(_resources_with_link_label(db, label))
         )
-        # Imposta le label dal frontend (che sono già una lista)
-        if skill_data.labels is not None:
-            link.set_labels_from_list(skill_data.labels)
 
-        db_resource.skill_links.append(link)
+    # La paginazione va applicata agli id, non alle righe della join
+    page = query.order_by(models.Resource.id).offset(skip).limit(limit).all()
+    return [rid for (rid,) in page]
 
-    db.commit()
-    db.refresh(db_resource)
-    return db_resource
\ No newline at end of file
+def search_resources(db: Session, criteria: List[models.SkillCriterion], **kwargs):
+    return get_resources_by_ids(db, search_resource_ids(db, criteria, **kwargs))
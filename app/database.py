@@ -1,8 +1,14 @@
 import os
-from sqlalchemy import create_engine
+import time
+import functools
+import itertools
+import contextvars
+from contextlib import contextmanager
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 from dotenv import load_dotenv
+from starlette.concurrency import run_in_threadpool
 
 load_dotenv()
 
@@ -10,8 +16,24 @@ load_dotenv()
 # Se non è impostata, usa SQLite come default per lo sviluppo.
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./skill_matrix_dev.db")
 
+# --- Dimensione del pool di connessioni ---
+# Gli endpoint sincroni girano nel threadpool di Starlette (THREADPOOL_SIZE thread,
+# impostato all'avvio da admission.configure_threadpool) e ognuno usa al più una
+# connessione: il pool ne tiene altrettante, più DB_MAX_OVERFLOW per job in
+# background ed export in streaming. Così nessun thread resta bloccato in
+# attesa di una connessione mentre altri thread sono liberi.
+THREADPOOL_SIZE = int(os.getenv("THREADPOOL_SIZE", "40"))
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", str(THREADPOOL_SIZE)))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+
+def _pool_args(url: str) -> dict:
+    # SQLite in memoria usa un pool a connessione singola senza queste opzioni
+    if ":memory:" in url or url.rstrip("/").endswith("sqlite:"):
+        return {}
+    return {"pool_size": DB_POOL_SIZE, "max_overflow": DB_MAX_OVERFLOW}
+
 # Argomenti specifici per il motore a seconda del tipo di DB
-engine_args = {}
+engine_args = _pool_args(DATABASE_URL)
 # L'opzione 'check_same_thread' è necessaria solo per SQLite
 if DATABASE_URL.startswith("sqlite"):
     engine_args["connect_args"] = {"check_same_thread": False}
@@ -22,10 +44,188 @@ SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
 
+# --- Modalità asincrona (opzionale) ---
+# Con DB_ASYNC=true le richieste usano un AsyncEngine (aiosqlite / aiomysql):
+# l'attesa sul database non occupa più un thread del threadpool di Starlette
+# e un singolo worker può servire centinaia di richieste contemporanee.
+# Le funzioni di crud.py restano le stesse e vengono eseguite con
+# AsyncSession.run_sync, che effettua l'I/O tramite il driver asincrono.
+DB_ASYNC = os.getenv("DB_ASYNC", "false").lower() in ("1", "true", "yes")
+
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "mysql": "mysql+aiomysql",
+    "mysql+mysqlconnector": "mysql+aiomysql",
+    "mysql+pymysql": "mysql+aiomysql",
+    "mariadb": "mysql+aiomysql",
+    "mariadb+mysqlconnector": "mysql+aiomysql",
+}
+
+def to_async_url(url: str) -> str:
+    """Converte l'URL sincrono nell'equivalente con driver asincrono"""
+    scheme, sep, rest = url.partition("://")
+    return ASYNC_DRIVERS.get(scheme, scheme) + sep + rest
+
+async_engine = None
+AsyncSessionLocal = None
+if DB_ASYNC:
+    from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+    ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or to_async_url(DATABASE_URL)
+    async_engine = create_async_engine(
+        ASYNC_DATABASE_URL,
+        connect_args={} if not ASYNC_DATABASE_URL.startswith("sqlite") else {"check_same_thread": False},
+        **_pool_args(ASYNC_DATABASE_URL),
+    )
+    # expire_on_commit=False: gli oggetti restituiti restano leggibili anche
+    # durante la serializzazione della risposta, fuori da run_sync
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
 # Funzione di dipendenza per ottenere una sessione di database
-def get_db():
+def _get_sync_db():
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+async def _get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+get_db = _get_async_db if DB_ASYNC else _get_sync_db
+
+# --- Repliche in lettura (opzionali) ---
+# DATABASE_READ_URL accetta uno o più URL separati da virgola. Le route GET usano
+# get_read_db, che sceglie le repliche a rotazione; le scritture restano su get_db.
+# Dopo una scrittura il client riceve un cookie e per READ_YOUR_WRITES_SECONDS le
+# sue letture tornano al primario, così vede subito le proprie modifiche anche se
+# le repliche sono in ritardo. Senza repliche get_read_db equivale a get_db.
+# In locale si può provare con due file SQLite (la replica è una copia del primario).
+DATABASE_READ_URLS = [url.strip() for url in os.getenv("DATABASE_READ_URL", "").split(",") if url.strip()]
+READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", "5"))
+PRIMARY_COOKIE = "db_primary_until"
+
+_prefer_primary: contextvars.ContextVar[bool] = contextvars.ContextVar("prefer_primary", default=False)
+
+@contextmanager
+def use_primary():
+    """Indirizza al primario le letture eseguite nel blocco (e nei task che ne copiano il contesto)"""
+    token = _prefer_primary.set(True)
+    try:
+        yield
+    finally:
+        _prefer_primary.reset(token)
+
+def _reject_writes(session, flush_context, instances):
+    raise RuntimeError("Sessione in sola lettura: usare get_db per le scritture")
+
+def _engine_args(url: str) -> dict:
+    args = _pool_args(url)
+    if url.startswith("sqlite"):
+        args["connect_args"] = {"check_same_thread": False}
+    return args
+
+read_engines = [create_engine(url, **_engine_args(url)) for url in DATABASE_READ_URLS]
+ReadSessionLocals = [sessionmaker(autocommit=False, autoflush=False, bind=read_engine) for read_engine in read_engines]
+for read_sessionmaker in ReadSessionLocals:
+    event.listen(read_sessionmaker, "before_flush", _reject_writes)
+
+async_read_engines = []
+if DB_ASYNC and DATABASE_READ_URLS:
+    for url in DATABASE_READ_URLS:
+        async_url = to_async_url(url)
+        async_read_engines.append(create_async_engine(async_url, **_engine_args(async_url)))
+AsyncReadSessionLocals = [
+    async_sessionmaker(read_engine, autoflush=False, expire_on_commit=False) for read_engine in async_read_engines
+]
+
+_replica_counter = itertools.count()
+
+def _pick_replica(sessionmakers):
+    """Replica successiva a rotazione, oppure None se va usato il primario"""
+    if not sessionmakers or _prefer_primary.get():
+        return None
+    return sessionmakers[next(_replica_counter) % len(sessionmakers)]
+
+def read_session():
+    """Sessione sincrona in sola lettura fuori dalle richieste (es. export in streaming)"""
+    factory = _pick_replica(ReadSessionLocals)
+    return factory() if factory else SessionLocal()
+
+def _get_sync_read_db():
+    factory = _pick_replica(ReadSessionLocals)
+    if factory is None:
+        yield from _get_sync_db()
+        return
+    db = factory()
+    try:
+        yield db
+    finally:
+        db.close()
+
+async def _get_async_read_db():
+    factory = _pick_replica(AsyncReadSessionLocals) or AsyncSessionLocal
+    async with factory() as db:
+        yield db
+
+get_read_db = _get_async_read_db if DB_ASYNC else _get_sync_read_db
+
+class ReadYourWritesMiddleware:
+    """
+    Dopo una richiesta di scrittura riuscita imposta il cookie PRIMARY_COOKIE;
+    finché è valido le letture di quel client usano il primario.
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        if scope["method"] in ("GET", "HEAD", "OPTIONS"):
+            if _sticky_until(scope) > time.time():
+                with use_primary():
+                    return await self.app(scope, receive, send)
+            return await self.app(scope, receive, send)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                until = int(time.time() + READ_YOUR_WRITES_SECONDS) + 1
+                cookie = f"{PRIMARY_COOKIE}={until}; Max-Age={int(READ_YOUR_WRITES_SECONDS) + 1}; Path=/; SameSite=Lax"
+                message["headers"] = [*message.get("headers", []), (b"set-cookie", cookie.encode("latin-1"))]
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+def _sticky_until(scope) -> float:
+    for name, value in scope.get("headers", []):
+        if name == b"cookie":
+            for item in value.decode("latin-1").split(";"):
+                key, _, raw = item.strip().partition("=")
+                if key == PRIMARY_COOKIE:
+                    try:
+                        return float(raw)
+                    except ValueError:
+                        return 0.0
+    return 0.0
+
+async def run_db(db, fn, *args, **kwargs):
+    """Esegue fn(session, ...) senza bloccare l'event loop, in entrambe le modalità"""
+    if DB_ASYNC:
+        return await db.run_sync(fn, *args, **kwargs)
+    return await run_in_threadpool(fn, db, *args, **kwargs)
+
+def db_endpoint(fn):
+    """
+    Decoratore per gli endpoint sincroni che ricevono 'db'.
+    In modalità sincrona non cambia nulla (FastAPI li esegue nel threadpool);
+    in modalità asincrona il corpo viene eseguito con AsyncSession.run_sync.
+    """
+    if not DB_ASYNC:
+        return fn
+
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        db = kwargs.pop("db")
+        return await db.run_sync(lambda session: fn(*args, db=session, **kwargs))
+    return wrapper
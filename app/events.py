@@ -0,0 +1,41 @@
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# --- Notifiche di modifica dal layer CRUD ---
+# Le funzioni di scrittura in crud.py emettono un ChangeEvent dopo il commit.
+# Le strutture in memoria (indici, cache, ...) si registrano con `subscribe`
+# per aggiornarsi in modo incrementale senza rileggere tutto il database.
+
+@dataclass
+class ChangeEvent:
+    entity: str          # 'resource', 'resource_skills', 'skill', 'business_unit'
+    op: str              # 'create', 'update', 'delete'
+    id: int
+    data: Dict[str, Any] = field(default_factory=dict)
+
+Listener = Callable[[ChangeEvent], None]
+
+_listeners: List[Listener] = []
+
+def subscribe(listener: Listener) -> Listener:
+    """Registra un listener; utilizzabile anche come decoratore"""
+    if listener not in _listeners:
+        _listeners.append(listener)
+    return listener
+
+def unsubscribe(listener: Listener):
+    """Rimuove un listener registrato in precedenza"""
+    if listener in _listeners:
+        _listeners.remove(listener)
+
+def emit(entity: str, op: str, entity_id: int, data: Optional[Dict[str, Any]] = None):
+    """Notifica tutti i listener. Un errore in un listener non blocca gli altri."""
+    event = ChangeEvent(entity=entity, op=op, id=entity_id, data=data or {})
+    for listener in list(_listeners):
+        try:
+            listener(event)
+        except Exception:
+            logger.exception("Listener %r fallito per l'evento %s/%s", listener, entity, op)
@@ -0,0 +1,120 @@
+import csv
+import io
+import json
+from typing import Dict, Iterator, List, Tuple
+
+from sqlalchemy.orm import Session
+
+from . import models
+from .database import read_session
+
+# --- Export della matrice completa in streaming ---
+# Le risorse vengono lette a blocchi con paginazione keyset (id > ultimo id):
+# per ogni blocco bastano tre query (risorse, link, label) e le righe vengono
+# scritte subito, quindi la memoria resta costante e il primo byte parte
+# dopo il primo blocco, qualunque sia la dimensione dell'organizzazione.
+# A differenza di un cursore lato server, la connessione resta libera tra un
+# blocco e l'altro e le query ausiliarie funzionano con qualsiasi driver.
+
+EXPORT_BATCH_SIZE = 1000
+
+RESOURCE_FIELDS = ["resource_id", "nome", "cognome", "email", "numero", "business_unit"]
+LONG_FIELDS = RESOURCE_FIELDS + ["skill_id", "skill", "level", "labels"]
+
+Batch = List[Tuple[dict, List[dict]]]
+
+
+def iter_batches(db: Session, batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[Batch]:
+    """Restituisce blocchi di (risorsa, lista di skill) ordinati per id"""
+    last_id = 0
+    while True:
+        resources = db.query(
+            models.Resource.id, models.Resource.nome, models.Resource.cognome,
+            models.Resource.email, models.Resource.numero, models.BusinessUnit.name,
+        ).outerjoin(
+            models.BusinessUnit, models.BusinessUnit.id == models.Resource.business_unit_id
+        ).filter(models.Resource.id > last_id).order_by(models.Resource.id).limit(batch_size).all()
+        if not resources:
+            return
+        first_id, last_id = resources[0][0], resources[-1][0]
+
+        link = models.ResourceSkillLink
+        link_labels = models.resource_skill_link_labels
+        labels: Dict[Tuple[int, int], List[str]] = {}
+        label_rows = db.query(link_labels.c.resource_id, link_labels.c.skill_id, models.Label.name).join(
+            models.Label, models.Label.id == link_labels.c.label_id
+        ).filter(link_labels.c.resource_id.between(first_id, last_id)).order_by(models.Label.name)
+        for resource_id, skill_id, name in label_rows:
+            labels.setdefault((resource_id, skill_id), []).append(name)
+
+        skills: Dict[int, List[dict]] = {}
+        link_rows = db.query(link.resource_id, link.skill_id, models.Skill.name, link.level).join(
+            models.Skill, models.Skill.id == link.skill_id
+        ).filter(link.resource_id.between(first_id, last_id)).order_by(link.resource_id, link.skill_id)
+        for resource_id, skill_id, name, level in link_rows:
+            skills.setdefault(resource_id, []).append({
+                "skill_id": skill_id,
+                "skill": name,
+                "level": level,
+                "labels": labels.get((resource_id, skill_id), []),
+            })
+
+        yield [
+            (dict(zip(RESOURCE_FIELDS, row)), skills.get(row[0], []))
+            for row in resources
+        ]
+
+
+def _csv_chunk(buffer: io.StringIO, writer, rows) -> str:
+    """Scrive le righe nel buffer e ne restituisce il contenuto svuotandolo"""
+    writer.writerows(rows)
+    data = buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    return data
+
+
+def _long_rows(batch: Batch) -> Iterator[dict]:
+    for resource, skills in batch:
+        # Le risorse senza competenze compaiono comunque, con i campi skill vuoti
+        for skill in skills or [{"skill_id": None, "skill": None, "level": None, "labels": []}]:
+            yield {**resource, **skill}
+
+
+def generate_export(fmt: str, layout: str, batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[str]:
+    """Generatore usato da StreamingResponse; apre e chiude la propria sessione"""
+    db = read_session()
+    try:
+        skill_names = [name for (name,) in db.query(models.Skill.name).order_by(models.Skill.id)]
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+
+        if fmt == "csv":
+            header = LONG_FIELDS if layout == "long" else RESOURCE_FIELDS + skill_names
+            yield _csv_chunk(buffer, writer, [header])
+
+        for batch in iter_batches(db, batch_size):
+            if layout == "long":
+                rows = list(_long_rows(batch))
+                if fmt == "csv":
+                    yield _csv_chunk(buffer, writer, (
+                        [row[field] if field != "labels" else "|".join(row["labels"]) for field in LONG_FIELDS]
+                        for row in rows
+                    ))
+                else:
+                    yield "".join(json.dumps(row, ensure_ascii=False) + "\n" for row in rows)
+            else:
+                if fmt == "csv":
+                    lines = []
+                    for resource, skills in batch:
+                        levels = {skill["skill"]: skill["level"] for skill in skills}
+                        lines.append([resource[field] for field in RESOURCE_FIELDS]
+                                     + [levels.get(name, "") for name in skill_names])
+                    yield _csv_chunk(buffer, writer, lines)
+                else:
+                    yield "".join(
+                        json.dumps({**resource, "skills": {s["skill"]: s["level"] for s in skills}}, ensure_ascii=False) + "\n"
+                        for resource, skills in batch
+                    )
+    finally:
+        db.close()
@@ -0,0 +1,373 @@
+import logging
+import os
+import threading
+from collections import Counter
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import func, insert, literal, or_, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from . import models
+from .database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+# --- Storico dei livelli delle skill ---
+# Ogni scrittura sulle skill di una risorsa aggiunge, nella stessa transazione,
+# una riga a 'skill_level_history' per ogni livello cambiato (solo le differenze,
+# mai copie dell'intero profilo). Ogni riga riporta anche livello e BU precedenti,
+# quindi è una transizione autonoma: le variazioni giornaliere per (skill, BU,
+# livello) si ottengono con un semplice conteggio e vengono consolidate una
+# volta per giorno in 'skill_level_daily', con HISTORY_ROLLUP_DELAY_DAYS giorni di ritardo.
+# changed_at viene dall'orologio dell'applicazione prima del commit: una
+# transazione che conferma dopo la mezzanotte può aggiungere righe al giorno
+# precedente, quindi ieri non è mai consolidato. Le serie temporali sommano
+# le righe consolidate più le poche variazioni successive. Ogni
+# HISTORY_CHECKPOINT_DAYS giorni consolidati il consolidamento salva anche una
+# fotografia dei livelli in 'skill_level_checkpoint': la matrice a una data parte
+# dall'ultima fotografia precedente e legge, per ogni coppia (risorsa, skill),
+# solo l'ultima delle variazioni successive, tramite indice. I giorni sono in UTC.
+# Consolidamento e fotografie girano in un thread in background (all'avvio e poi
+# ogni HISTORY_ROLLUP_INTERVAL secondi), mai dentro una richiesta: le letture
+# sommano le righe consolidate alle variazioni successive, per quanto indietro
+# sia rimasto il consolidamento.
+HISTORY_CHECKPOINT_DAYS = int(os.getenv("HISTORY_CHECKPOINT_DAYS", "30"))
+# Giorni completi lasciati fuori dal consolidamento oltre a oggi (1 = fino
+# all'altro ieri); almeno 1, per i commit arrivati dopo la mezzanotte
+HISTORY_ROLLUP_DELAY_DAYS = max(1, int(os.getenv("HISTORY_ROLLUP_DELAY_DAYS", "1")))
+# 0 disattiva il thread (il consolidamento va eseguito da un'altra istanza)
+HISTORY_ROLLUP_INTERVAL = float(os.getenv("HISTORY_ROLLUP_INTERVAL", "3600"))
+
+INTERVALS = ("day", "week", "month")
+MAX_TREND_POINTS = 1000
+CHECKPOINT_CHUNK_SIZE = 5000
+
+H = models.SkillLevelChange
+R = models.SkillLevelRollup
+C = models.SkillLevelCheckpoint
+
+LevelChange = Tuple[int, Optional[int], Dict[int, int], Dict[int, int]]
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+def _utc(value: datetime) -> datetime:
+    # SQLite non conserva il fuso orario: i valori salvati sono sempre in UTC
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+def _day_start(day: date) -> datetime:
+    return datetime.combine(day, time(), tzinfo=timezone.utc)
+
+
+# --- Scrittura (chiamate da crud.py prima del commit) ---
+def record_changes(db: Session, changes: Iterable[LevelChange]):
+    """changes: (resource_id, business_unit_id, livelli prima, livelli dopo); 0 o assente = nessuna skill"""
+    changed_at = _now()
+    rows = [
+        {
+            "changed_at": changed_at, "resource_id": resource_id, "skill_id": skill_id,
+            "business_unit_id": business_unit_id, "level": after.get(skill_id, 0),
+            "previous_level": before.get(skill_id, 0),
+            "previous_business_unit_id": business_unit_id if before.get(skill_id, 0) else None,
+        }
+        for resource_id, business_unit_id, before, after in changes
+        for skill_id in sorted(set(before) | set(after))
+        if before.get(skill_id, 0) != after.get(skill_id, 0)
+    ]
+    if rows:
+        db.execute(insert(H), rows)
+
+def record_links(db: Session, condition, target_business_unit_id: Optional[int] = None, baseline: bool = False):
+    """
+    Per le operazioni set-based: una riga per ogni link che soddisfa 'condition',
+    con INSERT ... SELECT. Senza target il link viene rimosso (livello 0), con
+    target la risorsa passa a quella BU mantenendo il livello; con baseline=True
+    si registra il livello attuale come aggiunto (avvio dello storico).
+    Va chiamata prima di modificare link e risorse.
+    """
+    link, resource = models.ResourceSkillLink, models.Resource
+    zero = literal(0, H.level.type)
+    # (business_unit_id, level, previous_level, previous_business_unit_id)
+    if baseline:
+        columns = (resource.business_unit_id, link.level, zero, literal(None, H.business_unit_id.type))
+    elif target_business_unit_id is not None:
+        target = literal(target_business_unit_id, H.business_unit_id.type)
+        columns = (target, link.level, link.level, resource.business_unit_id)
+    else:
+        columns = (resource.business_unit_id, zero, link.level, resource.business_unit_id)
+    db.execute(insert(H).from_select(
+        ["changed_at", "resource_id", "skill_id", "business_unit_id", "level", "previous_level", "previous_business_unit_id"],
+        select(
+            literal(_now(), H.changed_at.type), link.resource_id, link.skill_id, *columns,
+        ).join(resource, resource.id == link.resource_id).where(condition),
+    ))
+
+
+# --- Consolidamento giornaliero ---
+def _daily_deltas(rows) -> Counter:
+    """(giorno, skill_id, business_unit_id, livello) -> variazione netta del numero di risorse"""
+    deltas: Counter = Counter()
+    for changed_at, skill_id, business_unit_id, level, previous_business_unit_id, previous_level in rows:
+        day = _utc(changed_at).date()
+        if level > 0:
+            deltas[(day, skill_id, business_unit_id, level)] += 1
+        if previous_level > 0:
+            deltas[(day, skill_id, previous_business_unit_id, previous_level)] -= 1
+    return deltas
+
+def _change_rows(db: Session, start: Optional[datetime], end: datetime):
+    query = db.query(
+        H.changed_at, H.skill_id, H.business_unit_id, H.level, H.previous_business_unit_id, H.previous_level,
+    ).filter(H.changed_at < end)
+    if start is not None:
+        query = query.filter(H.changed_at >= start)
+    return query
+
+def last_rolled_up_day(db: Session) -> Optional[date]:
+    return db.query(func.max(R.day)).scalar()
+
+def rollup(db: Session, today: Optional[date] = None) -> int:
+    """
+    Consolida le variazioni dei giorni successivi all'ultimo consolidato, esclusi
+    oggi e gli ultimi HISTORY_ROLLUP_DELAY_DAYS giorni (di default fino all'altro ieri).
+    Più processi possono eseguirlo insieme: chi arriva secondo trova le righe già
+    presenti e rinuncia. Restituisce il numero di righe inserite.
+    """
+    today = today or _now().date()
+    last = last_rolled_up_day(db)
+    start = _day_start(last + timedelta(days=1)) if last else None
+    end = _day_start(today - timedelta(days=HISTORY_ROLLUP_DELAY_DAYS))
+    deltas = _daily_deltas(_change_rows(db, start, end).yield_per(5000))
+    rows = [
+        {"day": day, "skill_id": skill_id, "business_unit_id": bu_id, "level": level, "delta": delta}
+        for (day, skill_id, bu_id, level), delta in deltas.items()
+        if delta and bu_id is not None
+    ]
+    if not rows:
+        return 0
+    try:
+        db.execute(insert(R), rows)
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        return 0
+    checkpoint(db)
+    return len(rows)
+
+def last_checkpoint_day(db: Session, before: Optional[date] = None) -> Optional[date]:
+    query = db.query(func.max(C.day))
+    if before is not None:
+        query = query.filter(C.day < before)
+    return query.scalar()
+
+def checkpoint(db: Session) -> int:
+    """
+    Salva i livelli alla fine dell'ultimo giorno consolidato, se dall'ultima
+    fotografia sono passati almeno HISTORY_CHECKPOINT_DAYS giorni. Come rollup
+    rinuncia se un altro processo l'ha già salvata. Restituisce le righe inserite.
+    """
+    day = last_rolled_up_day(db)
+    previous = last_checkpoint_day(db)
+    if day is None or (previous is not None and day < previous + timedelta(days=HISTORY_CHECKPOINT_DAYS)):
+        return 0
+    levels = _levels(db, _day_start(day + timedelta(days=1)), inclusive=False)
+    rows = [
+        {"day": day, "resource_id": resource_id, "skill_id": skill_id, "business_unit_id": bu_id, "level": level}
+        for (resource_id, skill_id), (bu_id, level) in levels.items()
+        if level > 0
+    ]
+    try:
+        for i in range(0, len(rows), CHECKPOINT_CHUNK_SIZE):
+            db.execute(insert(C), rows[i:i + CHECKPOINT_CHUNK_SIZE])
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        return 0
+    return len(rows)
+
+
+# --- Interrogazione ---
+def levels_at(
+    db: Session,
+    at: datetime,
+    skill_id: Optional[int] = None,
+    business_unit_id: Optional[int] = None,
+    resource_id: Optional[int] = None,
+):
+    """Livelli in vigore a 'at': (resource_id, skill_id, business_unit_id, level) ordinati"""
+    levels = _levels(db, at, inclusive=True, skill_id=skill_id, resource_id=resource_id)
+    return sorted(
+        (resource_id_, skill_id_, bu_id, level)
+        for (resource_id_, skill_id_), (bu_id, level) in levels.items()
+        if level > 0 and (business_unit_id is None or bu_id == business_unit_id)
+    )
+
+def _levels(
+    db: Session,
+    end: datetime,
+    inclusive: bool,
+    skill_id: Optional[int] = None,
+    resource_id: Optional[int] = None,
+) -> Dict[Tuple[int, int], Tuple[Optional[int], int]]:
+    """
+    (resource_id, skill_id) -> (business_unit_id, livello) alla fine dell'intervallo:
+    l'ultima fotografia che precede 'end' più, per ogni coppia, l'ultima variazione successiva
+    """
+    levels: Dict[Tuple[int, int], Tuple[Optional[int], int]] = {}
+    # Una fotografia del giorno d comprende le variazioni fino a _day_start(d + 1) escluso
+    day = last_checkpoint_day(db, before=end.astimezone(timezone.utc).date())
+    latest = select(func.max(H.id).label("id")).where(H.changed_at <= end if inclusive else H.changed_at < end)
+    if day is not None:
+        base = db.query(C.resource_id, C.skill_id, C.business_unit_id, C.level).filter(C.day == day)
+        if skill_id is not None:
+            base = base.filter(C.skill_id == skill_id)
+        if resource_id is not None:
+            base = base.filter(C.resource_id == resource_id)
+        levels = {(rid, sid): (bu_id, level) for rid, sid, bu_id, level in base}
+        latest = latest.where(H.changed_at >= _day_start(day + timedelta(days=1)))
+    if skill_id is not None:
+        latest = latest.where(H.skill_id == skill_id)
+    if resource_id is not None:
+        latest = latest.where(H.resource_id == resource_id)
+    latest = latest.group_by(H.resource_id, H.skill_id).subquery()
+    changes = db.query(H.resource_id, H.skill_id, H.business_unit_id, H.level).join(latest, latest.c.id == H.id)
+    for rid, sid, bu_id, level in changes:
+        levels[(rid, sid)] = (bu_id, level)
+    return levels
+
+def resource_changes(db: Session, resource_id: int, skill_id: Optional[int] = None, limit: int = 500):
+    query = db.query(H).filter(H.resource_id == resource_id)
+    if skill_id is not None:
+        query = query.filter(H.skill_id == skill_id)
+    return query.order_by(H.id.desc()).limit(limit).all()
+
+def _sample_days(start: date, end: date, interval: str) -> List[date]:
+    days, day = [], start
+    while day <= end:
+        days.append(day)
+        if interval == "day":
+            day += timedelta(days=1)
+        elif interval == "week":
+            day += timedelta(days=7)
+        else:
+            month = day.month % 12 + 1
+            year = day.year + (day.month == 12)
+            day = date(year, month, min(start.day, 28))
+    if days[-1] != end:
+        days.append(end)
+    return days
+
+def check_trend_range(start: date, end: date, interval: str):
+    if interval not in INTERVALS:
+        raise ValueError(f"Interval must be one of: {', '.join(INTERVALS)}.")
+    if end < start:
+        raise ValueError("End date must not be before start date.")
+    if len(_sample_days(start, end, interval)) > MAX_TREND_POINTS:
+        raise ValueError(f"Too many points: at most {MAX_TREND_POINTS} per trend.")
+
+def trend(
+    db: Session,
+    start: date,
+    end: date,
+    interval: str = "day",
+    skill_id: Optional[int] = None,
+    business_unit_id: Optional[int] = None,
+) -> List[dict]:
+    """Distribuzione dei livelli alla fine di ciascun giorno campionato tra start ed end"""
+    check_trend_range(start, end, interval)
+    last = last_rolled_up_day(db)
+
+    def filtered(query, skill_column, bu_columns):
+        if skill_id is not None:
+            query = query.filter(skill_column == skill_id)
+        if business_unit_id is not None:
+            query = query.filter(or_(*(column == business_unit_id for column in bu_columns)))
+        return query
+
+    # Giorni consolidati: prima di start sommati in un'unica base, poi giorno per giorno
+    counts: Counter = Counter()
+    daily: Dict[date, Counter] = {}
+    if last is not None:
+        before = filtered(db.query(R.level, func.sum(R.delta)).filter(R.day < start), R.skill_id, [R.business_unit_id])
+        for level, delta in before.group_by(R.level):
+            counts[level] += int(delta)
+        within = filtered(
+            db.query(R.day, R.level, func.sum(R.delta)).filter(R.day >= start, R.day <= min(end, last)),
+            R.skill_id, [R.business_unit_id],
+        )
+        for day, level, delta in within.group_by(R.day, R.level):
+            daily.setdefault(day, Counter())[level] += int(delta)
+
+    # Variazioni non ancora consolidate (da ieri in poi, se il consolidamento è in pari)
+    tail = filtered(
+        _change_rows(db, _day_start(last + timedelta(days=1)) if last else None, _day_start(end + timedelta(days=1))),
+        H.skill_id, [H.business_unit_id, H.previous_business_unit_id],
+    )
+    for (day, _, bu_id, level), delta in _daily_deltas(tail).items():
+        if business_unit_id is not None and bu_id != business_unit_id:
+            continue
+        if day < start:
+            counts[level] += delta
+        else:
+            daily.setdefault(day, Counter())[level] += delta
+
+    points = []
+    samples = iter(_sample_days(start, end, interval))
+    sample = next(samples)
+    day = start
+    while day <= end:
+        counts.update(daily.get(day, {}))
+        if day == sample:
+            levels = {level: count for level, count in sorted(counts.items()) if count > 0}
+            holders = sum(levels.values())
+            points.append({
+                "date": day,
+                "holders": holders,
+                "average_level": round(sum(level * count for level, count in levels.items()) / holders, 2) if holders else 0.0,
+                "levels": levels,
+            })
+            sample = next(samples, None)
+        day += timedelta(days=1)
+    return points
+
+
+# --- Consolidamento periodico ---
+class RollupTask:
+    def __init__(self, interval: float = HISTORY_ROLLUP_INTERVAL, session_factory=SessionLocal):
+        self._lock = threading.Lock()
+        self.interval = interval
+        self.session_factory = session_factory
+        self._stop: Optional[threading.Event] = None
+
+    def run_once(self) -> int:
+        """Consolida i giorni mancanti (e se serve salva una fotografia); righe consolidate inserite"""
+        with self.session_factory() as db:
+            return rollup(db)
+
+    def _loop(self, stop: threading.Event):
+        while True:
+            try:
+                self.run_once()
+            except Exception:
+                logger.exception("Consolidamento dello storico fallito")
+            if stop.wait(self.interval):
+                return
+
+    def start(self):
+        with self._lock:
+            if self.interval <= 0 or self._stop is not None:
+                return
+            self._stop = threading.Event()
+            threading.Thread(target=self._loop, args=(self._stop,), name="history-rollup", daemon=True).start()
+
+    def shutdown(self):
+        with self._lock:
+            stop, self._stop = self._stop, None
+        if stop is not None:
+            stop.set()
+
+
+rollup_task = RollupTask()
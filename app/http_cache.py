@@ -0,0 +1,146 @@
+import hashlib
+import os
+import re
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.requests import Request
+from starlette.responses import Response
+
+from . import events
+from .database import use_primary
+
+# --- Cache HTTP per i dati di riferimento ---
+# Ogni tabella ha un contatore di versione incrementato dagli eventi di crud.py.
+# L'ETag di una risposta dipende da (route, parametri, versioni delle tabelle
+# coinvolte): se il client invia If-None-Match con l'ETag corrente si risponde
+# 304 senza eseguire l'endpoint né toccare il database. I corpi già serializzati
+# sono tenuti in una LRU in memoria con la stessa chiave.
+# Contatori e LRU sono per processo: con più worker ognuno mantiene i propri.
+HTTP_CACHE_ENABLED = os.getenv("HTTP_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+HTTP_CACHE_MAX_ENTRIES = int(os.getenv("HTTP_CACHE_MAX_ENTRIES", "512"))
+
+# Route in cache -> tabelle da cui dipende il contenuto
+CACHED_ROUTES = [
+    (re.compile(r"^/api/skills$"), ("skills",)),
+    (re.compile(r"^/api/skills/by-label/[^/]+$"), ("skills",)),
+    (re.compile(r"^/api/skills/labels/all$"), ("skills", "resources")),
+    (re.compile(r"^/api/business_units$"), ("business_units",)),
+    (re.compile(r"^/api/business_units/\d+$"), ("business_units",)),
+    (re.compile(r"^/api/resources/\d+$"), ("resources",)),
+]
+
+# Header della risposta originale da conservare insieme al corpo
+PRESERVED_HEADERS = ("content-type", "x-next-cursor", "x-total-count")
+
+# Tabelle invalidate da ciascun evento (entity, op)
+EVENT_TABLES = {
+    ("business_unit", "create"): ("business_units",),
+    ("business_unit", "delete"): ("business_units", "resources"),
+    ("skill", "create"): ("skills",),
+    ("skill", "update"): ("skills", "resources"),
+    ("skill", "delete"): ("skills", "resources"),
+    ("resource", "create"): ("resources",),
+    ("resource", "update"): ("resources",),
+    ("resource", "delete"): ("resources",),
+    ("resource_skills", "update"): ("resources",),
+}
+
+
+class TableVersions:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._versions: Dict[str, int] = {}
+        # Evita che ETag generati prima di un riavvio risultino ancora validi
+        self.nonce = uuid.uuid4().hex[:8]
+
+    def get(self, tables: Tuple[str, ...]) -> Tuple[int, ...]:
+        with self._lock:
+            return tuple(self._versions.get(table, 0) for table in tables)
+
+    def bump(self, *tables: str):
+        with self._lock:
+            for table in tables:
+                self._versions[table] = self._versions.get(table, 0) + 1
+
+    def handle_event(self, event: events.ChangeEvent):
+        self.bump(*EVENT_TABLES.get((event.entity, event.op), ()))
+
+
+class ResponseLRU:
+    def __init__(self, max_entries: int):
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[int, Dict[str, str], bytes]]" = OrderedDict()
+        self.max_entries = max_entries
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key: str, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+table_versions = TableVersions()
+events.subscribe(table_versions.handle_event)
+response_cache = ResponseLRU(HTTP_CACHE_MAX_ENTRIES)
+
+
+def _match_tables(path: str) -> Optional[Tuple[str, ...]]:
+    for pattern, tables in CACHED_ROUTES:
+        if pattern.match(path):
+            return tables
+    return None
+
+def _etag_matches(header: str, etag: str) -> bool:
+    # If-None-Match usa il confronto debole: si ignora il prefisso W/
+    candidates = [value.strip() for value in header.split(",")]
+    return "*" in candidates or any(value.removeprefix("W/") == etag for value in candidates)
+
+
+class HTTPCacheMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request: Request, call_next):
+        tables = _match_tables(request.url.path) if request.method == "GET" else None
+        if tables is None:
+            return await call_next(request)
+
+        # La versione va letta prima di eseguire l'endpoint: una scrittura
+        # concorrente rende la voce irraggiungibile invece che obsoleta
+        versions = table_versions.get(tables)
+        key = f"{request.url.path}?{'&'.join(sorted(request.url.query.split('&')))}|{versions}"
+        etag = '"%s"' % hashlib.sha1(f"{table_versions.nonce}|{key}".encode()).hexdigest()[:20]
+        cache_headers = {"ETag": etag, "Cache-Control": "no-cache"}
+
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match and _etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers=cache_headers)
+
+        cached = response_cache.get(key)
+        if cached is None:
+            # Il corpo resta valido finché non cambia la versione: va letto dal
+            # primario, non da una replica che potrebbe non avere l'ultima scrittura
+            with use_primary():
+                response = await call_next(request)
+            if response.status_code != 200:
+                return response
+            body = b"".join([chunk async for chunk in response.body_iterator])
+            headers = {k: v for k, v in response.headers.items() if k in PRESERVED_HEADERS}
+            cached = (response.status_code, headers, body)
+            response_cache.put(key, cached)
+
+        status_code, headers, body = cached
+        return Response(content=body, status_code=status_code, headers={**headers, **cache_headers})
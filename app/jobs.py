@@ -0,0 +1,313 @@
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import delete, func, update
+
+from . import models
+from .database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+# --- Operazioni lunghe in background ---
+# Le operazioni pesanti vengono eseguite da un pool di JOB_WORKERS thread,
+# separato dal threadpool delle richieste, con al massimo JOB_QUEUE_SIZE job in
+# attesa: oltre si rifiutano nuove richieste invece di accumulare lavoro.
+# Lo stato di ogni job è salvato nella tabella 'jobs' (l'avanzamento al più una
+# volta ogni JOB_PROGRESS_INTERVAL secondi), così GET /api/jobs/{id} funziona da
+# qualsiasi worker e dopo un riavvio. La cancellazione è cooperativa: il job la
+# rileva al successivo set_progress e la sua transazione non viene confermata.
+# Non serve alcun broker esterno; ogni funzione di job apre la propria sessione.
+# Ogni JOB_HEARTBEAT_INTERVAL secondi il processo aggiorna 'updated_at' dei propri
+# job attivi; un job attivo senza heartbeat da JOB_STALE_HEARTBEATS intervalli
+# viene chiuso come fallito da qualsiasi processo, anche su un altro host (pod
+# terminato, container riavviato con lo stesso pid).
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_QUEUE_SIZE = int(os.getenv("JOB_QUEUE_SIZE", "100"))
+JOB_PROGRESS_INTERVAL = float(os.getenv("JOB_PROGRESS_INTERVAL", "1"))
+JOB_RETENTION_DAYS = int(os.getenv("JOB_RETENTION_DAYS", "7"))
+JOB_HEARTBEAT_INTERVAL = float(os.getenv("JOB_HEARTBEAT_INTERVAL", "10"))
+JOB_STALE_HEARTBEATS = 6
+
+ACTIVE_STATUSES = ("queued", "running")
+OWNER = f"{socket.gethostname()}:{os.getpid()}"
+
+
+class JobCancelled(Exception):
+    pass
+
+class JobQueueFull(Exception):
+    pass
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+def _utc(value: Optional[datetime]) -> Optional[datetime]:
+    # SQLite non conserva il fuso orario: i valori salvati sono sempre in UTC
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+@dataclass
+class Job:
+    kind: str
+    id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    status: str = "queued" # queued, running, succeeded, failed, cancelled
+    done: int = 0
+    total: Optional[int] = None
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    cancel_requested: bool = False
+    created_at: datetime = field(default_factory=_now)
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    _checkpoint: Optional[Callable[["Job"], None]] = field(default=None, repr=False)
+
+    def set_progress(self, done: int, total: Optional[int] = None):
+        """Aggiorna l'avanzamento; solleva JobCancelled se è stata chiesta la cancellazione"""
+        self.done = done
+        if total is not None:
+            self.total = total
+        if self._checkpoint is not None:
+            self._checkpoint(self)
+        if self.cancel_requested:
+            raise JobCancelled()
+
+    @property
+    def finished(self) -> bool:
+        return self.status not in ACTIVE_STATUSES
+
+    @classmethod
+    def from_record(cls, record: models.BackgroundJob) -> "Job":
+        return cls(
+            kind=record.kind, id=record.id, status=record.status, done=record.done, total=record.total,
+            result=json.loads(record.result) if record.result else None, error=record.error,
+            cancel_requested=record.cancel_requested, created_at=_utc(record.created_at),
+            started_at=_utc(record.started_at), finished_at=_utc(record.finished_at),
+        )
+
+
+class JobRunner:
+    def __init__(self, workers: int = JOB_WORKERS, queue_size: int = JOB_QUEUE_SIZE, session_factory=SessionLocal):
+        self._lock = threading.Lock()
+        self.workers = workers
+        self.queue_size = queue_size
+        self.session_factory = session_factory
+        self._executor: Optional[ThreadPoolExecutor] = None
+        # Job di questo processo non ancora conclusi
+        self._live: Dict[str, Job] = {}
+        self._futures: Dict[str, Future] = {}
+        self._saved_at: Dict[str, float] = {}
+        self._stop: Optional[threading.Event] = None
+
+    # --- Persistenza ---
+    def _save(self, job: Job):
+        values = {
+            "status": job.status, "done": job.done, "total": job.total, "error": job.error,
+            "result": json.dumps(job.result) if job.result is not None else None,
+            "started_at": job.started_at, "finished_at": job.finished_at, "updated_at": _now(),
+        }
+        with self.session_factory() as db:
+            db.execute(update(models.BackgroundJob).where(models.BackgroundJob.id == job.id).values(**values))
+            db.commit()
+        self._saved_at[job.id] = time.monotonic()
+
+    def _checkpoint(self, job: Job):
+        if time.monotonic() - self._saved_at.get(job.id, 0) < JOB_PROGRESS_INTERVAL:
+            return
+        with self.session_factory() as db:
+            db.execute(
+                update(models.BackgroundJob).where(models.BackgroundJob.id == job.id)
+                .values(done=job.done, total=job.total, updated_at=_now())
+            )
+            db.commit()
+            # La cancellazione può arrivare da un altro processo tramite la tabella
+            if db.get(models.BackgroundJob, job.id).cancel_requested:
+                job.cancel_requested = True
+        self._saved_at[job.id] = time.monotonic()
+
+    def _heartbeat(self):
+        with self._lock:
+            ids = list(self._live)
+        if not ids:
+            return
+        with self.session_factory() as db:
+            db.execute(
+                update(models.BackgroundJob)
+                .where(models.BackgroundJob.id.in_(ids), models.BackgroundJob.status.in_(ACTIVE_STATUSES))
+                .values(updated_at=_now())
+            )
+            db.commit()
+
+    @staticmethod
+    def _fail_stale(db):
+        """Chiude i job attivi senza heartbeat recente, di qualsiasi processo e host"""
+        cutoff = _now() - timedelta(seconds=JOB_HEARTBEAT_INTERVAL * JOB_STALE_HEARTBEATS)
+        # I job salvati prima dell'introduzione dell'heartbeat non hanno updated_at
+        heartbeat = func.coalesce(
+            models.BackgroundJob.updated_at, models.BackgroundJob.started_at, models.BackgroundJob.created_at
+        )
+        db.execute(
+            update(models.BackgroundJob)
+            .where(models.BackgroundJob.status.in_(ACTIVE_STATUSES), heartbeat < cutoff)
+            .values(status="failed", error="Processo non più attivo (heartbeat assente)", finished_at=_now())
+        )
+
+    def _heartbeat_loop(self, stop: threading.Event):
+        while not stop.wait(JOB_HEARTBEAT_INTERVAL):
+            try:
+                self._heartbeat()
+                with self.session_factory() as db:
+                    self._fail_stale(db)
+                    db.commit()
+            except Exception:
+                logger.exception("Aggiornamento dell'heartbeat dei job fallito")
+
+    # --- Ciclo di vita ---
+    def start(self):
+        """All'avvio: chiude i job rimasti attivi di processi terminati ed elimina quelli vecchi"""
+        host = OWNER.split(":")[0]
+        with self._lock:
+            live = set(self._live)
+        with self.session_factory() as db:
+            stale = db.query(models.BackgroundJob).filter(models.BackgroundJob.status.in_(ACTIVE_STATUSES)).all()
+            for record in stale:
+                if record.id in live:
+                    continue
+                owner_host, _, pid = (record.owner or "").partition(":")
+                # Stesso host:pid di questo processo: un'istanza precedente (es. container
+                # riavviato, dove il pid si ripete)
+                if record.owner == OWNER or (owner_host == host and pid.isdigit() and not _pid_alive(int(pid))):
+                    record.status, record.error, record.finished_at = "failed", "Interrotto dal riavvio del server", _now()
+            db.flush()
+            self._fail_stale(db)
+            db.execute(delete(models.BackgroundJob).where(
+                models.BackgroundJob.finished_at < _now() - timedelta(days=JOB_RETENTION_DAYS)
+            ))
+            db.commit()
+        with self._lock:
+            if self._stop is None:
+                self._stop = threading.Event()
+                threading.Thread(
+                    target=self._heartbeat_loop, args=(self._stop,), name="job-heartbeat", daemon=True
+                ).start()
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+            stop, self._stop = self._stop, None
+        if stop is not None:
+            stop.set()
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    # --- Esecuzione ---
+    def submit(self, kind: str, fn: Callable[..., Optional[Dict[str, Any]]], **params) -> Job:
+        """Accoda fn(job, **params); il valore restituito (dict) diventa il risultato del job"""
+        with self._lock:
+            if len(self._live) >= self.workers + self.queue_size:
+                raise JobQueueFull("Troppi job in coda, riprovare più tardi.")
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="job")
+            job = Job(kind=kind, _checkpoint=self._checkpoint)
+            with self.session_factory() as db:
+                db.add(models.BackgroundJob(
+                    id=job.id, kind=kind, status=job.status, done=0,
+                    cancel_requested=False, owner=OWNER, created_at=job.created_at, updated_at=job.created_at,
+                ))
+                db.commit()
+            self._live[job.id] = job
+            self._futures[job.id] = self._executor.submit(self._run, job, fn, params)
+        return job
+
+    def _run(self, job: Job, fn, params: Dict[str, Any]):
+        try:
+            if job.cancel_requested:
+                raise JobCancelled()
+            job.status, job.started_at = "running", _now()
+            self._save(job)
+            job.result = fn(job, **params)
+            job.status = "succeeded"
+        except JobCancelled:
+            job.status = "cancelled"
+        except Exception as e:
+            logger.exception("Job %s (%s) fallito", job.id, job.kind)
+            job.status, job.error = "failed", str(e)
+        finally:
+            job.finished_at = _now()
+            try:
+                self._save(job)
+            finally:
+                with self._lock:
+                    self._live.pop(job.id, None)
+                    self._futures.pop(job.id, None)
+                    self._saved_at.pop(job.id, None)
+
+    # --- Interrogazione e cancellazione ---
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            job = self._live.get(job_id)
+        if job is not None:
+            return job
+        with self.session_factory() as db:
+            record = db.get(models.BackgroundJob, job_id)
+            return Job.from_record(record) if record else None
+
+    def list(self, status: Optional[str] = None, limit: int = 50) -> List[Job]:
+        with self.session_factory() as db:
+            query = db.query(models.BackgroundJob)
+            if status:
+                query = query.filter(models.BackgroundJob.status == status)
+            records = query.order_by(models.BackgroundJob.created_at.desc()).limit(limit).all()
+        with self._lock:
+            return [self._live.get(record.id) or Job.from_record(record) for record in records]
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        """Chiede la cancellazione; i job ancora in coda vengono annullati subito"""
+        with self._lock:
+            job = self._live.get(job_id)
+            future = self._futures.get(job_id)
+        if job is None:
+            # Job di un altro processo: la richiesta passa dalla tabella
+            with self.session_factory() as db:
+                record = db.get(models.BackgroundJob, job_id)
+                if record is None:
+                    return None
+                if record.status in ACTIVE_STATUSES:
+                    record.cancel_requested = True
+                    db.commit()
+                return Job.from_record(record)
+        job.cancel_requested = True
+        with self.session_factory() as db:
+            db.execute(update(models.BackgroundJob).where(models.BackgroundJob.id == job_id).values(cancel_requested=True))
+            db.commit()
+        if future is not None and future.cancel():
+            job.status, job.finished_at = "cancelled", _now()
+            self._save(job)
+            with self._lock:
+                self._live.pop(job_id, None)
+                self._futures.pop(job_id, None)
+        return job
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+job_runner = JobRunner()
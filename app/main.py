@@ -1,8 +1,9 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, PlainTextResponse
 from starlette.exceptions import HTTPException as StarletteHTTPException
+from contextlib import asynccontextmanager
 import os
 from dotenv import load_dotenv
 
@@ -10,11 +11,30 @@ from dotenv import load_dotenv
 load_dotenv()
 
 # 1. Importa i router delle API
-from .routers import resources, skills, business_units
-from .database import engine, Base
+from .routers import resources, skills, business_units, stats, imports, exports, matching, jobs, batch, autocomplete, changes, history
+from .database import engine, async_engine, read_engines, async_read_engines, DATABASE_READ_URLS, ReadYourWritesMiddleware
+from .migrations import ensure_schema
+from .http_cache import HTTPCacheMiddleware, HTTP_CACHE_ENABLED
+from .metrics import MetricsMiddleware, METRICS_ENABLED, instrument_engine, registry
+from .jobs import job_runner
+from .history import rollup_task
+from .changefeed import change_feed
+from .static_assets import InMemoryStaticFiles, STATIC_IN_MEMORY
+from .admission import AdmissionControlMiddleware, ADMISSION_CONTROL_ENABLED, configure_threadpool, render_metrics
 
-# Crea le tabelle nel database
-Base.metadata.create_all(bind=engine)
+# All'avvio: dimensione del threadpool (THREADPOOL_SIZE), migrazioni dello schema
+# (vedi app/migrations.py, DB_AUTO_MIGRATE), poi il pool dei job in background
+# e il consolidamento periodico dello storico, che vivono insieme all'applicazione
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    configure_threadpool()
+    ensure_schema(engine)
+    job_runner.start()
+    rollup_task.start()
+    yield
+    change_feed.close()
+    rollup_task.shutdown()
+    job_runner.shutdown()
 
 # Inizializzazione condizionale dell'app
 APP_ENV = os.getenv("APP_ENV", "dev")
@@ -22,6 +42,7 @@ fastapi_kwargs = {
     "title": "VarGroup Skill Matrix API",
     "description": "Backend unificato per la gestione delle competenze.",
     "version": "3.0.0",
+    "lifespan": lifespan,
 }
 if APP_ENV == "prod":
     fastapi_kwargs["docs_url"] = None
@@ -29,6 +50,22 @@ if APP_ENV == "prod":
 
 app = FastAPI(**fastapi_kwargs)
 
+# Controllo di ammissione per classe di route (vedi app/admission.py). Aggiunto
+# per primo così è il più interno: le risposte 304 della cache HTTP non
+# occupano posti e i 503 ricevono comunque gli header CORS e le metriche.
+if ADMISSION_CONTROL_ENABLED:
+    app.add_middleware(AdmissionControlMiddleware)
+    registry.add_collector(render_metrics)
+
+# Cache HTTP con ETag per i dati di riferimento (aggiunta prima del CORS,
+# così anche le risposte 304 ricevono gli header CORS)
+if HTTP_CACHE_ENABLED:
+    app.add_middleware(HTTPCacheMiddleware)
+
+# Con repliche in lettura: dopo una scrittura il client legge dal primario per qualche secondo
+if DATABASE_READ_URLS:
+    app.add_middleware(ReadYourWritesMiddleware)
+
 # Configurazione CORS
 origins = ["*"]
 app.add_middleware(
@@ -37,12 +74,36 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Header della paginazione a cursore leggibili dal browser
+    expose_headers=["X-Next-Cursor", "X-Total-Count", "ETag"],
 )
 
+# Metriche per richiesta (latenza, statement SQL, tempo sul DB, attesa del pool).
+# Aggiunto per ultimo così è il middleware più esterno e misura anche gli altri.
+if METRICS_ENABLED:
+    instrument_engine(engine)
+    if async_engine is not None:
+        instrument_engine(async_engine.sync_engine)
+    # Anche le repliche: le letture GET passano in gran parte da loro
+    for read_engine in read_engines:
+        instrument_engine(read_engine)
+    for read_engine in async_read_engines:
+        instrument_engine(read_engine.sync_engine)
+    app.add_middleware(MetricsMiddleware)
+
 # 2. Includi i router dell'API
 app.include_router(resources.router)
 app.include_router(skills.router)
 app.include_router(business_units.router)
+app.include_router(stats.router)
+app.include_router(imports.router)
+app.include_router(exports.router)
+app.include_router(matching.router)
+app.include_router(jobs.router)
+app.include_router(batch.router)
+app.include_router(autocomplete.router)
+app.include_router(changes.router)
+app.include_router(history.router)
 
 # --- MODIFICA CHIAVE: NUOVO METODO PER SERVIRE IL FRONTEND ---
 
@@ -51,6 +112,8 @@ static_files_dir = os.path.join(os.path.dirname(__file__), "static")
 
 # Crea una classe personalizzata per servire sempre index.html quando un file non viene trovato.
 # Questo è essenziale per il corretto funzionamento delle Single Page Applications.
+# Usata solo con STATIC_IN_MEMORY=false: di default i file sono serviti dalla
+# memoria, già compressi (vedi app/static_assets.py).
 class SPAStaticFiles(StaticFiles):
     async def get_response(self, path: str, scope):
         try:
@@ -66,7 +129,16 @@ def health_check():
     """Endpoint di health check per verificare che l'API sia attiva."""
     return {"status": "ok"}
 
+if METRICS_ENABLED:
+    @app.get("/api/metrics", tags=["Health Check"], response_class=PlainTextResponse)
+    def metrics():
+        """Metriche del processo in formato testuale Prometheus."""
+        return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 # Monta la cartella statica alla radice dell'applicazione.
 # Questa riga deve essere DOPO l'inclusione dei router API.
 # Qualsiasi richiesta che non corrisponde a un'API verrà gestita da qui.
-app.mount("/", SPAStaticFiles(directory=static_files_dir, html=True), name="static")
+if STATIC_IN_MEMORY:
+    app.mount("/", InMemoryStaticFiles(static_files_dir), name="static")
+else:
+    app.mount("/", SPAStaticFiles(directory=static_files_dir, html=True), name="static")
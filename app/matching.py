@@ -0,0 +1,246 @@
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from . import events, models
+
+# Matrice densa risorse × skill con i livelli posseduti (0 = skill assente).
+# Il ranking di un profilo richiesto diventa un'unica operazione vettoriale
+# su tutte le righe: per ogni skill la copertura è min(livello / richiesto, 1),
+# il punteggio è la media pesata delle coperture. Righe e colonne crescono
+# per raddoppio; le righe delle risorse eliminate vengono azzerate e riusate.
+# La matrice è costruita al primo utilizzo e aggiornata dagli eventi di crud.py.
+MAX_LEVEL = np.iinfo(np.uint8).max # I livelli oltre 255 vengono saturati
+
+
+class SkillMatrix:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.loaded = False
+        # Incrementato da ogni caricamento completato e da reset()
+        self._generation = 0
+        self._loading = 0
+        # Eventi notificati mentre un caricamento è in corso
+        self._pending: Optional[List[events.ChangeEvent]] = None
+        self._reset()
+
+    def _reset(self):
+        self._levels = np.zeros((0, 0), dtype=np.uint8)
+        self._resource_ids = np.zeros(0, dtype=np.int64) # 0 = riga libera
+        self._bu_ids = np.zeros(0, dtype=np.int64)
+        self._rows: Dict[int, int] = {}
+        self._cols: Dict[int, int] = {}
+        self._free_rows: List[int] = []
+        self._free_cols: List[int] = []
+        self._next_row = 0
+        self._next_col = 0
+
+    # --- Costruzione ---
+    def load(self, db: Session):
+        """(Ri)costruisce la matrice leggendo risorse e link dal database"""
+        # Query e costruzione avvengono fuori dal lock (in modalità asincrona ogni
+        # query cede l'event loop); gli eventi arrivati nel frattempo vengono
+        # riapplicati alla nuova matrice, come in search_index.SkillIndex.load.
+        with self._lock:
+            generation = self._generation
+            self._loading += 1
+            if self._pending is None:
+                self._pending = []
+        try:
+            resources = db.query(models.Resource.id, models.Resource.business_unit_id).order_by(models.Resource.id).all()
+            skill_ids = [skill_id for (skill_id,) in db.query(models.Skill.id).order_by(models.Skill.id)]
+            links = db.query(
+                models.ResourceSkillLink.resource_id,
+                models.ResourceSkillLink.skill_id,
+                models.ResourceSkillLink.level,
+            ).all()
+            fresh = SkillMatrix()
+            fresh._grow(len(resources), len(skill_ids))
+            fresh._rows = {resource_id: row for row, (resource_id, _) in enumerate(resources)}
+            fresh._cols = {skill_id: col for col, skill_id in enumerate(skill_ids)}
+            fresh._next_row, fresh._next_col = len(resources), len(skill_ids)
+            if resources:
+                fresh._resource_ids[:len(resources)] = [resource_id for resource_id, _ in resources]
+                fresh._bu_ids[:len(resources)] = [bu_id or 0 for _, bu_id in resources]
+            cells = [(fresh._rows[r], fresh._cols[s], lvl) for r, s, lvl in links if r in fresh._rows and s in fresh._cols]
+            if cells:
+                rows, cols, values = np.array(cells, dtype=np.int64).T
+                fresh._levels[rows, cols] = np.clip(values, 0, MAX_LEVEL)
+            with self._lock:
+                # Un altro caricamento o un reset() arrivati nel frattempo hanno la precedenza
+                if self._generation == generation:
+                    self._adopt(fresh)
+                    for event in self._pending:
+                        self._apply(event)
+                    self._generation += 1
+                    self.loaded = True
+        finally:
+            with self._lock:
+                self._loading -= 1
+                if not self._loading:
+                    self._pending = None
+
+    def ensure_loaded(self, db: Session):
+        if not self.loaded:
+            self.load(db)
+
+    def reset(self):
+        with self._lock:
+            self._reset()
+            self._generation += 1
+            self.loaded = False
+
+    # --- Manutenzione (chiamate con il lock acquisito) ---
+    def _adopt(self, other: "SkillMatrix"):
+        self._levels, self._resource_ids, self._bu_ids = other._levels, other._resource_ids, other._bu_ids
+        self._rows, self._cols = other._rows, other._cols
+        self._free_rows, self._free_cols = other._free_rows, other._free_cols
+        self._next_row, self._next_col = other._next_row, other._next_col
+
+    def _grow(self, rows: int, cols: int):
+        cur_rows, cur_cols = self._levels.shape
+        if rows <= cur_rows and cols <= cur_cols:
+            return
+        new_rows = max(rows, cur_rows * 2 if rows > cur_rows else cur_rows, 16)
+        new_cols = max(cols, cur_cols * 2 if cols > cur_cols else cur_cols, 16)
+        levels = np.zeros((new_rows, new_cols), dtype=np.uint8)
+        levels[:cur_rows, :cur_cols] = self._levels
+        self._levels = levels
+        if new_rows > cur_rows:
+            self._resource_ids = np.concatenate([self._resource_ids, np.zeros(new_rows - cur_rows, dtype=np.int64)])
+            self._bu_ids = np.concatenate([self._bu_ids, np.zeros(new_rows - cur_rows, dtype=np.int64)])
+
+    def _add_resource(self, resource_id: int, bu_id: Optional[int]):
+        row = self._rows.get(resource_id)
+        if row is None:
+            if self._free_rows:
+                row = self._free_rows.pop()
+            else:
+                row = self._next_row
+                self._next_row += 1
+                self._grow(self._next_row, self._levels.shape[1])
+            self._rows[resource_id] = row
+        self._resource_ids[row] = resource_id
+        self._bu_ids[row] = bu_id or 0
+        return row
+
+    def _remove_resource(self, resource_id: int):
+        row = self._rows.pop(resource_id, None)
+        if row is not None:
+            self._levels[row, :] = 0
+            self._resource_ids[row] = 0
+            self._bu_ids[row] = 0
+            self._free_rows.append(row)
+
+    def _column(self, skill_id: int) -> int:
+        col = self._cols.get(skill_id)
+        if col is None:
+            if self._free_cols:
+                col = self._free_cols.pop()
+            else:
+                col = self._next_col
+                self._next_col += 1
+                self._grow(self._levels.shape[0], self._next_col)
+            self._cols[skill_id] = col
+        return col
+
+    def _set_resource_skills(self, resource_id: int, before: Dict[int, int], after: Dict[int, int]):
+        row = self._rows.get(resource_id)
+        if row is None:
+            return
+        for skill_id in before:
+            col = self._cols.get(skill_id)
+            if col is not None:
+                self._levels[row, col] = 0
+        for skill_id, level in after.items():
+            self._levels[row, self._column(skill_id)] = min(max(level, 0), MAX_LEVEL)
+
+    def _apply(self, event: events.ChangeEvent):
+        if event.entity == "resource":
+            if event.op in ("create", "update"):
+                self._add_resource(event.id, event.data.get("business_unit_id"))
+            elif event.op == "delete":
+                self._remove_resource(event.id)
+        elif event.entity == "resource_skills":
+            self._set_resource_skills(event.id, event.data.get("before", {}), event.data.get("after", {}))
+        elif event.entity == "skill":
+            if event.op == "create":
+                self._column(event.id)
+            elif event.op == "delete":
+                col = self._cols.pop(event.id, None)
+                if col is not None:
+                    self._levels[:, col] = 0
+                    self._free_cols.append(col)
+        elif event.entity == "business_unit" and event.op == "delete":
+            for resource_id in event.data.get("resource_ids", []):
+                if event.data.get("action") == "migrate":
+                    row = self._rows.get(resource_id)
+                    if row is not None:
+                        self._bu_ids[row] = event.data.get("target_bu_id") or 0
+                else:
+                    self._remove_resource(resource_id)
+
+    def handle_event(self, event: events.ChangeEvent):
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append(event)
+            if self.loaded:
+                self._apply(event)
+
+    # --- Interrogazione ---
+    def match(
+        self,
+        profile: List[models.MatchSkill],
+        top_k: int = 10,
+        business_unit_id: Optional[int] = None,
+        min_score: float = 0.0,
+    ) -> List[Tuple[int, float, Dict[int, int]]]:
+        """
+        Restituisce fino a top_k tuple (resource_id, punteggio, livelli posseduti
+        per le skill del profilo) ordinate per punteggio decrescente.
+        """
+        if not profile:
+            raise ValueError("At least one skill is required.")
+        if len({item.skill_id for item in profile}) != len(profile):
+            raise ValueError("Each skill can appear only once in the profile.")
+        if any(item.level <= 0 or item.weight <= 0 for item in profile):
+            raise ValueError("Required levels and weights must be positive.")
+        with self._lock:
+            missing = [item.skill_id for item in profile if item.skill_id not in self._cols]
+            if missing:
+                raise ValueError(f"Skill with ID {missing[0]} not found.")
+            cols = np.array([self._cols[item.skill_id] for item in profile], dtype=np.int64)
+            required = np.array([item.level for item in profile], dtype=np.float32)
+            weights = np.array([item.weight for item in profile], dtype=np.float32)
+
+            n = self._next_row
+            active = self._resource_ids[:n] != 0
+            if business_unit_id is not None:
+                active &= self._bu_ids[:n] == business_unit_id
+            rows = np.flatnonzero(active)
+            if rows.size == 0:
+                return []
+            have = self._levels[np.ix_(rows, cols)]
+            resource_ids = self._resource_ids[rows]
+
+        coverage = np.minimum(have.astype(np.float32) / required, 1.0)
+        scores = coverage @ weights / weights.sum()
+        # Le risorse che non coprono nessuna skill del profilo non vengono restituite
+        keep = np.flatnonzero((scores > 0) & (scores >= min_score))
+        if keep.size > top_k:
+            # Selezione parziale O(n): si tengono i punteggi >= al k-esimo, pareggi inclusi
+            threshold = -np.partition(-scores[keep], top_k - 1)[top_k - 1]
+            keep = keep[scores[keep] >= threshold]
+        # Ordinamento per punteggio decrescente, a parità per id crescente
+        keep = keep[np.lexsort((resource_ids[keep], -scores[keep]))][:top_k]
+        skill_ids = [item.skill_id for item in profile]
+        return [
+            (int(resource_ids[i]), float(scores[i]), dict(zip(skill_ids, have[i].tolist())))
+            for i in keep
+        ]
+
+
+skill_matrix = SkillMatrix()
+events.subscribe(skill_matrix.handle_event)
@@ -0,0 +1,244 @@
+import contextvars
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import event
+from starlette.routing import Match
+
+logger = logging.getLogger(__name__)
+
+# --- Metriche per richiesta in formato Prometheus ---
+# Un middleware ASGI misura ogni richiesta e apre un contesto (contextvar) in cui
+# gli hook before/after_cursor_execute del motore accumulano numero di statement
+# e tempo passato sul database; il tempo di attesa per ottenere una connessione
+# dal pool viene misurato avvolgendo Engine.raw_connection. Le etichette usano il
+# template della route (es. /api/resources/{resource_id}) per non far crescere
+# la cardinalità. I valori sono per processo: con più worker ognuno espone i propri.
+# Gli stream SSE (text/event-stream, es. GET /api/changes) durano quanto la
+# connessione: vengono contati ma restano fuori dall'istogramma della latenza e
+# dal log delle richieste lente.
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+# Soglia in millisecondi oltre la quale la richiesta viene loggata con i suoi statement (0 = disattivato)
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "0"))
+SLOW_REQUEST_MAX_STATEMENTS = 50
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250, 500)
+
+
+@dataclass
+class RequestStats:
+    statements: int = 0
+    db_time: float = 0.0
+    pool_wait: float = 0.0
+    # (sql, secondi) raccolti solo se il log delle richieste lente è attivo
+    log: Optional[List[Tuple[str, float]]] = None
+    _started: List[float] = field(default_factory=list)
+
+
+_current: contextvars.ContextVar[Optional[RequestStats]] = contextvars.ContextVar("request_stats", default=None)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...]) -> str:
+    return ",".join(f'{name}="{_escape(str(value))}"' for name, value in zip(names, values))
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, label_names: Tuple[str, ...]):
+        self.name, self.help, self.label_names = name, help_text, label_names
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, labels: Tuple[str, ...], amount: float = 1.0):
+        self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        lines.extend(f"{self.name}{{{_labels(self.label_names, key)}}} {value:g}" for key, value in sorted(self._values.items()))
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, label_names: Tuple[str, ...], buckets: Tuple[float, ...]):
+        self.name, self.help, self.label_names, self.buckets = name, help_text, label_names, buckets
+        # labels -> [conteggi per bucket (non cumulativi), somma, totale]
+        self._values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, labels: Tuple[str, ...], value: float):
+        entry = self._values.get(labels)
+        if entry is None:
+            entry = self._values[labels] = [[0] * len(self.buckets), 0.0, 0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                entry[0][i] += 1
+                break
+        entry[1] += value
+        entry[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, (counts, total, count) in sorted(self._values.items()):
+            labels = _labels(self.label_names, key)
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{{{labels},le="{bound:g}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{labels},le="+Inf"}} {count}')
+            lines.append(f"{self.name}_sum{{{labels}}} {total:g}")
+            lines.append(f"{self.name}_count{{{labels}}} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        route = ("method", "route")
+        self.requests = Counter("http_requests_total", "Richieste HTTP servite.", ("method", "route", "status"))
+        self.latency = Histogram("http_request_duration_seconds", "Durata delle richieste HTTP.", route, LATENCY_BUCKETS)
+        self.statements = Histogram("db_statements_per_request", "Statement SQL eseguiti per richiesta.", route, STATEMENT_BUCKETS)
+        self.db_time = Counter("db_query_seconds_total", "Tempo totale passato ad eseguire statement SQL.", route)
+        self.pool_wait = Counter("db_pool_checkout_seconds_total", "Tempo totale di attesa per ottenere una connessione dal pool.", route)
+        self._engines = []
+        # Funzioni che restituiscono righe aggiuntive (es. controllo di ammissione)
+        self._collectors = []
+
+    def observe(self, method: str, route: str, status: int, duration: Optional[float], stats: RequestStats):
+        """duration None: richiesta senza una latenza significativa (stream SSE)"""
+        with self._lock:
+            self.requests.inc((method, route, str(status)))
+            if duration is not None:
+                self.latency.observe((method, route), duration)
+            self.statements.observe((method, route), stats.statements)
+            self.db_time.inc((method, route), stats.db_time)
+            self.pool_wait.inc((method, route), stats.pool_wait)
+
+    def add_engine(self, engine):
+        self._engines.append(engine)
+
+    def add_collector(self, collector):
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        with self._lock:
+            lines = []
+            for metric in (self.requests, self.latency, self.statements, self.db_time, self.pool_wait):
+                lines.extend(metric.render())
+        pools = [(str(engine.url.render_as_string(hide_password=True)), engine.pool) for engine in self._engines]
+        pools = [(url, pool) for url, pool in pools if hasattr(pool, "checkedout")]
+        if pools:
+            lines += ["# HELP db_pool_checked_out Connessioni attualmente in uso.", "# TYPE db_pool_checked_out gauge"]
+            lines += [f'db_pool_checked_out{{engine="{_escape(url)}"}} {pool.checkedout()}' for url, pool in pools]
+            lines += ["# HELP db_pool_size Dimensione configurata del pool.", "# TYPE db_pool_size gauge"]
+            lines += [f'db_pool_size{{engine="{_escape(url)}"}} {pool.size()}' for url, pool in pools]
+        for collector in self._collectors:
+            lines.extend(collector())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+
+# --- Hook sul motore ---
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current.get()
+    if stats is not None:
+        stats._started.append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current.get()
+    if stats is None or not stats._started:
+        return
+    elapsed = time.perf_counter() - stats._started.pop()
+    stats.statements += 1
+    stats.db_time += elapsed
+    if stats.log is not None and len(stats.log) < SLOW_REQUEST_MAX_STATEMENTS:
+        stats.log.append((statement, elapsed))
+
+def instrument_engine(engine):
+    """Registra gli hook di misura su un Engine sincrono (per un AsyncEngine usare .sync_engine)"""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+    # Non esiste un evento "prima del checkout": Connection ottiene la
+    # connessione DBAPI da engine.raw_connection(), che viene quindi avvolto
+    raw_connection = engine.raw_connection
+
+    def timed_raw_connection():
+        start = time.perf_counter()
+        try:
+            return raw_connection()
+        finally:
+            stats = _current.get()
+            if stats is not None:
+                stats.pool_wait += time.perf_counter() - start
+
+    engine.raw_connection = timed_raw_connection
+    registry.add_engine(engine)
+
+
+# --- Middleware ---
+def _route_template(app, scope) -> str:
+    route = scope.get("route")
+    if route is None:
+        # Risposte prodotte prima del routing (es. 304 della cache HTTP):
+        # si cerca la route corrispondente per avere comunque l'etichetta giusta
+        for candidate in app.router.routes:
+            if candidate.matches(scope)[0] == Match.FULL:
+                route = candidate
+                break
+    if route is None:
+        return "unmatched"
+    return getattr(route, "path", "") or "/"
+
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        stats = RequestStats(log=[] if SLOW_REQUEST_MS > 0 else None)
+        token = _current.set(stats)
+        status = 500
+        streaming = False
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status, streaming
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                streaming = any(
+                    name.lower() == b"content-type" and value.startswith(b"text/event-stream")
+                    for name, value in message.get("headers", [])
+                )
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            duration = time.perf_counter() - start
+            _current.reset(token)
+            route = _route_template(scope["app"], scope)
+            registry.observe(scope["method"], route, status, None if streaming else duration, stats)
+            if stats.log is not None and not streaming and duration * 1000 >= SLOW_REQUEST_MS:
+                _log_slow_request(scope, route, status, duration, stats)
+
+
+def _log_slow_request(scope, route: str, status: int, duration: float, stats: RequestStats):
+    lines = [
+        f"Richiesta lenta: {scope['method']} {scope['path']} (route {route}) -> {status} in {duration * 1000:.1f} ms, "
+        f"{stats.statements} statement, DB {stats.db_time * 1000:.1f} ms, attesa pool {stats.pool_wait * 1000:.1f} ms"
+    ]
+    for statement, elapsed in stats.log:
+        lines.append(f"  [{elapsed * 1000:.1f} ms] {' '.join(statement.split())[:500]}")
+    if stats.statements > len(stats.log):
+        lines.append(f"  ... altri {stats.statements - len(stats.log)} statement")
+    logger.warning("\n".join(lines))
@@ -0,0 +1,264 @@
+import argparse
+import logging
+import os
+import sys
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Callable, List
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, func, inspect, select, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from . import history, models
+from .database import Base
+
+logger = logging.getLogger(__name__)
+
+# --- Migrazione dati: label CSV -> tabelle normalizzate ---
+# Le versioni precedenti salvavano le label come stringa separata da virgole
+# nelle colonne 'skills.labels' e 'resource_skill_link.labels'. Questa
+# migrazione copia i valori nelle tabelle 'labels', 'skill_labels' e
+# 'resource_skill_link_labels' e poi svuota le vecchie colonne, così una
+# seconda esecuzione non ha effetti.
+
+def _split_csv(value: str):
+    return list(dict.fromkeys(part.strip() for part in value.split(",") if part.strip()))
+
+def _label_ids(conn, names):
+    """Restituisce {nome: id} creando le label mancanti"""
+    labels = models.Label.__table__
+    ids = dict(conn.execute(select(labels.c.name, labels.c.id).where(labels.c.name.in_(names))).all())
+    missing = [name for name in names if name not in ids]
+    if missing:
+        conn.execute(labels.insert(), [{"name": name} for name in missing])
+        ids.update(conn.execute(select(labels.c.name, labels.c.id).where(labels.c.name.in_(missing))).all())
+    return ids
+
+def migrate_csv_labels(engine: Engine):
+    inspector = inspect(engine)
+    targets = (
+        ("skills", ["id"], models.skill_labels, ["skill_id"]),
+        ("resource_skill_link", ["resource_id", "skill_id"], models.resource_skill_link_labels, ["resource_id", "skill_id"]),
+    )
+    with engine.begin() as conn:
+        for table, key_columns, assoc, assoc_columns in targets:
+            if "labels" not in {column["name"] for column in inspector.get_columns(table)}:
+                continue
+            rows = conn.execute(text(
+                f"SELECT {', '.join(key_columns)}, labels FROM {table} "
+                "WHERE labels IS NOT NULL AND labels <> ''"
+            )).all()
+            if not rows:
+                continue
+            parsed = [(row[:-1], _split_csv(row[-1])) for row in rows]
+            ids = _label_ids(conn, sorted({name for _, names in parsed for name in names}))
+            assoc_rows = [
+                {**dict(zip(assoc_columns, keys)), "label_id": ids[name]}
+                for keys, names in parsed
+                for name in names
+            ]
+            if assoc_rows:
+                conn.execute(assoc.insert(), assoc_rows)
+            conn.execute(text(f"UPDATE {table} SET labels = NULL WHERE labels IS NOT NULL"))
+
+
+# --- Migrazioni versionate dello schema ---
+# Ogni migrazione ha un numero progressivo; la tabella 'schema_version' registra
+# quelle già applicate. Le migrazioni sono idempotenti (controllano lo stato
+# reale dello schema), quindi vengono applicate senza problemi anche a database
+# creati dalle versioni che usavano create_all all'avvio.
+#
+#     python -m app.migrations upgrade     # applica le migrazioni mancanti
+#     python -m app.migrations current     # versione attuale e migrazioni in sospeso
+#     python -m app.migrations explain     # piani di esecuzione delle query principali
+#
+# All'avvio l'applicazione applica le migrazioni solo con DB_AUTO_MIGRATE=true
+# (default); con false i worker partono senza eseguire DDL e segnalano nel log
+# uno schema non aggiornato.
+DB_AUTO_MIGRATE = os.getenv("DB_AUTO_MIGRATE", "true").lower() in ("1", "true", "yes")
+
+# Tabella separata dai modelli: non deve essere creata da create_all
+schema_version = Table(
+    "schema_version",
+    MetaData(),
+    Column("version", Integer, primary_key=True, autoincrement=False),
+    Column("description", String(200), nullable=False),
+    Column("applied_at", DateTime(timezone=True), nullable=False),
+)
+
+
+@dataclass
+class Migration:
+    version: int
+    description: str
+    apply: Callable[[Engine], None]
+
+
+def _create_tables(*tables):
+    def apply(engine: Engine):
+        Base.metadata.create_all(bind=engine, tables=list(tables) or None)
+    return apply
+
+def _create_indexes(*indexes):
+    def apply(engine: Engine):
+        inspector = inspect(engine)
+        for index in indexes:
+            existing = {item["name"] for item in inspector.get_indexes(index.table.name)}
+            if index.name not in existing:
+                index.create(bind=engine)
+    return apply
+
+def _add_columns(table, *names: str):
+    """Aggiunge le colonne del modello mancanti nel database (crea la tabella se non c'è)"""
+    def apply(engine: Engine):
+        table.create(bind=engine, checkfirst=True)
+        existing = {column["name"] for column in inspect(engine).get_columns(table.name)}
+        with engine.begin() as conn:
+            for name in names:
+                if name not in existing:
+                    column_type = table.c[name].type.compile(dialect=engine.dialect)
+                    conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {name} {column_type}"))
+    return apply
+
+def _index(table, name: str):
+    return next(index for index in table.indexes if index.name == name)
+
+def _start_skill_history(engine: Engine):
+    """Tabelle dello storico; i livelli attuali diventano il punto di partenza"""
+    Base.metadata.create_all(bind=engine, tables=[models.SkillLevelChange.__table__, models.SkillLevelRollup.__table__])
+    with Session(engine) as db:
+        if db.query(models.SkillLevelChange.id).first() is None:
+            history.record_links(db, models.ResourceSkillLink.level > 0, baseline=True)
+            db.commit()
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, "Schema iniziale", _create_tables()),
+    Migration(2, "Label CSV nelle tabelle normalizzate", migrate_csv_labels),
+    Migration(3, "Indici per ricerca, statistiche e business unit", _create_indexes(
+        _index(models.ResourceSkillLink.__table__, "ix_resource_skill_link_skill_level"),
+        _index(models.Resource.__table__, "ix_resources_business_unit_id"),
+        _index(models.skill_labels, "ix_skill_labels_label_id"),
+        _index(models.resource_skill_link_labels, "ix_resource_skill_link_labels_label_id"),
+    )),
+    Migration(4, "Storico dei livelli delle skill", _start_skill_history),
+    Migration(5, "Heartbeat dei job in background", _add_columns(models.BackgroundJob.__table__, "updated_at")),
+    Migration(6, "Indice per la matrice storica dei livelli", _create_indexes(
+        _index(models.SkillLevelChange.__table__, "ix_skill_level_history_resource_skill_changed_at"),
+    )),
+    Migration(7, "Fotografie periodiche dei livelli", _create_tables(models.SkillLevelCheckpoint.__table__)),
+]
+
+LATEST_VERSION = MIGRATIONS[-1].version
+
+
+def current_version(engine: Engine) -> int:
+    if not inspect(engine).has_table(schema_version.name):
+        return 0
+    with engine.connect() as conn:
+        return conn.execute(select(func.max(schema_version.c.version))).scalar() or 0
+
+@contextmanager
+def _migration_lock(engine: Engine):
+    """Con MySQL/MariaDB un solo processo alla volta applica le migrazioni"""
+    if engine.dialect.name not in ("mysql", "mariadb"):
+        yield
+        return
+    with engine.connect() as conn:
+        conn.execute(text("SELECT GET_LOCK('skill_matrix_migrations', 300)"))
+        try:
+            yield
+        finally:
+            conn.execute(text("SELECT RELEASE_LOCK('skill_matrix_migrations')"))
+
+def upgrade(engine: Engine) -> List[Migration]:
+    """Applica in ordine le migrazioni mancanti e restituisce quelle eseguite"""
+    applied = []
+    with _migration_lock(engine):
+        schema_version.create(bind=engine, checkfirst=True)
+        version = current_version(engine)
+        for migration in MIGRATIONS:
+            if migration.version <= version:
+                continue
+            logger.info("Migrazione %d: %s", migration.version, migration.description)
+            migration.apply(engine)
+            with engine.begin() as conn:
+                conn.execute(schema_version.insert().values(
+                    version=migration.version,
+                    description=migration.description,
+                    applied_at=datetime.now(timezone.utc),
+                ))
+            applied.append(migration)
+    return applied
+
+def ensure_schema(engine: Engine):
+    """Chiamata all'avvio dell'applicazione"""
+    if DB_AUTO_MIGRATE:
+        upgrade(engine)
+        return
+    version = current_version(engine)
+    if version < LATEST_VERSION:
+        logger.warning(
+            "Schema del database alla versione %d, attesa %d: eseguire 'python -m app.migrations upgrade'",
+            version, LATEST_VERSION,
+        )
+
+
+# --- Piani di esecuzione ---
+def _explain_queries():
+    Resource, Link, Skill, Label = models.Resource, models.ResourceSkillLink, models.Skill, models.Label
+    return [
+        ("Risorse: pagina con cursore", select(Resource).where(Resource.id > 1000).order_by(Resource.id).limit(100)),
+        ("Risorse: skill della pagina", select(Link.resource_id, Link.skill_id, Link.level, Skill.name)
+            .join(Skill, Skill.id == Link.skill_id).where(Link.resource_id.in_([1, 2, 3]))
+            .order_by(Link.resource_id, Link.skill_id)),
+        ("Ricerca: skill a livello minimo", select(Link.resource_id).where(Link.skill_id == 1, Link.level >= 3)),
+        ("Ricerca: skill e business unit", select(Resource.id).join(Link, Link.resource_id == Resource.id)
+            .where(Link.skill_id == 1, Link.level >= 3, Resource.business_unit_id == 1).order_by(Resource.id)),
+        ("Ricerca: label dei link", select(models.resource_skill_link_labels.c.resource_id)
+            .join(Label, Label.id == models.resource_skill_link_labels.c.label_id).where(Label.name == "backend")),
+        ("Statistiche: livelli per skill", select(Link.skill_id, Link.level, func.count()).group_by(Link.skill_id, Link.level)),
+        ("Statistiche: risorse per business unit", select(Resource.business_unit_id, func.count(Resource.id))
+            .group_by(Resource.business_unit_id)),
+        ("Business unit: risorse da migrare", select(Resource.id).where(Resource.business_unit_id == 1).order_by(Resource.id)),
+        ("Skill per label", select(Skill.id).join(models.skill_labels).join(Label).where(Label.name == "backend")),
+    ]
+
+def explain(engine: Engine, out=sys.stdout):
+    prefix = "EXPLAIN QUERY PLAN" if engine.dialect.name == "sqlite" else "EXPLAIN"
+    with engine.connect() as conn:
+        for description, statement in _explain_queries():
+            sql = str(statement.compile(dialect=engine.dialect, compile_kwargs={"literal_binds": True}))
+            result = conn.exec_driver_sql(f"{prefix} {sql}")
+            print(f"== {description}", file=out)
+            print("   " + " ".join(sql.split()), file=out)
+            columns = list(result.keys())
+            for row in result:
+                print("   " + " | ".join(f"{column}={value}" for column, value in zip(columns, row)), file=out)
+            print(file=out)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Migrazioni dello schema della Skill Matrix")
+    parser.add_argument("command", choices=["upgrade", "current", "explain"])
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    from .database import engine
+    if args.command == "upgrade":
+        applied = upgrade(engine)
+        print(f"Applicate {len(applied)} migrazioni, schema alla versione {current_version(engine)}")
+    elif args.command == "current":
+        version = current_version(engine)
+        print(f"Versione attuale: {version} (ultima disponibile: {LATEST_VERSION})")
+        for migration in MIGRATIONS:
+            if migration.version > version:
+                print(f"  in sospeso: {migration.version} - {migration.description}")
+    else:
+        explain(engine)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,65 +1,88 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Table
+from sqlalchemy import Column, Integer, SmallInteger, String, Text, Boolean, Date, DateTime, ForeignKey, ForeignKeyConstraint, Table, Index
 from sqlalchemy.orm import relationship, Mapped, mapped_column
 from pydantic import BaseModel, ConfigDict
-from typing import List, Optional
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional, Union
 
 from .database import Base
 
 # --- Modelli SQLAlchemy (Tabelle del Database) ---
 
+# --- Label normalizzate ---
+# Ogni label esiste una sola volta nella tabella 'labels' (nome indicizzato);
+# skill e link risorsa-skill vi puntano tramite tabelle di associazione.
+class Label(Base):
+    __tablename__ = "labels"
+    id: Mapped[int] = mapped_column(primary_key=True)
+    name: Mapped[str] = mapped_column(String(100), unique=True, index=True, nullable=False)
+
+skill_labels = Table(
+    "skill_labels",
+    Base.metadata,
+    Column("skill_id", ForeignKey("skills.id", ondelete="CASCADE"), primary_key=True),
+    Column("label_id", ForeignKey("labels.id", ondelete="CASCADE"), primary_key=True),
+    Index("ix_skill_labels_label_id", "label_id"),
+)
+
+resource_skill_link_labels = Table(
+    "resource_skill_link_labels",
+    Base.metadata,
+    Column("resource_id", Integer, primary_key=True),
+    Column("skill_id", Integer, primary_key=True),
+    Column("label_id", ForeignKey("labels.id", ondelete="CASCADE"), primary_key=True),
+    ForeignKeyConstraint(
+        ["resource_id", "skill_id"],
+        ["resource_skill_link.resource_id", "resource_skill_link.skill_id"],
+        ondelete="CASCADE",
+    ),
+    Index("ix_resource_skill_link_labels_label_id", "label_id"),
+)
+
+class LabelledMixin:
+    """Operazioni comuni sulle label per Skill e ResourceSkillLink (relazione 'labels')"""
+
+    @property
+    def labels_list(self) -> List[str]:
+        """Restituisce i nomi delle label associate"""
+        return [label.name for label in self.labels]
+
+    def add_label(self, label: Label):
+        """Aggiunge una label se non esiste già"""
+        if label not in self.labels:
+            self.labels.append(label)
+
+    def remove_label(self, name: str):
+        """Rimuove una label (per nome) se esiste"""
+        name = name.strip()
+        for label in list(self.labels):
+            if label.name == name:
+                self.labels.remove(label)
+
+    def has_label(self, name: str) -> bool:
+        """Verifica se una label esiste"""
+        return name.strip() in self.labels_list
+
 # Tabella di associazione per la relazione Many-to-Many tra Risorse e Skills
 # Contiene anche il livello della competenza.
-class ResourceSkillLink(Base):
+class ResourceSkillLink(LabelledMixin, Base):
     __tablename__ = 'resource_skill_link'
+    # Indice per la ricerca "risorse con skill X a livello >= N"
+    __table_args__ = (Index('ix_resource_skill_link_skill_level', 'skill_id', 'level'),)
     resource_id: Mapped[int] = mapped_column(ForeignKey('resources.id'), primary_key=True)
     skill_id: Mapped[int] = mapped_column(ForeignKey('skills.id'), primary_key=True)
     level: Mapped[int] = mapped_column(Integer, nullable=False)
-    # Ora 'labels' può contenere più label separate da virgole
-    labels: Mapped[Optional[str]] = mapped_column(String(255), nullable=True)
 
     # Relazioni per accedere agli oggetti Resource e Skill direttamente dal link
     skill: Mapped["Skill"] = relationship(back_populates="resource_links")
-
-    @property
-    def labels_list(self) -> List[str]:
-        """Converte la stringa labels in una lista"""
-        if not self.labels:
-            return []
-        return [label.strip() for label in self.labels.split(',') if label.strip()]
-
-    def set_labels_from_list(self, labels_list: List[str]):
-        """Imposta le labels da una lista di stringhe"""
-        if labels_list:
-            self.labels = ','.join([label.strip() for label in labels_list if label.strip()])
-        else:
-            self.labels = None # Usa None invece di stringa vuota per i campi nullable
-
-    def add_label(self, label: str):
-        """Aggiunge una label se non esiste già"""
-        label = label.strip()
-        if not label:
-            return
-
-        current_labels = self.labels_list
-        if label not in current_labels:
-            current_labels.append(label)
-            self.set_labels_from_list(current_labels)
-
-    def remove_label(self, label: str):
-        """Rimuove una label se esiste"""
-        label = label.strip()
-        current_labels = self.labels_list
-        if label in current_labels:
-            current_labels.remove(label)
-            self.set_labels_from_list(current_labels)
-
-    def has_label(self, label: str) -> bool:
-        """Verifica se una label esiste"""
-        return label.strip() in self.labels_list
-
+    # Caricate con selectin: una sola query IN per tutti i link di una pagina
+    labels: Mapped[List[Label]] = relationship(
+        secondary=resource_skill_link_labels, lazy="selectin", order_by=Label.name
+    )
 
 class Resource(Base):
     __tablename__ = "resources"
+    # Indice per le risorse di una BU (statistiche, filtri, eliminazione a blocchi di id)
+    __table_args__ = (Index('ix_resources_business_unit_id', 'business_unit_id', 'id'),)
     id: Mapped[int] = mapped_column(primary_key=True, index=True)
     nome: Mapped[str] = mapped_column(String(100), nullable=False)
     cognome: Mapped[str] = mapped_column(String(100), nullable=False)
@@ -70,53 +93,18 @@ class Resource(Base):
     business_unit: Mapped["BusinessUnit"] = relationship(back_populates="resources")
 
     # La relazione 'skills' non è più necessaria qui, usiamo 'skill_links'
-    skill_links: Mapped[List["ResourceSkillLink"]] = relationship(cascade="all, delete-orphan")
+    skill_links: Mapped[List["ResourceSkillLink"]] = relationship(
+        cascade="all, delete-orphan", order_by="ResourceSkillLink.skill_id"
+    )
 
-class Skill(Base):
+class Skill(LabelledMixin, Base):
     __tablename__ = "skills"
     id: Mapped[int] = mapped_column(primary_key=True, index=True)
     name: Mapped[str] = mapped_column(String(100), unique=True, nullable=False)
 
     resource_links: Mapped[List["ResourceSkillLink"]] = relationship(back_populates="skill", cascade="all, delete-orphan")
 
-    labels: Mapped[Optional[str]] = mapped_column(String(100), nullable=True)
-
-    @property
-    def labels_list(self) -> List[str]:
-        """Converte la stringa labels in una lista"""
-        if not self.labels:
-            return []
-        return [label.strip() for label in self.labels.split(',') if label.strip()]
-
-    def set_labels_from_list(self, labels_list: List[str]):
-        """Imposta le labels da una lista di stringhe"""
-        if labels_list:
-            self.labels = ','.join([label.strip() for label in labels_list if label.strip()])
-        else:
-            self.labels = None # Usa None invece di stringa vuota per i campi nullable
-
-    def add_label(self, label: str):
-        """Aggiunge una label se non esiste già"""
-        label = label.strip()
-        if not label:
-            return
-
-        current_labels = self.labels_list
-        if label not in current_labels:
-            current_labels.append(label)
-            self.set_labels_from_list(current_labels)
-
-    def remove_label(self, label: str):
-        """Rimuove una label se esiste"""
-        label = label.strip()
-        current_labels = self.labels_list
-        if label in current_labels:
-            current_labels.remove(label)
-            self.set_labels_from_list(current_labels)
-
-    def has_label(self, label: str) -> bool:
-        """Verifica se una label esiste"""
-        return label.strip() in self.labels_list
+    labels: Mapped[List[Label]] = relationship(secondary=skill_labels, lazy="selectin", order_by=Label.name)
 
 class BusinessUnit(Base):
     __tablename__ = "business_units"
@@ -125,6 +113,68 @@ class BusinessUnit(Base):
 
     resources: Mapped[List["Resource"]] = relationship(back_populates="business_unit")
 
+# Stato dei job in background (vedi jobs.py): persistito per essere consultabile
+# da qualsiasi worker e sopravvivere ai riavvii
+class BackgroundJob(Base):
+    __tablename__ = "jobs"
+    id: Mapped[str] = mapped_column(String(32), primary_key=True)
+    kind: Mapped[str] = mapped_column(String(50), nullable=False)
+    status: Mapped[str] = mapped_column(String(20), nullable=False, index=True)
+    done: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    total: Mapped[Optional[int]] = mapped_column(Integer)
+    result: Mapped[Optional[str]] = mapped_column(Text) # JSON
+    error: Mapped[Optional[str]] = mapped_column(Text)
+    cancel_requested: Mapped[bool] = mapped_column(Boolean, nullable=False, default=False)
+    owner: Mapped[Optional[str]] = mapped_column(String(100)) # host:pid del processo che lo esegue
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    started_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True))
+    finished_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True))
+    # Heartbeat: aggiornato periodicamente dal processo proprietario finché il job è attivo
+    updated_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True))
+
+# Storico dei livelli (vedi history.py): una riga per ogni variazione del livello
+# di una risorsa su una skill, con il livello e la BU precedenti (livello 0 = skill
+# assente). Senza foreign key: lo storico resta dopo le eliminazioni.
+class SkillLevelChange(Base):
+    __tablename__ = "skill_level_history"
+    __table_args__ = (
+        Index('ix_skill_level_history_resource_skill', 'resource_id', 'skill_id', 'id'),
+        # Ultima variazione di ogni coppia (risorsa, skill) fino a un istante, senza leggere la tabella
+        Index('ix_skill_level_history_resource_skill_changed_at', 'resource_id', 'skill_id', 'changed_at', 'id'),
+        Index('ix_skill_level_history_skill_changed_at', 'skill_id', 'changed_at'),
+        Index('ix_skill_level_history_changed_at', 'changed_at'),
+    )
+    id: Mapped[int] = mapped_column(primary_key=True)
+    changed_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    resource_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    skill_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    business_unit_id: Mapped[Optional[int]] = mapped_column(Integer)
+    level: Mapped[int] = mapped_column(SmallInteger, nullable=False)
+    previous_level: Mapped[int] = mapped_column(SmallInteger, nullable=False)
+    previous_business_unit_id: Mapped[Optional[int]] = mapped_column(Integer)
+
+# Consolidamento giornaliero dello storico: variazione netta del numero di risorse
+# per (giorno, skill, BU, livello). Le serie temporali sommano queste righe invece
+# di rileggere tutte le variazioni.
+class SkillLevelRollup(Base):
+    __tablename__ = "skill_level_daily"
+    day: Mapped[date] = mapped_column(Date, primary_key=True)
+    skill_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    business_unit_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    level: Mapped[int] = mapped_column(SmallInteger, primary_key=True)
+    delta: Mapped[int] = mapped_column(Integer, nullable=False)
+
+# Fotografia periodica dei livelli (vedi history.py): i livelli in vigore alla fine
+# di 'day' per ogni coppia (risorsa, skill) con livello >= 1. La matrice a una data
+# parte dall'ultima fotografia precedente e applica solo le variazioni successive.
+class SkillLevelCheckpoint(Base):
+    __tablename__ = "skill_level_checkpoint"
+    day: Mapped[date] = mapped_column(Date, primary_key=True)
+    resource_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    skill_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    business_unit_id: Mapped[Optional[int]] = mapped_column(Integer)
+    level: Mapped[int] = mapped_column(SmallInteger, nullable=False)
+
 
 # --- Modelli Pydantic (Validazione Dati API) ---
 
@@ -150,7 +200,7 @@ class SkillSchema(SkillBase):
         return cls(
             id=skill.id,
             name=skill.name,
-            labels=skill.labels_list  # converte la stringa in lista
+            labels=skill.labels_list  # converte le label in lista di nomi
         )
 
 
@@ -163,6 +213,9 @@ class SkillLabelRemove(BaseModel):
 class SkillLabelsUpdate(BaseModel):
     labels: List[str]
 
+class SkillUpsert(SkillBase):
+    labels: Optional[List[str]] = None # None = label invariate (o nessuna, se la skill è nuova)
+
 # Business Unit
 class BusinessUnitBase(BaseModel):
     name: str
@@ -178,6 +231,21 @@ class BuDeleteOptions(BaseModel):
     action: str # 'migrate' o 'delete'
     target_bu_id: Optional[int] = None
 
+# Job in background
+class JobSchema(BaseModel):
+    id: str
+    kind: str
+    status: str # queued, running, succeeded, failed, cancelled
+    done: int = 0
+    total: Optional[int] = None
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    cancel_requested: bool = False
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    model_config = orm_config
+
 # Resource
 class ResourceSkillSchema(BaseModel):
     skill_id: int
@@ -196,6 +264,19 @@ class ResourceBase(BaseModel):
 class ResourceCreate(ResourceBase):
     pass
 
+# Corpo di PUT /api/resources/by-email/{email}: l'email è nel percorso
+class ResourceUpsert(BaseModel):
+    nome: str
+    cognome: str
+    numero: Optional[str] = None
+    business_unit_id: int
+
+# Esito di un upsert per chiave naturale (email o nome)
+class UpsertResult(BaseModel):
+    id: int
+    key: str
+    status: str # 'created', 'updated', 'unchanged'
+
 # Schema per la risposta, per mostrare i dati in modo più leggibile
 class ResourceSchema(BaseModel):
     id: int
@@ -207,7 +288,165 @@ class ResourceSchema(BaseModel):
     skills: List[ResourceSkillSchema]
     model_config = orm_config
 
+class SkillCriterion(BaseModel):
+    skill_id: int
+    min_level: int = 0
+
 class ResourceSkillUpdate(BaseModel):
     skill_id: int
     level: int
-    labels: Optional[List[str]] = None # Ora una lista di label in input
\ No newline at end of file
+    labels: Optional[List[str]] = None # Ora una lista di label in input
+
+class ResourceSkillPatch(BaseModel):
+    upsert: List[ResourceSkillUpdate] = [] # Skill da aggiungere o aggiornare
+    remove: List[int] = [] # skill_id da rimuovere
+
+# Statistiche
+class SkillStat(BaseModel):
+    skill_id: int
+    name: str
+    count: int # Numero di risorse che possiedono la skill
+    average_level: float
+
+class BusinessUnitStat(BaseModel):
+    business_unit_id: int
+    name: str
+    resources: int
+
+class LevelBucket(BaseModel):
+    level: int
+    count: int
+
+class StatsSummary(BaseModel):
+    total_resources: int
+    total_skills: int
+    total_business_units: int
+    top_skills: List[SkillStat]
+    business_units: List[BusinessUnitStat]
+    levels: List[LevelBucket]
+
+# Import massivo
+class ImportSkill(BaseModel):
+    skill: Optional[str] = None # Nome della skill, in alternativa a skill_id
+    skill_id: Optional[int] = None
+    level: int
+    labels: Optional[List[str]] = None
+
+class ResourceImportRow(BaseModel):
+    nome: str
+    cognome: str
+    email: str
+    numero: Optional[str] = None
+    business_unit: Optional[str] = None # Nome della BU, in alternativa a business_unit_id
+    business_unit_id: Optional[int] = None
+    skills: List[ImportSkill] = []
+
+class ImportRowError(BaseModel):
+    row: int
+    email: Optional[str] = None
+    error: str
+
+class ImportResult(BaseModel):
+    processed: int = 0
+    created: int = 0
+    failed: int = 0
+    errors: List[ImportRowError] = []
+
+# Matching di profili
+class MatchSkill(BaseModel):
+    skill_id: int
+    level: int # Livello richiesto
+    weight: float = 1.0
+
+class MatchRequest(BaseModel):
+    skills: List[MatchSkill]
+    business_unit_id: Optional[int] = None
+    top_k: int = 10
+    min_score: float = 0.0 # Punteggio minimo (0-1)
+
+class MatchSkillCoverage(BaseModel):
+    skill_id: int
+    required_level: int
+    level: int # Livello posseduto (0 se assente)
+    coverage: float
+
+class MatchResult(BaseModel):
+    resource: ResourceSchema
+    score: float # Media pesata delle coperture, tra 0 e 1
+    skills: List[MatchSkillCoverage]
+
+# Raccomandazioni
+class SimilarResource(BaseModel):
+    resource: ResourceSchema
+    similarity: float # Similarità coseno dei vettori di livello, tra 0 e 1
+
+class RelatedSkill(BaseModel):
+    skill_id: int
+    name: str
+    count: int # Risorse che hanno entrambe le skill
+    share: float # Quota delle risorse con la skill di partenza che hanno anche questa
+
+# Operazioni multiple in una sola transazione
+class BatchOperation(BaseModel):
+    op: str # es. 'resource.create', 'resource.skills.put', 'skill.labels.add' (vedi routers/batch.py)
+    id: Optional[Union[int, str]] = None # Id dell'elemento, oppure '$N' per l'id creato dall'operazione N
+    data: Optional[Any] = None
+
+class BatchRequest(BaseModel):
+    operations: List[BatchOperation]
+
+class BatchOperationResult(BaseModel):
+    index: int
+    op: str
+    status: int # Codice HTTP equivalente all'endpoint singolo
+    result: Optional[Any] = None
+    error: Optional[str] = None
+
+class BatchResponse(BaseModel):
+    committed: bool # False se un'operazione è fallita e la transazione è stata annullata
+    results: List[BatchOperationResult]
+
+# Ricerca mentre si digita
+class AutocompleteHit(BaseModel):
+    type: str # 'resource', 'skill' o 'business_unit'
+    id: int
+    label: str # Nome e cognome per le risorse, nome per skill e business unit
+    detail: Optional[str] = None # Email per le risorse
+
+# Feed delle modifiche
+class ChangeEventSchema(BaseModel):
+    seq: int # Sequenza crescente del feed
+    entity: str # 'resource', 'resource_skills', 'skill', 'business_unit'
+    op: str # 'create', 'update', 'delete'
+    id: int
+    version: int
+    timestamp: float
+    data: Dict[str, Any] = {}
+
+class ChangesResponse(BaseModel):
+    epoch: str # Cambia a ogni riavvio del processo
+    seq: int # Da passare come ?since= alla richiesta successiva
+    reset: bool # True se gli eventi richiesti non sono più disponibili: ricaricare le liste
+    events: List[ChangeEventSchema]
+
+# Storico dei livelli
+class SkillLevelChangeSchema(BaseModel):
+    changed_at: datetime
+    resource_id: int
+    skill_id: int
+    business_unit_id: Optional[int] = None
+    level: int # 0 = skill rimossa
+    previous_level: int # 0 = skill aggiunta
+    model_config = orm_config
+
+class SkillLevelAt(BaseModel):
+    resource_id: int
+    skill_id: int
+    business_unit_id: Optional[int] = None # BU della risorsa in quel momento
+    level: int
+
+class TrendPoint(BaseModel):
+    date: date # Valori alla fine della giornata (UTC)
+    holders: int # Risorse con la skill (livello >= 1)
+    average_level: float
+    levels: Dict[int, int] # livello -> numero di risorse
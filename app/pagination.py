@@ -0,0 +1,47 @@
+import base64
+import json
+from typing import Any, Callable, List, Optional
+
+from fastapi import HTTPException, Response
+
+# --- Paginazione a cursore (keyset) ---
+# Il cursore è opaco per il client: contiene l'ultimo id restituito e la
+# pagina successiva viene letta con "WHERE id > :after ORDER BY id LIMIT n",
+# che resta veloce anche sulle pagine profonde (a differenza di OFFSET).
+# Il corpo della risposta resta una lista; cursore e totale viaggiano negli header.
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+TOTAL_COUNT_HEADER = "X-Total-Count"
+
+def encode_cursor(last_id: int) -> str:
+    raw = json.dumps({"after": last_id}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: Optional[str]) -> Optional[int]:
+    """Restituisce l'id da cui ripartire, oppure None se il cursore è assente"""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        after = json.loads(base64.urlsafe_b64decode(padded.encode()))["after"]
+        return int(after)
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Cursore di paginazione non valido")
+
+def paginate(
+    items: List[Any],
+    limit: int,
+    response: Response,
+    key: Callable[[Any], int] = lambda item: item.id,
+    total: Optional[int] = None,
+) -> List[Any]:
+    """
+    Riceve fino a limit + 1 elementi: se ce n'è uno in più esiste una pagina
+    successiva e il cursore punta all'ultimo elemento restituito.
+    """
+    page = items[:limit]
+    if len(items) > limit and page:
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(key(page[-1]))
+    if total is not None:
+        response.headers[TOTAL_COUNT_HEADER] = str(total)
+    return page
@@ -0,0 +1,181 @@
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from scipy import sparse
+from sqlalchemy.orm import Session
+
+from . import events, models
+from .database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+# --- Raccomandazioni: persone simili e skill correlate ---
+# Uno snapshot immutabile contiene la matrice sparsa risorse × skill (righe
+# normalizzate L2, per la similarità coseno) e la matrice di co-occorrenza
+# skill × skill (B^T·B sulla matrice binaria). Le richieste leggono sempre
+# l'ultimo snapshot completo; le scritture sulle skill lo segnano come
+# obsoleto e dopo RECOMMENDATIONS_REBUILD_DELAY secondi un thread in
+# background ne costruisce uno nuovo, raggruppando le modifiche ravvicinate.
+# Solo il primo utilizzo costruisce lo snapshot in modo sincrono.
+RECOMMENDATIONS_REBUILD_DELAY = float(os.getenv("RECOMMENDATIONS_REBUILD_DELAY", "5"))
+
+# Eventi che cambiano la matrice risorse × skill
+INVALIDATING_EVENTS = {
+    ("resource", "delete"),
+    ("resource_skills", "update"),
+    ("skill", "delete"),
+    ("business_unit", "delete"),
+}
+
+
+@dataclass
+class Snapshot:
+    resource_ids: np.ndarray
+    rows: Dict[int, int]
+    cols: Dict[int, int]
+    skill_ids: np.ndarray
+    vectors: sparse.csr_matrix # risorse × skill, righe normalizzate
+    cooccurrence: sparse.csr_matrix # skill × skill, diagonale = risorse con la skill
+    built_at: float
+
+
+def build_snapshot(db: Session) -> Snapshot:
+    resource_ids = np.array([rid for (rid,) in db.query(models.Resource.id).order_by(models.Resource.id)], dtype=np.int64)
+    skill_ids = np.array([sid for (sid,) in db.query(models.Skill.id).order_by(models.Skill.id)], dtype=np.int64)
+    rows = {int(rid): i for i, rid in enumerate(resource_ids)}
+    cols = {int(sid): j for j, sid in enumerate(skill_ids)}
+    links = [
+        (rows[rid], cols[sid], level)
+        for rid, sid, level in db.query(
+            models.ResourceSkillLink.resource_id,
+            models.ResourceSkillLink.skill_id,
+            models.ResourceSkillLink.level,
+        )
+        if rid in rows and sid in cols and level > 0
+    ]
+    r, c, v = (np.array(values) for values in zip(*links)) if links else (np.zeros(0, dtype=np.int64),) * 3
+    shape = (len(resource_ids), len(skill_ids))
+    levels = sparse.csr_matrix((v.astype(np.float32), (r, c)), shape=shape)
+
+    norms = np.sqrt(levels.multiply(levels).sum(axis=1)).A1
+    norms[norms == 0] = 1.0
+    vectors = sparse.diags(1.0 / norms).dot(levels).tocsr().astype(np.float32)
+
+    binary = sparse.csr_matrix((np.ones(len(r), dtype=np.int32), (r, c)), shape=shape)
+    cooccurrence = (binary.T @ binary).tocsr()
+    return Snapshot(resource_ids, rows, cols, skill_ids, vectors, cooccurrence, time.time())
+
+
+def _top(scores: np.ndarray, ids: np.ndarray, limit: int) -> List[Tuple[int, float]]:
+    """I limit punteggi positivi più alti, a parità per id crescente"""
+    keep = np.flatnonzero(scores > 0)
+    if keep.size > limit:
+        threshold = -np.partition(-scores[keep], limit - 1)[limit - 1]
+        keep = keep[scores[keep] >= threshold]
+    keep = keep[np.lexsort((ids[keep], -scores[keep]))][:limit]
+    return [(int(ids[i]), float(scores[i])) for i in keep]
+
+
+class Recommender:
+    def __init__(self, rebuild_delay: float = RECOMMENDATIONS_REBUILD_DELAY):
+        self._lock = threading.Lock()
+        self.snapshot: Optional[Snapshot] = None
+        # Numero dell'ultima ricostruzione avviata e di quella pubblicata in self.snapshot
+        self._started = 0
+        self._published = 0
+        self.stale = False
+        self.rebuild_delay = rebuild_delay
+        self._timer: Optional[threading.Timer] = None
+
+    # --- Costruzione ---
+    def refresh(self, db: Session) -> Snapshot:
+        """Ricostruisce lo snapshot in modo sincrono"""
+        # Nessun lock durante le query: in modalità asincrona ogni query cede
+        # l'event loop, che resterebbe bloccato dalle altre richieste in attesa
+        with self._lock:
+            self.stale = False
+            self._started += 1
+            number = self._started
+        snapshot = build_snapshot(db)
+        with self._lock:
+            # Una ricostruzione più lenta non sovrascrive quella partita dopo di lei
+            # (né uno snapshot scartato da reset() nel frattempo)
+            if number > self._published:
+                self.snapshot, self._published = snapshot, number
+        return snapshot
+
+    def ensure_loaded(self, db: Session) -> Snapshot:
+        snapshot = self.snapshot
+        if snapshot is None:
+            snapshot = self.refresh(db)
+        return snapshot
+
+    def _rebuild_in_background(self):
+        with self._lock:
+            self._timer = None
+        try:
+            with SessionLocal() as db:
+                self.refresh(db)
+        except Exception:
+            logger.exception("Ricostruzione dello snapshot delle raccomandazioni fallita")
+
+    def invalidate(self):
+        with self._lock:
+            self.stale = True
+            if self.snapshot is None or self._timer is not None:
+                return
+            self._timer = threading.Timer(self.rebuild_delay, self._rebuild_in_background)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def reset(self):
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            self.snapshot = None
+            self._published = self._started
+            self.stale = False
+
+    def handle_event(self, event: events.ChangeEvent):
+        if (event.entity, event.op) in INVALIDATING_EVENTS:
+            self.invalidate()
+
+    # --- Interrogazione ---
+    def similar_resources(self, snapshot: Snapshot, skills: Dict[int, int], exclude_id: int, limit: int) -> List[Tuple[int, float]]:
+        """
+        Risorse ordinate per similarità coseno con il vettore di livelli 'skills'.
+        Il vettore viene passato dal chiamante (letto dal DB) così è sempre aggiornato.
+        """
+        query = np.zeros(len(snapshot.skill_ids), dtype=np.float32)
+        for skill_id, level in skills.items():
+            col = snapshot.cols.get(skill_id)
+            if col is not None:
+                query[col] = level
+        norm = np.linalg.norm(query)
+        if norm == 0:
+            return []
+        scores = snapshot.vectors @ (query / norm)
+        row = snapshot.rows.get(exclude_id)
+        if row is not None:
+            scores[row] = 0
+        return _top(scores, snapshot.resource_ids, limit)
+
+    def related_skills(self, snapshot: Snapshot, skill_id: int, limit: int) -> List[Tuple[int, int, int]]:
+        """(skill_id, risorse che hanno entrambe, risorse che hanno la skill di partenza)"""
+        col = snapshot.cols.get(skill_id)
+        if col is None:
+            return []
+        counts = snapshot.cooccurrence.getrow(col).toarray().ravel().astype(np.float64)
+        holders = int(counts[col])
+        counts[col] = 0
+        return [(sid, int(count), holders) for sid, count in _top(counts, snapshot.skill_ids, limit)]
+
+
+recommender = Recommender()
+events.subscribe(recommender.handle_event)
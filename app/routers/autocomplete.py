@@ -0,0 +1,34 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from typing import List
+from .. import models
+from ..database import get_db, db_endpoint
+from ..autocomplete import autocomplete_index, TYPES
+
+MAX_LIMIT = 50
+
+router = APIRouter(
+    prefix="/api/autocomplete",
+    tags=["Autocomplete"],
+)
+
+# Sul primario: la prima richiesta costruisce l'indice in memoria
+@router.get("", response_model=List[models.AutocompleteHit])
+@db_endpoint
+def autocomplete(
+    q: str = "",
+    limit: int = 10,
+    type: List[str] = Query([], description="Limita i risultati a 'resource', 'skill' o 'business_unit' (ripetibile)"),
+    db: Session = Depends(get_db),
+):
+    """Risorse (nome, cognome, email), skill e business unit che corrispondono al testo digitato"""
+    if not 1 <= limit <= MAX_LIMIT:
+        raise HTTPException(status_code=400, detail=f"limit deve essere compreso tra 1 e {MAX_LIMIT}.")
+    unknown = [value for value in type if value not in TYPES]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Tipo non valido: '{unknown[0]}' (ammessi: {', '.join(TYPES)})")
+    autocomplete_index.ensure_loaded(db)
+    return [
+        {"type": entry.type, "id": entry.id, "label": entry.label, "detail": entry.detail}
+        for entry in autocomplete_index.search(q, limit=limit, types=type)
+    ]
@@ -0,0 +1,159 @@
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter, ValidationError
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from typing import List
+from .. import crud, models
+from ..database import get_db, db_endpoint
+
+# Numero massimo di operazioni per richiesta
+MAX_BATCH_OPERATIONS = 200
+
+router = APIRouter(
+    prefix="/api/batch",
+    tags=["Batch"],
+)
+
+class BatchFailed(Exception):
+    def __init__(self, status_code: int):
+        self.status_code = status_code
+
+def _data(operation: models.BatchOperation, schema):
+    try:
+        return TypeAdapter(schema).validate_python(operation.data)
+    except ValidationError as e:
+        errors = "; ".join(
+            f"{'.'.join(str(part) for part in error['loc']) or 'data'}: {error['msg']}" for error in e.errors()
+        )
+        raise HTTPException(status_code=400, detail=f"Dati non validi: {errors}")
+
+def _resolve_id(operation: models.BatchOperation, results: List[models.BatchOperationResult]) -> int:
+    """Id dell'elemento, con '$N' risolto nell'id restituito dall'operazione N"""
+    if operation.id is None:
+        raise HTTPException(status_code=400, detail=f"L'operazione '{operation.op}' richiede 'id'.")
+    if isinstance(operation.id, int):
+        return operation.id
+    reference = operation.id[1:] if operation.id.startswith("$") else ""
+    if not reference.isdigit() or int(reference) >= len(results):
+        raise HTTPException(status_code=400, detail=f"Riferimento non valido: '{operation.id}'")
+    result = results[int(reference)].result
+    if not isinstance(result, dict) or "id" not in result:
+        raise HTTPException(status_code=400, detail=f"L'operazione {reference} non ha restituito un id.")
+    return result["id"]
+
+def _resource(db: Session, resource_id: int) -> dict:
+    return crud.get_resource_dicts_by_ids(db, [resource_id])[0]
+
+def _skill(skill: models.Skill) -> dict:
+    return models.SkillSchema.from_orm(skill).model_dump(mode="json")
+
+# --- Operazioni: stessa validazione e stessi codici degli endpoint singoli ---
+def _create_resource(db: Session, operation, results):
+    resource = _data(operation, models.ResourceCreate)
+    if crud.get_resource_by_email(db, email=resource.email):
+        raise HTTPException(status_code=400, detail="Resource with this email already registered")
+    return 201, _resource(db, crud.create_resource(db, resource).id)
+
+def _delete_resource(db: Session, operation, results):
+    if crud.delete_resource(db, resource_id=_resolve_id(operation, results)) is None:
+        raise HTTPException(status_code=404, detail="Resource not found")
+    return 204, None
+
+def _put_resource_skills(db: Session, operation, results):
+    resource_id = _resolve_id(operation, results)
+    if crud.update_resource_skills(db, resource_id, _data(operation, List[models.ResourceSkillUpdate])) is None:
+        raise HTTPException(status_code=404, detail="Resource not found")
+    return 200, _resource(db, resource_id)
+
+def _patch_resource_skills(db: Session, operation, results):
+    resource_id = _resolve_id(operation, results)
+    if crud.patch_resource_skills(db, resource_id, _data(operation, models.ResourceSkillPatch)) is None:
+        raise HTTPException(status_code=404, detail="Resource not found")
+    return 200, _resource(db, resource_id)
+
+def _create_skill(db: Session, operation, results):
+    skill = _data(operation, models.SkillCreate)
+    if crud.get_skill_by_name(db, name=skill.name):
+        raise HTTPException(status_code=400, detail="Skill with this name already registered")
+    return 201, _skill(crud.create_skill(db, skill))
+
+def _delete_skill(db: Session, operation, results):
+    if crud.delete_skill(db, skill_id=_resolve_id(operation, results)) is None:
+        raise HTTPException(status_code=404, detail="Skill not found")
+    return 204, None
+
+def _skill_label_operation(update):
+    def run(db: Session, operation, results):
+        skill = update(db, _resolve_id(operation, results), operation)
+        if not skill:
+            raise HTTPException(status_code=404, detail="Skill not found")
+        return 200, _skill(skill)
+    return run
+
+def _create_business_unit(db: Session, operation, results):
+    bu = _data(operation, models.BusinessUnitCreate)
+    if crud.get_business_unit_by_name(db, name=bu.name):
+        raise HTTPException(status_code=400, detail="Business Unit già esistente")
+    return 201, models.BusinessUnitSchema.model_validate(crud.create_business_unit(db, bu)).model_dump()
+
+def _upsert(schema, upsert):
+    def run(db: Session, operation, results):
+        result = upsert(db, [_data(operation, schema)])[0]
+        return 201 if result.status == "created" else 200, result.model_dump()
+    return run
+
+OPERATIONS = {
+    "resource.create": _create_resource,
+    "resource.delete": _delete_resource,
+    "resource.skills.put": _put_resource_skills,
+    "resource.skills.patch": _patch_resource_skills,
+    "skill.create": _create_skill,
+    "skill.delete": _delete_skill,
+    "skill.labels.add": _skill_label_operation(
+        lambda db, skill_id, op: crud.add_skill_label(db, skill_id, _data(op, models.SkillLabelAdd).label)),
+    "skill.labels.remove": _skill_label_operation(
+        lambda db, skill_id, op: crud.remove_skill_label(db, skill_id, _data(op, models.SkillLabelRemove).label)),
+    "skill.labels.put": _skill_label_operation(
+        lambda db, skill_id, op: crud.update_skill_labels(db, skill_id, _data(op, models.SkillLabelsUpdate).labels)),
+    "business_unit.create": _create_business_unit,
+    "resource.upsert": _upsert(models.ResourceCreate, crud.upsert_resources),
+    "skill.upsert": _upsert(models.SkillUpsert, crud.upsert_skills),
+    "business_unit.upsert": _upsert(models.BusinessUnitCreate, crud.upsert_business_units),
+}
+
+@router.post("", response_model=models.BatchResponse)
+@db_endpoint
+def run_batch(request: models.BatchRequest, db: Session = Depends(get_db)):
+    """
+    Esegue in ordine più operazioni di scrittura in un'unica transazione.
+    Se un'operazione fallisce nessuna modifica viene confermata: la risposta ha il
+    codice dell'operazione fallita e i risultati fino a quella compresa.
+    """
+    if not request.operations:
+        raise HTTPException(status_code=400, detail="Nessuna operazione indicata.")
+    if len(request.operations) > MAX_BATCH_OPERATIONS:
+        raise HTTPException(status_code=400, detail=f"Al massimo {MAX_BATCH_OPERATIONS} operazioni per richiesta.")
+
+    results: List[models.BatchOperationResult] = []
+    try:
+        with crud.transaction(db):
+            for index, operation in enumerate(request.operations):
+                handler = OPERATIONS.get(operation.op)
+                try:
+                    if handler is None:
+                        raise HTTPException(status_code=400, detail=f"Operazione non supportata: '{operation.op}'")
+                    try:
+                        status, result = handler(db, operation, results)
+                    except ValueError as e:
+                        raise HTTPException(status_code=400, detail=str(e))
+                    except IntegrityError:
+                        raise HTTPException(status_code=409, detail="Vincolo di integrità violato.")
+                except HTTPException as e:
+                    results.append(models.BatchOperationResult(index=index, op=operation.op, status=e.status_code, error=e.detail))
+                    raise BatchFailed(e.status_code)
+                results.append(models.BatchOperationResult(index=index, op=operation.op, status=status, result=result))
+    except BatchFailed as failure:
+        response = models.BatchResponse(committed=False, results=results)
+        return JSONResponse(status_code=failure.status_code, content=response.model_dump(mode="json"))
+    return models.BatchResponse(committed=True, results=results)
@@ -1,8 +1,15 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
+from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
+import os
 from .. import crud, models
-from ..database import get_db
+from ..database import get_db, get_read_db, db_endpoint, SessionLocal
+from ..jobs import Job, JobQueueFull, job_runner
+from ..pagination import decode_cursor, paginate
+
+# Oltre questo numero di risorse l'eliminazione viene eseguita in background
+BU_DELETE_BACKGROUND_THRESHOLD = int(os.getenv("BU_DELETE_BACKGROUND_THRESHOLD", "1000"))
 
 router = APIRouter(
     prefix="/api/business_units",
@@ -11,26 +18,98 @@ router = APIRouter(
 )
 
 @router.post("", response_model=models.BusinessUnitSchema, status_code=201)
+@db_endpoint
 def create_bu(bu: models.BusinessUnitCreate, db: Session = Depends(get_db)):
     db_bu = crud.get_business_unit_by_name(db, name=bu.name)
     if db_bu:
         raise HTTPException(status_code=400, detail="Business Unit già esistente")
     return crud.create_business_unit(db=db, bu=bu)
 
+# --- Upsert per nome (idempotente, senza errori per duplicati) ---
+@router.put("", response_model=List[models.UpsertResult])
+@db_endpoint
+def upsert_bus(bus: List[models.BusinessUnitCreate], db: Session = Depends(get_db)):
+    """Crea le BU mancanti; quelle già presenti restano invariate"""
+    if len(bus) > crud.MAX_UPSERT_ITEMS:
+        raise HTTPException(status_code=400, detail=f"Al massimo {crud.MAX_UPSERT_ITEMS} elementi per richiesta.")
+    try:
+        return crud.upsert_business_units(db, bus)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.put("/by-name/{name}", response_model=models.UpsertResult, responses={201: {"model": models.UpsertResult}})
+@db_endpoint
+def upsert_bu(name: str, response: Response, db: Session = Depends(get_db)):
+    """Crea la BU (201) oppure restituisce quella esistente (200)"""
+    result = crud.upsert_business_units(db, [models.BusinessUnitCreate(name=name)])[0]
+    if result.status == "created":
+        response.status_code = 201
+    return result
+
 @router.get("", response_model=List[models.BusinessUnitSchema])
-def read_bus(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    return crud.get_business_units(db, skip=skip, limit=limit)
+@db_endpoint
+def read_bus(
+    response: Response,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    include_total: bool = False,
+    db: Session = Depends(get_read_db),
+):
+    bus = crud.get_business_units(db, skip=skip, limit=limit + 1, after_id=decode_cursor(cursor))
+    total = crud.count_rows(db, models.BusinessUnit) if include_total else None
+    return paginate(bus, limit, response, total=total)
 
 @router.get("/{bu_id}", response_model=models.BusinessUnitSchema)
-def read_bu(bu_id: int, db: Session = Depends(get_db)):
+@db_endpoint
+def read_bu(bu_id: int, db: Session = Depends(get_read_db)):
     db_bu = crud.get_business_unit(db, bu_id=bu_id)
     if db_bu is None:
         raise HTTPException(status_code=404, detail="Business Unit non trovata")
     return db_bu
 
-@router.delete("/{bu_id}", response_model=models.BusinessUnitSchema)
-def delete_bu(bu_id: int, options: models.BuDeleteOptions, db: Session = Depends(get_db)):
+def _delete_bu_job(job: Job, bu_id: int, options: models.BuDeleteOptions):
+    with SessionLocal() as db:
+        deleted_bu = crud.delete_business_unit(db, bu_id=bu_id, options=options, on_progress=job.set_progress)
+        if deleted_bu is None:
+            raise ValueError("Business Unit non trovata")
+        return {"id": deleted_bu.id, "name": deleted_bu.name}
+
+@router.delete(
+    "/{bu_id}",
+    response_model=models.BusinessUnitSchema,
+    responses={202: {"model": models.JobSchema, "description": "Eliminazione avviata in background"}},
+)
+@db_endpoint
+def delete_bu(
+    bu_id: int,
+    options: models.BuDeleteOptions,
+    background: Optional[bool] = None,
+    db: Session = Depends(get_db),
+):
+    """
+    Elimina la BU migrando o eliminando le sue risorse.
+    Con background=true (o, se non indicato, oltre BU_DELETE_BACKGROUND_THRESHOLD
+    risorse) risponde subito 202 con il job da seguire su /api/jobs/{id}.
+    """
     try:
+        if background is None or background:
+            if crud.get_business_unit(db, bu_id) is None:
+                raise HTTPException(status_code=404, detail="Business Unit non trovata")
+            if background is None:
+                background = crud.count_business_unit_resources(db, bu_id) >= BU_DELETE_BACKGROUND_THRESHOLD
+        if background:
+            # Le opzioni vengono validate subito, così gli errori arrivano con la risposta
+            crud.check_business_unit_delete(db, bu_id, options)
+            try:
+                job = job_runner.submit("business_unit_delete", _delete_bu_job, bu_id=bu_id, options=options)
+            except JobQueueFull as e:
+                raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "30"})
+            return JSONResponse(
+                status_code=202,
+                content=models.JobSchema.model_validate(job).model_dump(mode="json"),
+                headers={"Location": f"/api/jobs/{job.id}"},
+            )
         deleted_bu = crud.delete_business_unit(db, bu_id=bu_id, options=options)
         if deleted_bu is None:
             raise HTTPException(status_code=404, detail="Business Unit non trovata")
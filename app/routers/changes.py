@@ -0,0 +1,81 @@
+import json
+from fastapi import APIRouter, Header, Request
+from fastapi.responses import StreamingResponse
+from typing import Optional
+from .. import models
+from ..changefeed import change_feed, to_dict, CHANGES_HEARTBEAT_SECONDS
+
+router = APIRouter(
+    prefix="/api/changes",
+    tags=["Changes"],
+)
+
+def _sse(event: str, data: dict, event_id: Optional[str] = None) -> str:
+    message = f"id: {event_id}\n" if event_id else ""
+    return message + f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+def _start(since: Optional[int], epoch: Optional[str], last_event_id: Optional[str]) -> Optional[int]:
+    """Sequenza da cui ripartire; con un'epoch diversa (riavvio) forza il reset"""
+    if last_event_id:
+        epoch, _, seq = last_event_id.partition("-")
+        since = int(seq) if seq.isdigit() else None
+    if since is not None and epoch and epoch != change_feed.epoch:
+        return -1
+    return since
+
+async def _stream(seq: Optional[int]):
+    epoch = change_feed.epoch
+    reset = seq is not None and change_feed.since(seq)[0]
+    if seq is None or reset:
+        seq = change_feed.seq
+    yield _sse("hello", {"epoch": epoch, "seq": seq}, f"{epoch}-{seq}")
+    if reset:
+        yield _sse("reset", {"epoch": epoch, "seq": seq}, f"{epoch}-{seq}")
+    while not change_feed.closed:
+        reset, events = change_feed.since(seq)
+        if reset:
+            # Eventi persi (buffer superato o riavvio): il client deve ricaricare le liste
+            seq = change_feed.seq
+            yield _sse("reset", {"epoch": epoch, "seq": seq}, f"{epoch}-{seq}")
+            continue
+        for event in events:
+            seq = event.seq
+            yield _sse("change", to_dict(event), f"{epoch}-{seq}")
+        if not events:
+            await change_feed.wait(seq, CHANGES_HEARTBEAT_SECONDS)
+            if change_feed.seq == seq:
+                yield ": ping\n\n" # Mantiene aperta la connessione attraverso i proxy
+
+@router.get(
+    "",
+    response_model=models.ChangesResponse,
+    responses={200: {"content": {"text/event-stream": {}}, "description": "Stream SSE con Accept: text/event-stream"}},
+)
+async def read_changes(
+    request: Request,
+    since: Optional[int] = None,
+    epoch: Optional[str] = None,
+    last_event_id: Optional[str] = Header(None),
+):
+    """
+    Con Accept: text/event-stream apre uno stream Server-Sent Events ('change',
+    'reset', più un 'hello' iniziale); l'id di ogni evento è 'epoch-seq', così
+    EventSource riprende da dove era rimasto dopo una riconnessione.
+    Altrimenti restituisce in JSON gli eventi successivi a ?since=<seq>.
+    """
+    start = _start(since, epoch, last_event_id)
+    if "text/event-stream" in request.headers.get("accept", ""):
+        return StreamingResponse(
+            _stream(start),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+    if start is None:
+        return {"epoch": change_feed.epoch, "seq": change_feed.seq, "reset": False, "events": []}
+    reset, events = change_feed.since(start)
+    return {
+        "epoch": change_feed.epoch,
+        "seq": events[-1].seq if events else change_feed.seq,
+        "reset": reset,
+        "events": [to_dict(event) for event in events],
+    }
@@ -0,0 +1,31 @@
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
+from .. import export
+
+router = APIRouter(
+    prefix="/api/export",
+    tags=["Export"],
+)
+
+MEDIA_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+}
+
+@router.get("/matrix")
+def export_matrix(format: str = "ndjson", layout: str = "long"):
+    """
+    Esporta la skill matrix completa in streaming.
+    layout=long: una riga per (risorsa, skill); layout=wide: una riga per risorsa, una colonna per skill.
+    """
+    if format not in MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail="Formato non supportato: usare 'csv' o 'ndjson'.")
+    if layout not in ("long", "wide"):
+        raise HTTPException(status_code=400, detail="Layout non supportato: usare 'long' o 'wide'.")
+    # La sessione viene aperta dal generatore: le dipendenze con yield
+    # vengono chiuse prima che il corpo della risposta sia inviato
+    return StreamingResponse(
+        export.generate_export(format, layout),
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="skill_matrix_{layout}.{format}"'},
+    )
@@ -0,0 +1,73 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+from datetime import date, datetime, timezone
+from typing import List, Optional
+from .. import history, models
+from ..database import get_read_db, db_endpoint
+
+router = APIRouter(
+    prefix="/api/history",
+    tags=["History"],
+)
+
+def _utc(value: Optional[datetime]) -> datetime:
+    if value is None:
+        return datetime.now(timezone.utc)
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value
+
+@router.get("/levels", response_model=List[models.SkillLevelAt])
+@db_endpoint
+def read_levels_at(
+    at: Optional[datetime] = None,
+    skill_id: Optional[int] = None,
+    business_unit_id: Optional[int] = None,
+    resource_id: Optional[int] = None,
+    db: Session = Depends(get_read_db),
+):
+    """Matrice risorse × skill com'era all'istante 'at' (ISO 8601, UTC se senza fuso; default: adesso)"""
+    rows = history.levels_at(
+        db, _utc(at), skill_id=skill_id, business_unit_id=business_unit_id, resource_id=resource_id,
+    )
+    return [
+        {"resource_id": resource_id, "skill_id": skill_id, "business_unit_id": bu_id, "level": level}
+        for resource_id, skill_id, bu_id, level in rows
+    ]
+
+@router.get("/trend", response_model=List[models.TrendPoint])
+@db_endpoint
+def read_trend(
+    start: date,
+    end: Optional[date] = None,
+    interval: str = "day",
+    skill_id: Optional[int] = None,
+    business_unit_id: Optional[int] = None,
+    db: Session = Depends(get_read_db),
+):
+    """
+    Distribuzione dei livelli (per una skill, una BU, entrambe o complessiva) alla
+    fine di ogni giorno campionato tra start ed end (default: oggi).
+    interval: 'day', 'week' o 'month'.
+    """
+    try:
+        return history.trend(
+            db, start, end or datetime.now(timezone.utc).date(), interval=interval,
+            skill_id=skill_id, business_unit_id=business_unit_id,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/resources/{resource_id}", response_model=List[models.SkillLevelChangeSchema])
+@db_endpoint
+def read_resource_history(
+    resource_id: int,
+    skill_id: Optional[int] = None,
+    limit: int = 100,
+    db: Session = Depends(get_read_db),
+):
+    """Variazioni di livello di una risorsa, dalla più recente"""
+    if not 1 <= limit <= 500:
+        raise HTTPException(status_code=400, detail="limit deve essere compreso tra 1 e 500.")
+    return [
+        models.SkillLevelChangeSchema.model_validate(change).model_copy(update={"changed_at": _utc(change.changed_at)})
+        for change in history.resource_changes(db, resource_id, skill_id=skill_id, limit=limit)
+    ]
@@ -0,0 +1,105 @@
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import JSONResponse
+from sqlalchemy.orm import Session
+from tempfile import SpooledTemporaryFile
+from typing import Optional
+from .. import bulk_import, models
+from ..database import get_db, run_db, SessionLocal
+from ..jobs import Job, JobQueueFull, job_runner
+
+router = APIRouter(
+    prefix="/api/import",
+    tags=["Import"],
+)
+
+# Oltre questa soglia il corpo della richiesta viene appoggiato su disco
+SPOOL_MAX_MEMORY = 8 * 1024 * 1024
+
+CONTENT_TYPE_FORMATS = {
+    "text/csv": "csv",
+    "application/csv": "csv",
+    "application/x-ndjson": "ndjson",
+    "application/ndjson": "ndjson",
+    "application/jsonl": "ndjson",
+}
+
+def detect_format(request: Request, fmt: Optional[str]) -> str:
+    if fmt:
+        return fmt.lower()
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    if content_type not in CONTENT_TYPE_FORMATS:
+        raise HTTPException(
+            status_code=415,
+            detail="Specificare ?format=csv|ndjson oppure un Content-Type text/csv o application/x-ndjson",
+        )
+    return CONTENT_TYPE_FORMATS[content_type]
+
+def _import_job(job: Job, spool, fmt: str, create_missing: bool, chunk_size: int):
+    # I blocchi già confermati restano importati anche se il job viene annullato
+    try:
+        with SessionLocal() as db:
+            result = bulk_import.import_resources(
+                db, bulk_import.parse_rows(spool, fmt),
+                create_missing=create_missing, chunk_size=chunk_size, on_progress=job.set_progress,
+            )
+        return result.model_dump()
+    finally:
+        spool.close()
+
+@router.post(
+    "/resources",
+    response_model=models.ImportResult,
+    responses={202: {"model": models.JobSchema, "description": "Import avviato in background"}},
+)
+async def import_resources(
+    request: Request,
+    format: Optional[str] = None,
+    create_missing: bool = False,
+    chunk_size: int = bulk_import.DEFAULT_CHUNK_SIZE,
+    background: bool = False,
+    db: Session = Depends(get_db),
+):
+    """
+    Importa risorse e competenze da un upload CSV o NDJSON.
+    Con create_missing=true le BU e le skill sconosciute vengono create.
+    Con background=true risponde subito 202 con il job da seguire su /api/jobs/{id}.
+    """
+    fmt = detect_format(request, format)
+    if fmt not in ("csv", "ndjson"):
+        raise HTTPException(status_code=400, detail="Formato non supportato: usare 'csv' o 'ndjson'.")
+    if chunk_size < 1:
+        raise HTTPException(status_code=400, detail="chunk_size deve essere maggiore di zero")
+
+    # Il corpo arriva a pezzi e non viene mai caricato interamente in memoria
+    spool = SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY)
+    handed_off = False
+    try:
+        async for chunk in request.stream():
+            spool.write(chunk)
+        spool.seek(0)
+        if background:
+            # Il file temporaneo passa al job, che lo chiude al termine
+            try:
+                job = job_runner.submit(
+                    "resource_import", _import_job,
+                    spool=spool, fmt=fmt, create_missing=create_missing, chunk_size=chunk_size,
+                )
+            except JobQueueFull as e:
+                raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "30"})
+            handed_off = True
+            return JSONResponse(
+                status_code=202,
+                content=models.JobSchema.model_validate(job).model_dump(mode="json"),
+                headers={"Location": f"/api/jobs/{job.id}"},
+            )
+        # Parsing e scritture sul DB sono sincroni: threadpool o run_sync a seconda della modalità
+        return await run_db(
+            db,
+            bulk_import.import_resources,
+            bulk_import.parse_rows(spool, fmt),
+            create_missing=create_missing,
+            chunk_size=chunk_size,
+        )
+    finally:
+        if not handed_off:
+            spool.close()
@@ -0,0 +1,33 @@
+from fastapi import APIRouter, HTTPException
+from typing import List, Optional
+from .. import models
+from ..jobs import job_runner
+
+router = APIRouter(
+    prefix="/api/jobs",
+    tags=["Jobs"],
+    responses={404: {"description": "Not found"}},
+)
+
+@router.get("", response_model=List[models.JobSchema])
+def read_jobs(status: Optional[str] = None, limit: int = 50):
+    """Job più recenti, opzionalmente filtrati per stato"""
+    return job_runner.list(status=status, limit=min(max(limit, 1), 500))
+
+@router.get("/{job_id}", response_model=models.JobSchema)
+def read_job(job_id: str):
+    """Stato e avanzamento di un'operazione eseguita in background"""
+    job = job_runner.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job non trovato")
+    return job
+
+@router.post("/{job_id}/cancel", response_model=models.JobSchema)
+def cancel_job(job_id: str):
+    """Annulla un job in coda o chiede l'interruzione di uno in esecuzione"""
+    job = job_runner.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job non trovato")
+    if job.finished:
+        raise HTTPException(status_code=409, detail=f"Job già concluso ({job.status})")
+    return job_runner.cancel(job_id)
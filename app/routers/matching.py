@@ -0,0 +1,53 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+from typing import List
+from .. import crud, models
+from ..database import get_db, db_endpoint
+from ..matching import skill_matrix
+
+router = APIRouter(
+    prefix="/api/match",
+    tags=["Matching"],
+)
+
+MAX_TOP_K = 500
+
+@router.post("", response_model=List[models.MatchResult])
+@db_endpoint
+def match_resources(request: models.MatchRequest, db: Session = Depends(get_db)):
+    """
+    Classifica le risorse rispetto a un profilo di skill richieste (skill_id, livello, peso).
+    Il punteggio è la media pesata di min(livello posseduto / richiesto, 1).
+    """
+    if not 1 <= request.top_k <= MAX_TOP_K:
+        raise HTTPException(status_code=400, detail=f"top_k deve essere compreso tra 1 e {MAX_TOP_K}.")
+    skill_matrix.ensure_loaded(db)
+    try:
+        ranking = skill_matrix.match(
+            request.skills,
+            top_k=request.top_k,
+            business_unit_id=request.business_unit_id,
+            min_score=request.min_score,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    resources = {item["id"]: item for item in crud.get_resource_dicts_by_ids(db, [rid for rid, _, _ in ranking])}
+    return [
+        {
+            "resource": resources[resource_id],
+            "score": round(score, 4),
+            "skills": [
+                {
+                    "skill_id": item.skill_id,
+                    "required_level": item.level,
+                    "level": levels[item.skill_id],
+                    "coverage": round(min(levels[item.skill_id] / item.level, 1.0), 4),
+                }
+                for item in request.skills
+            ],
+        }
+        for resource_id, score, levels in ranking
+        # Una risorsa eliminata nel frattempo non ha più una riga da restituire
+        if resource_id in resources
+    ]
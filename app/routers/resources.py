@@ -1,8 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 from .. import crud, models
-from ..database import get_db
+from ..database import get_db, get_read_db, db_endpoint
+from ..pagination import decode_cursor, paginate
+from ..serialization import FAST_SERIALIZATION, fast_json_response
+from ..recommendations import recommender
+
+# Numero massimo di id per GET /api/resources?ids=...
+MAX_IDS = 1000
 
 router = APIRouter(
     prefix="/api/resources",
@@ -31,6 +37,7 @@ def format_resource_response(db_resource: models.Resource) -> dict:
     }
 
 @router.post("", response_model=models.ResourceSchema, status_code=201)
+@db_endpoint
 def create_new_resource(resource: models.ResourceCreate, db: Session = Depends(get_db)):
     db_resource = crud.get_resource_by_email(db, email=resource.email)
     if db_resource:
@@ -38,19 +45,143 @@ def create_new_resource(resource: models.ResourceCreate, db: Session = Depends(g
     created = crud.create_resource(db=db, resource=resource)
     return format_resource_response(created)
 
+# --- Upsert per email (idempotente, senza errori per duplicati) ---
+@router.put("", response_model=List[models.UpsertResult])
+@db_endpoint
+def upsert_resources(resources: List[models.ResourceCreate], db: Session = Depends(get_db)):
+    """Crea o aggiorna più risorse per email; le skill restano invariate"""
+    if len(resources) > crud.MAX_UPSERT_ITEMS:
+        raise HTTPException(status_code=400, detail=f"Al massimo {crud.MAX_UPSERT_ITEMS} elementi per richiesta.")
+    try:
+        return crud.upsert_resources(db, resources)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.put("/by-email/{email}", response_model=models.UpsertResult, responses={201: {"model": models.UpsertResult}})
+@db_endpoint
+def upsert_resource(email: str, resource: models.ResourceUpsert, response: Response, db: Session = Depends(get_db)):
+    """Crea la risorsa (201) o ne aggiorna i dati anagrafici e la BU (200)"""
+    try:
+        result = crud.upsert_resources(db, [models.ResourceCreate(email=email, **resource.model_dump())])[0]
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if result.status == "created":
+        response.status_code = 201
+    return result
+
 @router.get("", response_model=List[models.ResourceSchema])
-def read_all_resources(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    resources = crud.get_resources(db, skip=skip, limit=limit)
-    return [format_resource_response(res) for res in resources]
+@db_endpoint
+def read_all_resources(
+    response: Response,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    include_total: bool = False,
+    ids: Optional[str] = Query(None, description="Id separati da virgola: restituisce solo queste risorse (senza paginazione)"),
+    db: Session = Depends(get_read_db),
+):
+    if ids is not None:
+        return read_resources_by_ids(parse_ids(ids), db)
+    # Si legge un elemento in più per sapere se esiste una pagina successiva
+    after_id = decode_cursor(cursor)
+    total = crud.count_rows(db, models.Resource) if include_total else None
+    if FAST_SERIALIZATION:
+        rows = crud.get_resource_dicts(db, skip=skip, limit=limit + 1, after_id=after_id)
+        page = paginate(rows, limit, response, key=lambda row: row["id"], total=total)
+        return fast_json_response(page, response)
+    resources = crud.get_resources(db, skip=skip, limit=limit + 1, after_id=after_id)
+    page = paginate(resources, limit, response, total=total)
+    return [format_resource_response(res) for res in page]
+
+def parse_ids(value: str) -> List[int]:
+    try:
+        resource_ids = list(dict.fromkeys(int(item) for item in value.split(",") if item.strip()))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="ids deve contenere id numerici separati da virgola.")
+    if len(resource_ids) > MAX_IDS:
+        raise HTTPException(status_code=400, detail=f"Al massimo {MAX_IDS} id per richiesta.")
+    return resource_ids
+
+def read_resources_by_ids(resource_ids: List[int], db: Session):
+    """Le risorse indicate, in ordine di id, con una sola query IN (gli id inesistenti sono ignorati)"""
+    if FAST_SERIALIZATION:
+        return fast_json_response(crud.get_resource_dicts_by_ids(db, resource_ids))
+    return [format_resource_response(res) for res in crud.get_resources_by_ids(db, resource_ids)]
+
+def parse_skill_criteria(values: List[str]) -> List[models.SkillCriterion]:
+    """Converte i parametri 'skill_id' o 'skill_id:min_level' in criteri di ricerca"""
+    criteria = []
+    for value in values:
+        skill_id, _, min_level = value.partition(":")
+        try:
+            criteria.append(models.SkillCriterion(
+                skill_id=int(skill_id),
+                min_level=int(min_level) if min_level else 0,
+            ))
+        except ValueError:
+            raise HTTPException(status_code=400, detail=f"Criterio skill non valido: '{value}' (formato atteso: skill_id:min_level)")
+    return criteria
+
+# Ricerca e raccomandazioni restano sul primario: alla prima richiesta costruiscono
+# indici in memoria che gli eventi tengono poi aggiornati, e una replica in
+# ritardo vi lascerebbe dentro dati obsoleti
+@router.get("/search", response_model=List[models.ResourceSchema])
+@db_endpoint
+def search_resources(
+    skill: List[str] = Query([], description="Criteri nel formato skill_id:min_level (ripetibile)"),
+    match: str = Query("all", description="'all' (AND) oppure 'any' (OR) tra i criteri skill"),
+    business_unit_id: Optional[int] = None,
+    label: List[str] = Query([], description="Label dei link risorsa-skill (ripetibile, in AND)"),
+    skip: int = 0,
+    limit: int = 100,
+    db: Session = Depends(get_db),
+):
+    """Ricerca avanzata delle risorse per competenze, livello minimo, business unit e label"""
+    criteria = parse_skill_criteria(skill)
+    try:
+        ids = crud.search_resource_ids(
+            db, criteria, match=match, business_unit_id=business_unit_id,
+            labels=label, skip=skip, limit=limit,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if FAST_SERIALIZATION:
+        return fast_json_response(crud.get_resource_dicts_by_ids(db, ids))
+    return [format_resource_response(res) for res in crud.get_resources_by_ids(db, ids)]
 
 @router.get("/{resource_id}", response_model=models.ResourceSchema)
-def read_resource(resource_id: int, db: Session = Depends(get_db)):
+@db_endpoint
+def read_resource(resource_id: int, db: Session = Depends(get_read_db)):
+    if FAST_SERIALIZATION:
+        rows = crud.get_resource_dicts_by_ids(db, [resource_id])
+        if not rows:
+            raise HTTPException(status_code=404, detail="Resource not found")
+        return fast_json_response(rows[0])
     db_resource = crud.get_resource(db, resource_id=resource_id)
     if db_resource is None:
         raise HTTPException(status_code=404, detail="Resource not found")
     return format_resource_response(db_resource)
 
+@router.get("/{resource_id}/similar", response_model=List[models.SimilarResource])
+@db_endpoint
+def read_similar_resources(resource_id: int, limit: int = 10, db: Session = Depends(get_db)):
+    """Risorse con il profilo di competenze più simile (similarità coseno sui livelli)"""
+    if not 1 <= limit <= 100:
+        raise HTTPException(status_code=400, detail="limit deve essere compreso tra 1 e 100.")
+    levels = crud.get_resource_skill_levels(db, resource_id)
+    if levels is None:
+        raise HTTPException(status_code=404, detail="Resource not found")
+    snapshot = recommender.ensure_loaded(db)
+    ranking = recommender.similar_resources(snapshot, levels, exclude_id=resource_id, limit=limit)
+    resources = {item["id"]: item for item in crud.get_resource_dicts_by_ids(db, [rid for rid, _ in ranking])}
+    return [
+        {"resource": resources[rid], "similarity": round(similarity, 4)}
+        for rid, similarity in ranking
+        if rid in resources
+    ]
+
 @router.delete("/{resource_id}", status_code=204)
+@db_endpoint
 def delete_existing_resource(resource_id: int, db: Session = Depends(get_db)):
     db_resource = crud.delete_resource(db, resource_id=resource_id)
     if db_resource is None:
@@ -58,6 +189,7 @@ def delete_existing_resource(resource_id: int, db: Session = Depends(get_db)):
     return
 
 @router.put("/{resource_id}/skills", response_model=models.ResourceSchema)
+@db_endpoint
 def update_resource_skills_endpoint(
     resource_id: int,
     skills: List[models.ResourceSkillUpdate], # Accetta le label come lista
@@ -69,4 +201,20 @@ def update_resource_skills_endpoint(
             raise HTTPException(status_code=404, detail="Resource not found")
         return format_resource_response(updated_resource)
     except ValueError as e:
-        raise HTTPException(status_code=400, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.patch("/{resource_id}/skills", response_model=models.ResourceSchema)
+@db_endpoint
+def patch_resource_skills_endpoint(
+    resource_id: int,
+    patch: models.ResourceSkillPatch,
+    db: Session = Depends(get_db)
+):
+    """Applica solo le modifiche indicate; labels=None mantiene le label esistenti"""
+    try:
+        updated_resource = crud.patch_resource_skills(db, resource_id, patch)
+        if updated_resource is None:
+            raise HTTPException(status_code=404, detail="Resource not found")
+        return format_resource_response(updated_resource)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
@@ -1,8 +1,10 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 from .. import crud, models
-from ..database import get_db
+from ..database import get_db, get_read_db, db_endpoint
+from ..pagination import decode_cursor, paginate
+from ..recommendations import recommender
 
 router = APIRouter(
     prefix="/api/skills",
@@ -11,6 +13,7 @@ router = APIRouter(
 )
 
 @router.post("", response_model=models.SkillSchema, status_code=201)
+@db_endpoint
 def create_new_skill(skill: models.SkillCreate, db: Session = Depends(get_db)):
     db_skill = crud.get_skill_by_name(db, name=skill.name)
     if db_skill:
@@ -18,20 +21,77 @@ def create_new_skill(skill: models.SkillCreate, db: Session = Depends(get_db)):
     created = crud.create_skill(db=db, skill=skill)
     return models.SkillSchema.from_orm(created)
 
+# --- Upsert per nome (idempotente, senza errori per duplicati) ---
+@router.put("", response_model=List[models.UpsertResult])
+@db_endpoint
+def upsert_skills(skills: List[models.SkillUpsert], db: Session = Depends(get_db)):
+    """Crea le skill mancanti; per quelle con 'labels' le label vengono sostituite"""
+    if len(skills) > crud.MAX_UPSERT_ITEMS:
+        raise HTTPException(status_code=400, detail=f"Al massimo {crud.MAX_UPSERT_ITEMS} elementi per richiesta.")
+    try:
+        return crud.upsert_skills(db, skills)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.put("/by-name/{name}", response_model=models.UpsertResult, responses={201: {"model": models.UpsertResult}})
+@db_endpoint
+def upsert_skill(
+    name: str,
+    response: Response,
+    labels: Optional[models.SkillLabelsUpdate] = None,
+    db: Session = Depends(get_db),
+):
+    """Crea la skill (201) o, se esiste, ne sostituisce le label indicate (200); senza corpo le label restano invariate"""
+    result = crud.upsert_skills(db, [models.SkillUpsert(name=name, labels=labels.labels if labels else None)])[0]
+    if result.status == "created":
+        response.status_code = 201
+    return result
+
 @router.get("", response_model=List[models.SkillSchema])
-def read_all_skills(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    skills = crud.get_skills(db, skip=skip, limit=limit)
-    return [models.SkillSchema.from_orm(s) for s in skills]
+@db_endpoint
+def read_all_skills(
+    response: Response,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    include_total: bool = False,
+    db: Session = Depends(get_read_db),
+):
+    skills = crud.get_skills(db, skip=skip, limit=limit + 1, after_id=decode_cursor(cursor))
+    total = crud.count_rows(db, models.Skill) if include_total else None
+    page = paginate(skills, limit, response, total=total)
+    return [models.SkillSchema.from_orm(s) for s in page]
 
 @router.delete("/{skill_id}", status_code=204)
+@db_endpoint
 def delete_single_skill(skill_id: int, db: Session = Depends(get_db)):
     db_skill = crud.delete_skill(db, skill_id=skill_id)
     if db_skill is None:
         raise HTTPException(status_code=404, detail="Skill not found")
     return None
 
+# --- Raccomandazioni ---
+# Sul primario come le altre letture che costruiscono snapshot in memoria
+@router.get("/{skill_id}/related", response_model=List[models.RelatedSkill])
+@db_endpoint
+def read_related_skills(skill_id: int, limit: int = 10, db: Session = Depends(get_db)):
+    """Skill che compaiono più spesso insieme a quella indicata"""
+    if not 1 <= limit <= 100:
+        raise HTTPException(status_code=400, detail="limit deve essere compreso tra 1 e 100.")
+    if crud.get_skill(db, skill_id) is None:
+        raise HTTPException(status_code=404, detail="Skill not found")
+    snapshot = recommender.ensure_loaded(db)
+    related = recommender.related_skills(snapshot, skill_id, limit=limit)
+    names = crud.get_skill_names(db, [sid for sid, _, _ in related])
+    return [
+        {"skill_id": sid, "name": names[sid], "count": count, "share": round(count / holders, 4)}
+        for sid, count, holders in related
+        if sid in names
+    ]
+
 # --- Skill labels ---
 @router.post("/{skill_id}/labels/add", response_model=models.SkillSchema)
+@db_endpoint
 def add_skill_label(
     skill_id: int,
     label_data: models.SkillLabelAdd,
@@ -44,6 +104,7 @@ def add_skill_label(
     return models.SkillSchema.from_orm(skill)
 
 @router.delete("/{skill_id}/labels/remove", response_model=models.SkillSchema)
+@db_endpoint
 def remove_skill_label(
     skill_id: int,
     label_data: models.SkillLabelRemove,
@@ -56,16 +117,19 @@ def remove_skill_label(
     return models.SkillSchema.from_orm(skill)
 
 @router.get("/by-label/{label}", response_model=List[models.SkillSchema])
+@db_endpoint
 def get_skills_by_label(
     label: str,
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Trova tutte le skill che hanno una specifica label"""
-    return crud.get_skills_by_label(db, label, skip, limit)
+    skills = crud.get_skills_by_label(db, label, skip, limit)
+    return [models.SkillSchema.from_orm(s) for s in skills]
 
 @router.get("/labels/all", response_model=List[str])
-def get_all_labels(db: Session = Depends(get_db)):
+@db_endpoint
+def get_all_labels(db: Session = Depends(get_read_db)):
     """Ottiene tutte le label uniche esistenti nel sistema"""
     return crud.get_all_labels(db)
\ No newline at end of file
@@ -0,0 +1,44 @@
+from fastapi import APIRouter, Depends
+from sqlalchemy.orm import Session
+from typing import List, Optional
+from .. import models
+from ..database import get_db, db_endpoint
+from ..stats_cache import stats_cache
+
+router = APIRouter(
+    prefix="/api/stats",
+    tags=["Statistics"],
+)
+
+@router.get("", response_model=models.StatsSummary)
+@db_endpoint
+def read_stats_summary(top: int = 5, db: Session = Depends(get_db)):
+    """Totali, skill più diffuse, distribuzione per BU e istogramma dei livelli"""
+    stats_cache.ensure_loaded(db)
+    return models.StatsSummary(
+        **stats_cache.totals(),
+        top_skills=stats_cache.skills(limit=top),
+        business_units=stats_cache.business_units(),
+        levels=stats_cache.levels(),
+    )
+
+@router.get("/skills", response_model=List[models.SkillStat])
+@db_endpoint
+def read_skill_stats(limit: Optional[int] = None, db: Session = Depends(get_db)):
+    """Skill ordinate per numero di risorse"""
+    stats_cache.ensure_loaded(db)
+    return stats_cache.skills(limit=limit)
+
+@router.get("/business_units", response_model=List[models.BusinessUnitStat])
+@db_endpoint
+def read_business_unit_stats(db: Session = Depends(get_db)):
+    """Numero di risorse per Business Unit"""
+    stats_cache.ensure_loaded(db)
+    return stats_cache.business_units()
+
+@router.get("/levels", response_model=List[models.LevelBucket])
+@db_endpoint
+def read_level_histogram(skill_id: Optional[int] = None, db: Session = Depends(get_db)):
+    """Istogramma dei livelli, complessivo o per una singola skill"""
+    stats_cache.ensure_loaded(db)
+    return stats_cache.levels(skill_id=skill_id)
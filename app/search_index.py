@@ -0,0 +1,171 @@
+import os
+import threading
+from bisect import bisect_left, insort
+from typing import Dict, Iterable, List, Optional, Set
+
+from sqlalchemy.orm import Session
+
+from . import events, models
+
+# Indice invertito in memoria per la ricerca delle risorse:
+#   skill_id -> livello -> lista ordinata di resource_id
+# Le intersezioni tra competenze diventano operazioni su insiemi di interi,
+# senza andare sul database. L'indice viene costruito al primo utilizzo e
+# poi mantenuto aggiornato dagli eventi emessi da crud.py.
+SEARCH_INDEX_ENABLED = os.getenv("SEARCH_INDEX_ENABLED", "true").lower() in ("1", "true", "yes")
+
+
+class SkillIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._postings: Dict[int, Dict[int, List[int]]] = {}
+        self._resource_skills: Dict[int, Dict[int, int]] = {}
+        self._resource_bu: Dict[int, Optional[int]] = {}
+        self.loaded = False
+        # Incrementato da ogni caricamento completato e da reset()
+        self._generation = 0
+        self._loading = 0
+        # Eventi notificati mentre un caricamento è in corso
+        self._pending: Optional[List[events.ChangeEvent]] = None
+
+    # --- Costruzione ---
+    def load(self, db: Session):
+        """(Ri)costruisce l'indice leggendo risorse e link dal database"""
+        # Le query girano fuori dal lock: in modalità asincrona ogni query cede
+        # l'event loop, che resterebbe bloccato dagli handler in attesa del lock.
+        # Gli eventi arrivati nel frattempo vengono riapplicati al nuovo indice:
+        # portano lo stato finale della risorsa, quindi è indifferente che la
+        # modifica fosse già visibile alle query o no.
+        with self._lock:
+            generation = self._generation
+            self._loading += 1
+            if self._pending is None:
+                self._pending = []
+        try:
+            fresh = SkillIndex()
+            fresh._resource_bu = dict(
+                db.query(models.Resource.id, models.Resource.business_unit_id).all()
+            )
+            links = db.query(
+                models.ResourceSkillLink.resource_id,
+                models.ResourceSkillLink.skill_id,
+                models.ResourceSkillLink.level,
+            ).order_by(models.ResourceSkillLink.resource_id)
+            for resource_id, skill_id, level in links:
+                fresh._add_posting(resource_id, skill_id, level)
+            with self._lock:
+                # Un altro caricamento o un reset() arrivati nel frattempo hanno la precedenza
+                if self._generation == generation:
+                    self._postings, self._resource_skills, self._resource_bu = (
+                        fresh._postings, fresh._resource_skills, fresh._resource_bu
+                    )
+                    for event in self._pending:
+                        self._apply(event)
+                    self._generation += 1
+                    self.loaded = True
+        finally:
+            with self._lock:
+                self._loading -= 1
+                if not self._loading:
+                    self._pending = None
+
+    def ensure_loaded(self, db: Session):
+        if not self.loaded:
+            self.load(db)
+
+    def reset(self):
+        with self._lock:
+            self._postings = {}
+            self._resource_skills = {}
+            self._resource_bu = {}
+            self._generation += 1
+            self.loaded = False
+
+    # --- Manutenzione (chiamate con il lock acquisito) ---
+    def _add_posting(self, resource_id: int, skill_id: int, level: int):
+        ids = self._postings.setdefault(skill_id, {}).setdefault(level, [])
+        insort(ids, resource_id)
+        self._resource_skills.setdefault(resource_id, {})[skill_id] = level
+
+    def _remove_posting(self, resource_id: int, skill_id: int):
+        level = self._resource_skills.get(resource_id, {}).pop(skill_id, None)
+        if level is None:
+            return
+        ids = self._postings.get(skill_id, {}).get(level)
+        if ids:
+            pos = bisect_left(ids, resource_id)
+            if pos < len(ids) and ids[pos] == resource_id:
+                del ids[pos]
+
+    def _set_resource_skills(self, resource_id: int, skills: Dict[int, int]):
+        for skill_id in list(self._resource_skills.get(resource_id, {})):
+            self._remove_posting(resource_id, skill_id)
+        for skill_id, level in skills.items():
+            self._add_posting(resource_id, skill_id, level)
+
+    def _remove_resource(self, resource_id: int):
+        self._set_resource_skills(resource_id, {})
+        self._resource_skills.pop(resource_id, None)
+        self._resource_bu.pop(resource_id, None)
+
+    def _apply(self, event: events.ChangeEvent):
+        if event.entity == "resource":
+            if event.op in ("create", "update"):
+                self._resource_bu[event.id] = event.data.get("business_unit_id")
+            elif event.op == "delete":
+                self._remove_resource(event.id)
+        elif event.entity == "resource_skills":
+            self._set_resource_skills(event.id, event.data.get("after", {}))
+        elif event.entity == "skill" and event.op == "delete":
+            for resource_id in list(self._resource_skills):
+                self._remove_posting(resource_id, event.id)
+            self._postings.pop(event.id, None)
+        elif event.entity == "business_unit" and event.op == "delete":
+            for resource_id in event.data.get("resource_ids", []):
+                if event.data.get("action") == "migrate":
+                    self._resource_bu[resource_id] = event.data.get("target_bu_id")
+                else:
+                    self._remove_resource(resource_id)
+
+    def handle_event(self, event: events.ChangeEvent):
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append(event)
+            if self.loaded:
+                self._apply(event)
+
+    # --- Interrogazione ---
+    def _matching(self, skill_id: int, min_level: int) -> Set[int]:
+        result: Set[int] = set()
+        for level, ids in self._postings.get(skill_id, {}).items():
+            if level >= min_level:
+                result.update(ids)
+        return result
+
+    def search(
+        self,
+        criteria: Iterable[models.SkillCriterion],
+        match_all: bool = True,
+        business_unit_id: Optional[int] = None,
+    ) -> List[int]:
+        """Restituisce gli id ordinati delle risorse che soddisfano i criteri"""
+        with self._lock:
+            result: Optional[Set[int]] = None
+            # Si parte dagli insiemi più piccoli per ridurre il costo delle intersezioni
+            sets = sorted((self._matching(c.skill_id, c.min_level) for c in criteria), key=len)
+            for ids in sets:
+                if result is None:
+                    result = ids
+                elif match_all:
+                    result &= ids
+                else:
+                    result |= ids
+            if result is None:
+                result = set(self._resource_bu)
+            if business_unit_id is not None:
+                result = {rid for rid in result if self._resource_bu.get(rid) == business_unit_id}
+            return sorted(result)
+
+
+skill_index = SkillIndex()
+events.subscribe(skill_index.handle_event)
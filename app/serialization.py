@@ -0,0 +1,22 @@
+import os
+from typing import Any, Optional
+
+from fastapi import Response
+
+# --- Serializzazione veloce delle risposte ---
+# Con FAST_SERIALIZATION attivo gli endpoint delle risorse costruiscono i dict
+# da query a sole colonne (crud.get_resource_dicts*) e restituiscono
+# direttamente una Response: FastAPI salta la validazione con response_model
+# e la codifica usa orjson quando è installato.
+FAST_SERIALIZATION = os.getenv("FAST_SERIALIZATION", "true").lower() in ("1", "true", "yes")
+
+try:
+    import orjson  # noqa: F401
+    from fastapi.responses import ORJSONResponse as FastJSONResponse
+except ImportError:
+    from fastapi.responses import JSONResponse as FastJSONResponse
+
+def fast_json_response(content: Any, response: Optional[Response] = None, status_code: int = 200) -> Response:
+    """Codifica il contenuto senza validazione, riportando gli header già impostati su 'response'"""
+    headers = dict(response.headers) if response is not None else None
+    return FastJSONResponse(content=content, status_code=status_code, headers=headers)
@@ -12,8 +12,13 @@ const api = {
     return response.json();
   },
   getResources: () => api.fetchJSON("/api/resources"),
+  getResourcesByIds: (ids) =>
+    api.fetchJSON(`/api/resources?ids=${ids.join(",")}`),
   getSkills: () => api.fetchJSON("/api/skills"),
   getBusinessUnits: () => api.fetchJSON("/api/business_units"),
+  getStats: (top = 5) => api.fetchJSON(`/api/stats?top=${top}`),
+  searchResources: (params) =>
+    api.fetchJSON(`/api/resources/search?${params.toString()}`),
 
   addBusinessUnit: (buData) =>
     api.fetchJSON("/api/business_units", {
@@ -40,13 +45,6 @@ const api = {
       body: JSON.stringify(skills),
     }),
 
-  addLabelToSkill: (skillId, label) =>
-    api.fetchJSON(`/api/skills/${skillId}/labels/add`, {
-      method: "POST",
-      headers: { "Content-Type": "application/json" },
-      body: JSON.stringify({ label }),
-    }),
-
   removeLabelFromSkill: (skillId, label) =>
     api.fetchJSON(`/api/skills/${skillId}/labels/remove`, {
       method: "DELETE",
@@ -58,6 +56,22 @@ const api = {
     api.fetchJSON(`/api/resources/${resourceId}`, { method: "DELETE" }),
   deleteSkill: (skillId) =>
     api.fetchJSON(`/api/skills/${skillId}`, { method: "DELETE" }),
+  // Più operazioni in una sola richiesta e transazione (vedi POST /api/batch).
+  // Restituisce i risultati delle operazioni; se una fallisce nessuna viene
+  // confermata e l'errore riporta il messaggio dell'operazione fallita.
+  batch: async (operations) => {
+    const response = await fetch("/api/batch", {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify({ operations }),
+    });
+    const body = await response.json().catch(() => ({}));
+    if (!response.ok) {
+      const failed = (body.results || []).find((r) => r.error);
+      throw new Error((failed && failed.error) || body.detail || "Errore del server");
+    }
+    return body.results;
+  },
   deleteBusinessUnit: (buId, options) =>
     api.fetchJSON(`/api/business_units/${buId}`, {
       method: "DELETE",
@@ -70,8 +84,10 @@ const api = {
 const views = document.querySelectorAll(".view-section");
 const tabs = document.querySelectorAll(".tab-button");
 let charts = {};
+let currentView = null;
 
 function switchView(viewId) {
+  currentView = viewId;
   views.forEach((view) => view.classList.add("hidden"));
   tabs.forEach((tab) => tab.classList.remove("active"));
 
@@ -300,18 +316,14 @@ function renderStatisticheView() {
   loadStats();
 }
 
-async function renderResourcesList() {
-  const resources = await api.getResources();
-  const tableBody = document.getElementById("resources-table-body");
-  tableBody.innerHTML = "";
-  if (resources.length === 0) {
-    tableBody.innerHTML = `<tr><td colspan="4" class="text-center py-4 text-gray-500">Nessuna risorsa aggiunta.</td></tr>`;
-    return;
-  }
-  resources.forEach((res) => {
-    const row = document.createElement("tr");
-    row.className = "border-b last:border-0";
-    row.innerHTML = `
+const EMPTY_RESOURCES_ROW = `<tr id="resources-empty-row"><td colspan="4" class="text-center py-4 text-gray-500">Nessuna risorsa aggiunta.</td></tr>`;
+
+function resourceRow(res) {
+  const row = document.createElement("tr");
+  row.className = "border-b last:border-0";
+  row.dataset.resourceId = res.id;
+  row.dataset.buId = res.business_unit.id;
+  row.innerHTML = `
             <td class="py-2 px-4">${res.nome} ${res.cognome}</td>
             <td class="py-2 px-4">${res.business_unit.name}</td>
             <td class="py-2 px-4">${res.email}</td>
@@ -321,8 +333,18 @@ async function renderResourcesList() {
                 </button>
             </td>
         `;
-    tableBody.appendChild(row);
-  });
+  return row;
+}
+
+async function renderResourcesList() {
+  const resources = await api.getResources();
+  const tableBody = document.getElementById("resources-table-body");
+  tableBody.innerHTML = "";
+  if (resources.length === 0) {
+    tableBody.innerHTML = EMPTY_RESOURCES_ROW;
+    return;
+  }
+  resources.forEach((res) => tableBody.appendChild(resourceRow(res)));
   lucide.createIcons();
 }
 
@@ -363,6 +385,7 @@ async function renderSkillsList() {
   skills.forEach((skill) => {
     const item = document.createElement("li");
     item.className = "flex flex-col md:flex-row justify-between items-start md:items-center bg-gray-50 p-3 rounded-md mb-2";
+    item.dataset.id = skill.id;
     
     const labelsHtml = skill.labels.map(label => `
             <span class="inline-flex items-center px-2.5 py-0.5 rounded-full text-xs font-medium bg-blue-100 text-blue-800 mr-2 mb-1">
@@ -378,7 +401,7 @@ async function renderSkillsList() {
                 <div class="mt-1 flex flex-wrap">${labelsHtml}</div>
             </div>
             <div class="flex items-center space-x-2 w-full md:w-auto mt-2 md:mt-0">
-                <input type="text" id="new-label-input-${skill.id}" placeholder="Nuova label" class="flex-grow p-1 border border-gray-300 rounded-md focus:ring-1 focus:ring-blue-500 text-sm">
+                <input type="text" id="new-label-input-${skill.id}" placeholder="Nuove label (separate da virgola)" class="flex-grow p-1 border border-gray-300 rounded-md focus:ring-1 focus:ring-blue-500 text-sm">
                 <button onclick="addLabelToSkill(${skill.id})" class="px-3 py-1 bg-blue-500 text-white rounded-md hover:bg-blue-600 text-sm flex items-center">
                     <i data-lucide="plus" class="w-4 h-4 mr-1"></i> Add
                 </button>
@@ -429,6 +452,7 @@ async function renderBuList() {
   businessUnits.forEach((bu) => {
     const item = document.createElement("li");
     item.className = "flex justify-between items-center bg-gray-50 p-3 rounded-md";
+    item.dataset.id = bu.id;
     item.innerHTML = `
             <div><span class="font-medium">${bu.name}</span><span class="text-xs text-gray-400 ml-2">ID: ${bu.id}</span></div>
             <button onclick="confirmDelete('bu', '${bu.id}', '${bu.name}')" class="text-red-500 hover:text-red-700"><i data-lucide="trash-2" class="w-5 h-5"></i></button>`;
@@ -635,21 +659,15 @@ async function handleSearch() {
   const minLevel = document.getElementById("search-level-slider").value;
   const bu = document.getElementById("search-bu-select").value;
   const container = document.getElementById("search-results-container");
-  const [resources, allSkills] = await Promise.all([
-    api.getResources(),
+  // Il filtro viene eseguito lato server
+  const params = new URLSearchParams({ limit: "1000" });
+  if (skillId) params.append("skill", `${skillId}:${minLevel}`);
+  if (bu) params.append("business_unit_id", bu);
+  const [filteredResources, allSkills] = await Promise.all([
+    api.searchResources(params),
     api.getSkills(),
   ]);
 
-  const filteredResources = resources.filter((resource) => {
-    const buMatch = !bu || resource.business_unit.id === parseInt(bu, 10);
-    const skillMatch =
-      !skillId ||
-      resource.skills.some(
-        (s) => s.skill_id === parseInt(skillId, 10) && s.level >= minLevel
-      );
-    return buMatch && skillMatch;
-  });
-
   container.innerHTML = "";
   if (filteredResources.length === 0) {
     container.innerHTML = `<div class="text-center py-12 text-gray-500"><i data-lucide="search-x" class="mx-auto h-12 w-12"></i><p class="mt-2">Nessun risultato trovato.</p></div>`;
@@ -744,8 +762,9 @@ const buDeleteModal = document.getElementById("bu-delete-modal");
 
 async function confirmDelete(type, id, name) {
   if (type === "bu") {
-    const resourcesInBu = (await api.getResources()).filter(
-      (r) => r.business_unit.name === name
+    // Basta sapere se la BU ha almeno una risorsa: una sola riga invece dell'elenco completo
+    const resourcesInBu = await api.searchResources(
+      new URLSearchParams({ business_unit_id: id, limit: 1 })
     );
     if (resourcesInBu.length > 0) {
       const buDeleteName = document.getElementById("bu-delete-name");
@@ -823,8 +842,13 @@ async function handleDeleteBusinessUnitConfirmed() {
     }
 
     try {
-        await api.deleteBusinessUnit(parseInt(buId, 10), { action, target_bu_id: targetBuId });
-        showNotification("Business Unit eliminata con successo!", "success");
+        const result = await api.deleteBusinessUnit(parseInt(buId, 10), { action, target_bu_id: targetBuId });
+        if (result && result.kind === "business_unit_delete") {
+            // BU grande: l'eliminazione prosegue in background (GET /api/jobs/{id})
+            showNotification("Eliminazione della Business Unit avviata in background.", "success");
+        } else {
+            showNotification("Business Unit eliminata con successo!", "success");
+        }
         renderBuList();
         renderResourcesList();
         updateBuSelectors();
@@ -842,34 +866,19 @@ function closeModals() {
 
 async function loadStats() {
   try {
-    const [resources, skills, businessUnits] = await Promise.all([
-      api.getResources(),
-      api.getSkills(),
-      api.getBusinessUnits(),
-    ]);
+    // Gli aggregati sono calcolati lato server
+    const stats = await api.getStats(5);
 
-    document.getElementById("total-resources").textContent = resources.length;
-    document.getElementById("total-skills").textContent = skills.length;
-    document.getElementById("total-bu").textContent = businessUnits.length;
+    document.getElementById("total-resources").textContent = stats.total_resources;
+    document.getElementById("total-skills").textContent = stats.total_skills;
+    document.getElementById("total-bu").textContent = stats.total_business_units;
 
     if (charts.topSkills) charts.topSkills.destroy();
     if (charts.buDistribution) charts.buDistribution.destroy();
 
-    const skillCounts = resources.reduce((acc, r) => {
-      r.skills.forEach((s) => {
-        acc[s.skill_id] = (acc[s.skill_id] || 0) + 1;
-      });
-      return acc;
-    }, {});
-
-    const sortedSkills = Object.entries(skillCounts)
-      .sort(([, a], [, b]) => b - a)
-      .slice(0, 5);
-
-    const skillNames = sortedSkills.map(
-      ([skillId]) => skills.find((s) => s.id === parseInt(skillId, 10))?.name || "N/D"
-    );
-    const skillValues = sortedSkills.map(([, count]) => count);
+    const sortedSkills = stats.top_skills.filter((s) => s.count > 0);
+    const skillNames = sortedSkills.map((s) => s.name);
+    const skillValues = sortedSkills.map((s) => s.count);
 
     charts.topSkills = new Chart(document.getElementById("top-skills-chart"), {
       type: "bar",
@@ -896,10 +905,12 @@ async function loadStats() {
       },
     });
 
-    const buCounts = resources.reduce((acc, r) => {
-      acc[r.business_unit.name] = (acc[r.business_unit.name] || 0) + 1;
-      return acc;
-    }, {});
+    const buCounts = stats.business_units
+      .filter((bu) => bu.resources > 0)
+      .reduce((acc, bu) => {
+        acc[bu.name] = bu.resources;
+        return acc;
+      }, {});
 
     charts.buDistribution = new Chart(
       document.getElementById("bu-distribution-chart"), {
@@ -958,10 +969,128 @@ function toggleTheme() {
     lucide.createIcons(); // Re-render icons after theme change
 }
 
+// --- AGGIORNAMENTI DAL SERVER (GET /api/changes, Server-Sent Events) ---
+// Gli eventi vengono applicati alla vista corrente elemento per elemento: nella
+// tabella delle risorse quelle create o modificate si rileggono in blocco con
+// GET /api/resources?ids= e si sostituiscono le righe, quelle eliminate si
+// tolgono. Skill e BU non hanno una lettura per id: alle eliminazioni si toglie
+// l'elemento, alle creazioni si ricarica la lista (breve). Solo un 'reset' del
+// feed (eventi persi) ricarica tutto.
+const MAX_IDS_PER_REQUEST = 1000; // come MAX_IDS in routers/resources.py
+
+const viewRefreshers = {
+  risorse: { reload: () => renderResourcesList(), apply: applyResourceChanges },
+  skills: { reload: () => renderSkillsList(), apply: (events) => applyListChanges(events, "skill", "skills-list", renderSkillsList) },
+  bu: { reload: () => renderBuList(), apply: (events) => applyListChanges(events, "business_unit", "bu-list", renderBuList) },
+};
+let pendingChanges = [];
+let pendingReload = false;
+let refreshTimer = null;
+
+function scheduleRefresh(change) {
+  if (change === null) pendingReload = true;
+  else pendingChanges.push(change);
+  // Raggruppa le modifiche ravvicinate in un solo aggiornamento
+  clearTimeout(refreshTimer);
+  refreshTimer = setTimeout(() => flushChanges().catch(() => {}), 300);
+}
+
+async function flushChanges() {
+  const changes = pendingChanges;
+  const reload = pendingReload;
+  pendingChanges = [];
+  pendingReload = false;
+  // Le altre viste vengono comunque ricaricate quando si torna su di esse
+  const target = viewRefreshers[currentView];
+  if (!target) return;
+  if (reload) return target.reload();
+  if (changes.length > 0) return target.apply(changes);
+}
+
+function upsertResourceRow(tableBody, res) {
+  const row = resourceRow(res);
+  const existing = tableBody.querySelector(`tr[data-resource-id="${res.id}"]`);
+  if (existing) {
+    existing.replaceWith(row);
+    return;
+  }
+  // Stesso ordine della lista completa (per id)
+  const next = [...tableBody.querySelectorAll("tr[data-resource-id]")].find(
+    (other) => parseInt(other.dataset.resourceId, 10) > res.id
+  );
+  tableBody.insertBefore(row, next || null);
+}
+
+async function applyResourceChanges(changes) {
+  const tableBody = document.getElementById("resources-table-body");
+  if (!tableBody) return;
+  const changed = new Set();
+  const removed = new Set();
+  const mark = (id, deleted) => {
+    (deleted ? removed : changed).add(id);
+    (deleted ? changed : removed).delete(id);
+  };
+  changes.forEach((change) => {
+    if (change.entity === "resource") {
+      mark(change.id, change.op === "delete");
+    } else if (change.entity === "business_unit" && change.op === "delete") {
+      // Le risorse della BU sono passate a un'altra BU (migrate) o sono state eliminate
+      tableBody.querySelectorAll(`tr[data-bu-id="${change.id}"]`).forEach((row) =>
+        mark(parseInt(row.dataset.resourceId, 10), change.data.action !== "migrate")
+      );
+    }
+    // 'resource_skills': la tabella non mostra le skill, nessuna riga cambia
+  });
+
+  const ids = [...changed];
+  for (let i = 0; i < ids.length; i += MAX_IDS_PER_REQUEST) {
+    const chunk = ids.slice(i, i + MAX_IDS_PER_REQUEST);
+    const resources = await api.getResourcesByIds(chunk);
+    resources.forEach((res) => upsertResourceRow(tableBody, res));
+    // Eliminate dopo l'evento: non vengono restituite
+    const found = new Set(resources.map((res) => res.id));
+    chunk.filter((id) => !found.has(id)).forEach((id) => removed.add(id));
+  }
+  removed.forEach((id) => {
+    const row = tableBody.querySelector(`tr[data-resource-id="${id}"]`);
+    if (row) row.remove();
+  });
+
+  const emptyRow = document.getElementById("resources-empty-row");
+  if (tableBody.querySelector("tr[data-resource-id]")) {
+    if (emptyRow) emptyRow.remove();
+  } else if (!emptyRow) {
+    tableBody.innerHTML = EMPTY_RESOURCES_ROW;
+  }
+  lucide.createIcons();
+}
+
+async function applyListChanges(changes, entity, listId, reload) {
+  const list = document.getElementById(listId);
+  if (!list) return;
+  const relevant = changes.filter((change) => change.entity === entity);
+  if (relevant.some((change) => change.op !== "delete")) return reload();
+  relevant.forEach((change) => {
+    const item = list.querySelector(`li[data-id="${change.id}"]`);
+    if (item) item.remove();
+  });
+  // Lista rimasta vuota: la ricarica mostra il messaggio segnaposto
+  if (relevant.length > 0 && !list.querySelector("li[data-id]")) return reload();
+}
+
+function subscribeToChanges() {
+  if (!window.EventSource) return;
+  const source = new EventSource("/api/changes");
+  source.addEventListener("change", (e) => scheduleRefresh(JSON.parse(e.data)));
+  // Eventi persi (riavvio del server o client rimasto indietro): si ricarica tutto
+  source.addEventListener("reset", () => scheduleRefresh(null));
+}
+
 // Initial view load and theme application
 document.addEventListener("DOMContentLoaded", () => {
   applySavedTheme(); // Apply theme before switching view to prevent flash
   switchView("risorse");
+  subscribeToChanges();
 });
 
 // Modals event listeners (unchanged)
@@ -981,17 +1110,17 @@ if (themeToggleBtn) {
     themeToggleBtn.addEventListener("click", toggleTheme);
 }
 
-// Function to add a label to a skill (now takes skillId directly)
+// Aggiunge una o più label (separate da virgola) a una skill con un'unica richiesta batch
 async function addLabelToSkill(skillId) {
     const labelInput = document.getElementById(`new-label-input-${skillId}`);
-    const label = labelInput.value.trim();
-    if (!label) {
+    const labels = [...new Set(labelInput.value.split(",").map((label) => label.trim()).filter((label) => label !== ""))];
+    if (labels.length === 0) {
         showNotification("La label non può essere vuota.", "error");
         return;
     }
     try {
-        await api.addLabelToSkill(skillId, label);
-        showNotification("Label aggiunta con successo!", "success");
+        await api.batch(labels.map((label) => ({ op: "skill.labels.add", id: skillId, data: { label } })));
+        showNotification(labels.length > 1 ? "Label aggiunte con successo!" : "Label aggiunta con successo!", "success");
         labelInput.value = ""; // Clear input after adding
         renderSkillsList(); // Refresh the list to show new label
         loadAllSkillsForAssignment(); // Refresh available labels for assignment view
@@ -0,0 +1,207 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List
+
+from starlette.datastructures import Headers
+from starlette.types import Receive, Scope, Send
+
+# --- Frontend servito dalla memoria ---
+# All'avvio tutti i file di 'static/' vengono letti e, se testuali, compressi una
+# volta sola in gzip e (con il pacchetto 'brotli' installato) in brotli. Ogni
+# richiesta diventa una ricerca in un dict: nessun accesso al disco, nessuna
+# compressione al volo. Content-Encoding è scelto in base ad Accept-Encoding,
+# l'ETag è l'hash del contenuto (If-None-Match -> 304).
+# Ogni asset è raggiungibile anche con l'hash nel nome (main.<hash>.js) e i
+# riferimenti in index.html vengono riscritti verso questi nomi: i file con hash
+# sono immutabili e si mettono in cache per un anno, index.html si rivalida
+# sempre. I percorsi sconosciuti ricevono l'index.html già in memoria (routing SPA).
+# Con STATIC_IN_MEMORY=false si torna a leggere i file dal disco a ogni
+# richiesta (utile in sviluppo per vedere subito le modifiche).
+STATIC_IN_MEMORY = os.getenv("STATIC_IN_MEMORY", "true").lower() in ("1", "true", "yes")
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+INDEX = "index.html"
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "no-cache"
+# Sotto questa dimensione la compressione non ripaga gli header aggiuntivi
+MIN_COMPRESS_SIZE = 256
+COMPRESSIBLE_TYPES = ("text/", "application/javascript", "application/json", "image/svg+xml")
+# Nome con hash del contenuto, generato qui o da un bundler (app.3f9a1c2b.js)
+HASHED_NAME = re.compile(r"\.[0-9a-f]{8,}\.[^./]+$")
+# Codifiche in ordine di preferenza a parità di q
+ENCODINGS = ("br", "gzip")
+
+
+@dataclass
+class Asset:
+    media_type: str
+    etag: str
+    cache_control: str
+    # codifica ("identity", "gzip", "br") -> corpo
+    bodies: Dict[str, bytes] = field(default_factory=dict)
+
+
+def _media_type(path: str) -> str:
+    media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+    if media_type.startswith("text/") or media_type == "application/javascript":
+        media_type += "; charset=utf-8"
+    return media_type
+
+def _hashed_name(path: str, digest: str) -> str:
+    root, ext = os.path.splitext(path)
+    return f"{root}.{digest[:12]}{ext}"
+
+def _compress(body: bytes, media_type: str) -> Dict[str, bytes]:
+    bodies = {"identity": body}
+    if len(body) < MIN_COMPRESS_SIZE or not media_type.startswith(COMPRESSIBLE_TYPES):
+        return bodies
+    candidates = {"gzip": gzip.compress(body, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        candidates["br"] = brotli.compress(body, quality=11)
+    bodies.update({encoding: data for encoding, data in candidates.items() if len(data) < len(body)})
+    return bodies
+
+def _accepted_encodings(header: str) -> List[str]:
+    """Codifiche accettate (q > 0), dalla preferita; 'identity' è sempre ammessa in coda"""
+    weights: Dict[str, float] = {}
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        weights[name] = q
+    ranked = [
+        encoding for encoding in ENCODINGS
+        if weights.get(encoding, weights.get("*", 0.0)) > 0
+    ]
+    ranked.sort(key=lambda encoding: -weights.get(encoding, weights.get("*", 0.0)))
+    return ranked + ["identity"]
+
+def _etag_matches(header: str, etag: str) -> bool:
+    candidates = [value.strip() for value in header.split(",")]
+    return "*" in candidates or any(value.removeprefix("W/") == etag for value in candidates)
+
+
+class InMemoryStaticFiles:
+    """App ASGI da montare alla radice, dopo le route dell'API"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.assets: Dict[str, Asset] = {}
+        self.load()
+
+    def load(self):
+        files: Dict[str, bytes] = {}
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                full_path = os.path.join(root, name)
+                with open(full_path, "rb") as f:
+                    files[os.path.relpath(full_path, self.directory).replace(os.sep, "/")] = f.read()
+
+        assets: Dict[str, Asset] = {}
+        aliases: Dict[str, str] = {}
+        # Prima gli asset, poi le pagine HTML, che ne riferiscono i nomi con hash
+        for path in sorted(files, key=lambda p: p.endswith(".html")):
+            body = files[path]
+            media_type = _media_type(path)
+            if path.endswith(".html"):
+                body = self._rewrite_references(path, body, aliases)
+            digest = hashlib.sha1(body).hexdigest()
+            already_hashed = HASHED_NAME.search(path) is not None
+            asset = Asset(
+                media_type=media_type,
+                etag=f'"{digest[:20]}"',
+                cache_control=IMMUTABLE_CACHE_CONTROL if already_hashed else REVALIDATE_CACHE_CONTROL,
+                bodies=_compress(body, media_type),
+            )
+            assets[path] = asset
+            if not already_hashed and not path.endswith(".html"):
+                alias = _hashed_name(path, digest)
+                aliases[path] = alias
+                assets[alias] = Asset(asset.media_type, asset.etag, IMMUTABLE_CACHE_CONTROL, asset.bodies)
+        self.assets = assets
+
+    @staticmethod
+    def _rewrite_references(path: str, body: bytes, aliases: Dict[str, str]) -> bytes:
+        """src="main.js" -> src="main.<hash>.js" per gli asset locali (percorsi relativi alla pagina)"""
+        base = os.path.dirname(path)
+
+        def replace(match: "re.Match[bytes]") -> bytes:
+            reference = match.group(2).decode()
+            target = reference.lstrip("/") if reference.startswith("/") else os.path.join(base, reference)
+            alias = aliases.get(os.path.normpath(target).replace(os.sep, "/"))
+            if alias is None:
+                return match.group(0)
+            renamed = os.path.join(os.path.dirname(reference), os.path.basename(alias)).replace(os.sep, "/")
+            return match.group(1) + renamed.encode() + match.group(3)
+
+        return re.sub(rb'((?:src|href)=")([^":?#]+)(")', replace, body)
+
+    def lookup(self, path: str) -> Asset:
+        """I percorsi sconosciuti ricevono index.html, senza eccezioni"""
+        key = path.strip("/")
+        return (
+            self.assets.get(key or INDEX)
+            or self.assets.get(f"{key}/{INDEX}")
+            or self.assets[INDEX]
+        )
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        assert scope["type"] == "http"
+        method = scope["method"]
+        if method not in ("GET", "HEAD"):
+            await self._send(send, 405, [(b"allow", b"GET, HEAD"), (b"content-type", b"text/plain; charset=utf-8")],
+                             b"Method Not Allowed", method)
+            return
+
+        path = scope["path"]
+        root_path = scope.get("root_path", "")
+        if root_path and path.startswith(root_path):
+            path = path[len(root_path):]
+        asset = self.lookup(path)
+
+        request_headers = Headers(scope=scope)
+        encoding = next(
+            encoding for encoding in _accepted_encodings(request_headers.get("accept-encoding", ""))
+            if encoding in asset.bodies
+        )
+        etag = asset.etag if encoding == "identity" else f'{asset.etag[:-1]}-{encoding}"'
+        headers = [
+            (b"etag", etag.encode()),
+            (b"cache-control", asset.cache_control.encode()),
+            (b"vary", b"Accept-Encoding"),
+        ]
+
+        if_none_match = request_headers.get("if-none-match")
+        if if_none_match and _etag_matches(if_none_match, etag):
+            await self._send(send, 304, headers, b"", method)
+            return
+
+        headers.append((b"content-type", asset.media_type.encode()))
+        if encoding != "identity":
+            headers.append((b"content-encoding", encoding.encode()))
+        await self._send(send, 200, headers, asset.bodies[encoding], method)
+
+    @staticmethod
+    async def _send(send: Send, status: int, headers: list, body: bytes, method: str):
+        if status != 304:
+            headers = headers + [(b"content-length", str(len(body)).encode())]
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": b"" if method == "HEAD" or status == 304 else body})
+
@@ -0,0 +1,146 @@
+import threading
+from collections import Counter
+from typing import Dict, List, Optional
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from . import events, models
+
+# Cache in memoria degli aggregati per le statistiche.
+# Viene calcolata una sola volta con query GROUP BY e poi aggiornata in modo
+# incrementale dagli eventi di crud.py: la lettura costa O(#skill + #BU),
+# indipendentemente dal numero di risorse.
+
+
+class StatsCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.loaded = False
+        self._skill_names: Dict[int, str] = {}
+        self._bu_names: Dict[int, str] = {}
+        self._bu_counts: Counter = Counter()
+        # skill_id -> Counter(livello -> numero di risorse)
+        self._levels: Dict[int, Counter] = {}
+        # Incrementato da ogni evento e invalidazione, anche a cache non caricata
+        self._generation = 0
+
+    def load(self, db: Session):
+        # Le query girano fuori dal lock: gli eventi non restano bloccati durante il
+        # caricamento (e in modalità asincrona l'event loop non si ferma sul lock)
+        with self._lock:
+            generation = self._generation
+        skill_names = dict(db.query(models.Skill.id, models.Skill.name).all())
+        bu_names = dict(db.query(models.BusinessUnit.id, models.BusinessUnit.name).all())
+        bu_counts = Counter(dict(
+            db.query(models.Resource.business_unit_id, func.count(models.Resource.id))
+            .group_by(models.Resource.business_unit_id).all()
+        ))
+        levels: Dict[int, Counter] = {}
+        rows = db.query(
+            models.ResourceSkillLink.skill_id,
+            models.ResourceSkillLink.level,
+            func.count(),
+        ).group_by(models.ResourceSkillLink.skill_id, models.ResourceSkillLink.level)
+        for skill_id, level, count in rows:
+            levels.setdefault(skill_id, Counter())[level] = count
+        with self._lock:
+            self._skill_names, self._bu_names, self._bu_counts, self._levels = skill_names, bu_names, bu_counts, levels
+            # Una modifica notificata durante le query può essere già inclusa nei conteggi
+            # oppure no: applicarla rischierebbe di contarla due volte, ignorarla di
+            # perderla. Si servono questi dati e si ricalcola al prossimo accesso.
+            self.loaded = self._generation == generation
+
+    def ensure_loaded(self, db: Session):
+        if not self.loaded:
+            self.load(db)
+
+    def invalidate(self):
+        with self._lock:
+            self._generation += 1
+            self.loaded = False
+
+    # --- Aggiornamento incrementale ---
+    def _apply_skills(self, skills: Dict[int, int], sign: int):
+        for skill_id, level in skills.items():
+            levels = self._levels.setdefault(skill_id, Counter())
+            levels[level] += sign
+            if levels[level] <= 0:
+                del levels[level]
+
+    def handle_event(self, event: events.ChangeEvent):
+        with self._lock:
+            self._generation += 1
+            if not self.loaded:
+                return
+            if event.entity == "resource":
+                bu_id = event.data.get("business_unit_id")
+                if event.op == "create":
+                    self._bu_counts[bu_id] += 1
+                elif event.op == "update" and "previous_business_unit_id" in event.data:
+                    self._bu_counts[event.data["previous_business_unit_id"]] -= 1
+                    self._bu_counts[bu_id] += 1
+                elif event.op == "delete":
+                    self._bu_counts[bu_id] -= 1
+                    self._apply_skills(event.data.get("skills", {}), -1)
+            elif event.entity == "resource_skills":
+                self._apply_skills(event.data.get("before", {}), -1)
+                self._apply_skills(event.data.get("after", {}), +1)
+            elif event.entity == "skill":
+                if event.op == "create":
+                    self._skill_names[event.id] = event.data.get("name")
+                elif event.op == "delete":
+                    self._skill_names.pop(event.id, None)
+                    self._levels.pop(event.id, None)
+            elif event.entity == "business_unit":
+                if event.op == "create":
+                    self._bu_names[event.id] = event.data.get("name")
+                elif event.op == "delete":
+                    moved = self._bu_counts.pop(event.id, 0)
+                    self._bu_names.pop(event.id, None)
+                    if event.data.get("action") == "migrate":
+                        self._bu_counts[event.data.get("target_bu_id")] += moved
+                    else:
+                        # Le risorse eliminate portano via i loro link: si ricalcola al prossimo accesso
+                        self.loaded = False
+
+    # --- Letture ---
+    def totals(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "total_resources": sum(self._bu_counts.values()),
+                "total_skills": len(self._skill_names),
+                "total_business_units": len(self._bu_names),
+            }
+
+    def skills(self, limit: Optional[int] = None) -> List[models.SkillStat]:
+        with self._lock:
+            stats = []
+            for skill_id, name in self._skill_names.items():
+                levels = self._levels.get(skill_id, Counter())
+                count = sum(levels.values())
+                average = sum(level * n for level, n in levels.items()) / count if count else 0.0
+                stats.append(models.SkillStat(skill_id=skill_id, name=name, count=count, average_level=round(average, 2)))
+        stats.sort(key=lambda s: (-s.count, s.name))
+        return stats[:limit] if limit is not None else stats
+
+    def business_units(self) -> List[models.BusinessUnitStat]:
+        with self._lock:
+            stats = [
+                models.BusinessUnitStat(business_unit_id=bu_id, name=name, resources=self._bu_counts.get(bu_id, 0))
+                for bu_id, name in self._bu_names.items()
+            ]
+        stats.sort(key=lambda s: (-s.resources, s.name))
+        return stats
+
+    def levels(self, skill_id: Optional[int] = None) -> List[models.LevelBucket]:
+        with self._lock:
+            total = Counter()
+            for sid, levels in self._levels.items():
+                if skill_id is None or sid == skill_id:
+                    total.update(levels)
+        return [models.LevelBucket(level=level, count=count) for level, count in sorted(total.items()) if count > 0]
+
+
+stats_cache = StatsCache()
+events.subscribe(stats_cache.handle_event)
@@ -0,0 +1,114 @@
+"""
+Generatore deterministico di un'organizzazione sintetica.
+
+La popolarità delle skill segue una distribuzione di Zipf (poche skill molto
+diffuse, una lunga coda di skill rare), il numero di skill per persona una
+log-normale e i livelli una distribuzione triangolare centrata sui valori
+intermedi. A parità di seed e parametri i dati generati sono identici.
+"""
+import math
+import random
+from dataclasses import dataclass
+from itertools import islice
+from typing import Iterator, List
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from app import models
+
+INSERT_CHUNK = 5000
+
+@dataclass
+class OrgSpec:
+    business_units: int = 5
+    skills: int = 100
+    resources: int = 2000
+    skills_per_resource: float = 12.0 # Valore medio
+    max_level: int = 10
+    labels: int = 20
+    seed: int = 42
+
+SCALES = {
+    "tiny": OrgSpec(business_units=3, skills=30, resources=200),
+    "small": OrgSpec(business_units=5, skills=100, resources=2000),
+    "medium": OrgSpec(business_units=20, skills=300, resources=20000),
+    "large": OrgSpec(business_units=50, skills=1000, resources=100000),
+}
+
+
+def _chunks(rows: Iterator[dict], size: int = INSERT_CHUNK) -> Iterator[List[dict]]:
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class OrgGenerator:
+    def __init__(self, spec: OrgSpec):
+        self.spec = spec
+        self.rng = random.Random(spec.seed)
+        # Pesi di Zipf (s=1.1) per la popolarità delle skill
+        self.skill_weights = [1.0 / math.pow(rank, 1.1) for rank in range(1, spec.skills + 1)]
+
+    def _skill_count(self) -> int:
+        mu = math.log(self.spec.skills_per_resource) - 0.125
+        count = int(round(self.rng.lognormvariate(mu, 0.5)))
+        return max(0, min(count, self.spec.skills))
+
+    def _pick_skills(self, count: int) -> List[int]:
+        chosen = set()
+        while len(chosen) < count:
+            chosen.update(self.rng.choices(range(1, self.spec.skills + 1), weights=self.skill_weights, k=count - len(chosen)))
+        return sorted(chosen)
+
+    def _level(self) -> int:
+        return max(1, min(self.spec.max_level, int(round(self.rng.triangular(1, self.spec.max_level, self.spec.max_level * 0.4)))))
+
+    def _resources(self) -> Iterator[dict]:
+        for i in range(1, self.spec.resources + 1):
+            yield {
+                "nome": f"Nome{i}",
+                "cognome": f"Cognome{i}",
+                "email": f"user{i}@example.com",
+                "numero": f"+39 02 {i:07d}",
+                "business_unit_id": self.rng.randint(1, self.spec.business_units),
+            }
+
+    def _links(self) -> Iterator[dict]:
+        for resource_id in range(1, self.spec.resources + 1):
+            for skill_id in self._pick_skills(self._skill_count()):
+                yield {"resource_id": resource_id, "skill_id": skill_id, "level": self._level()}
+
+    def load(self, db: Session):
+        """Inserisce l'organizzazione in un database vuoto (gli id partono da 1)"""
+        spec = self.spec
+        db.execute(insert(models.BusinessUnit), [{"name": f"Business Unit {i}"} for i in range(1, spec.business_units + 1)])
+        db.execute(insert(models.Skill), [{"name": f"Skill {i}"} for i in range(1, spec.skills + 1)])
+        if spec.labels:
+            db.execute(insert(models.Label), [{"name": f"label-{i}"} for i in range(1, spec.labels + 1)])
+            # Circa una skill su tre ha una o due label
+            db.execute(insert(models.skill_labels), [
+                {"skill_id": skill_id, "label_id": label_id}
+                for skill_id in range(1, spec.skills + 1) if self.rng.random() < 0.33
+                for label_id in self.rng.sample(range(1, spec.labels + 1), self.rng.randint(1, min(2, spec.labels)))
+            ])
+        for chunk in _chunks(self._resources()):
+            db.execute(insert(models.Resource), chunk)
+        link_labels = []
+        for chunk in _chunks(self._links()):
+            db.execute(insert(models.ResourceSkillLink), chunk)
+            if spec.labels:
+                link_labels.extend(
+                    {"resource_id": row["resource_id"], "skill_id": row["skill_id"], "label_id": self.rng.randint(1, spec.labels)}
+                    for row in chunk if self.rng.random() < 0.1
+                )
+        for chunk in _chunks(iter(link_labels)):
+            db.execute(insert(models.resource_skill_link_labels), chunk)
+        db.commit()
+
+
+def generate_org(db: Session, spec: OrgSpec) -> OrgSpec:
+    OrgGenerator(spec).load(db)
+    return spec
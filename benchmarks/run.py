@@ -0,0 +1,174 @@
+"""
+Esegue gli scenari del benchmark contro un database SQLite in-process
+popolato dal generatore sintetico e confronta i risultati con una baseline.
+
+    python -m benchmarks.run --scale small
+    python -m benchmarks.run --scale small --update-baseline
+    python -m benchmarks.run --only resource_single stats_summary
+
+Per ogni scenario vengono riportati p50/p95/p99 in millisecondi, il numero
+medio di query SQL per richiesta e gli errori (risposte non 2xx/3xx).
+Il processo termina con codice 1 se rispetto alla baseline il p95 peggiora
+oltre la tolleranza (e di almeno --min-delta-ms), se aumentano le query per
+richiesta o gli errori. Il confronto avviene solo a parità di scala.
+"""
+import argparse
+import gc
+import json
+import math
+import os
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Percentile con il metodo nearest-rank"""
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def prepare_app(scale: str, workdir: str):
+    # Il database va configurato prima di importare l'applicazione
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    from fastapi.testclient import TestClient
+    from sqlalchemy import event
+
+    from app.database import SessionLocal, engine
+    from app.main import app
+    from app.migrations import upgrade
+    from benchmarks.generator import SCALES, generate_org
+
+    spec = SCALES[scale]
+    upgrade(engine)
+    with SessionLocal() as db:
+        generate_org(db, spec)
+
+    counter = {"queries": 0}
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def count_query(*args):
+        counter["queries"] += 1
+
+    return TestClient(app, raise_server_exceptions=False), SessionLocal, spec, counter
+
+
+def run_scenarios(client, session_factory, spec, counter, iterations: int, warmup: int, only: List[str]) -> Dict[str, dict]:
+    from benchmarks.scenarios import Context, build_scenarios
+
+    ctx = Context(client=client, session_factory=session_factory, spec=spec, state={})
+    results = {}
+    for scenario in build_scenarios(spec):
+        if only and scenario.name not in only:
+            continue
+        timings, queries, errors = [], 0, 0
+        gc.collect()
+        for i in range(warmup + (scenario.iterations or iterations)):
+            if scenario.setup:
+                scenario.setup(ctx, i)
+            method, url, kwargs = scenario.request(ctx, i)
+            counter["queries"] = 0
+            start = time.perf_counter()
+            response = client.request(method, url, **kwargs)
+            _ = response.content
+            elapsed = (time.perf_counter() - start) * 1000
+            if i < warmup:
+                # Le prime iterazioni riscaldano cache, indici e statement compilati
+                continue
+            timings.append(elapsed)
+            queries += counter["queries"]
+            if response.status_code >= 400:
+                errors += 1
+        results[scenario.name] = {
+            "n": len(timings),
+            "p50": round(percentile(timings, 50), 3),
+            "p95": round(percentile(timings, 95), 3),
+            "p99": round(percentile(timings, 99), 3),
+            "queries": round(queries / len(timings), 2),
+            "errors": errors,
+        }
+    return results
+
+
+def print_report(results: Dict[str, dict]):
+    print(f"{'scenario':<30} {'n':>4} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'q/req':>7} {'err':>4}")
+    for name, r in results.items():
+        print(f"{name:<30} {r['n']:>4} {r['p50']:>9.2f} {r['p95']:>9.2f} {r['p99']:>9.2f} {r['queries']:>7.2f} {r['errors']:>4}")
+
+
+def compare(results: Dict[str, dict], baseline: Dict[str, dict], tolerance: float, min_delta_ms: float) -> List[str]:
+    regressions = []
+    for name, current in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        # Sugli scenari da pochi millisecondi il rumore supera la tolleranza relativa
+        limit = max(base["p95"] * (1 + tolerance), base["p95"] + min_delta_ms)
+        if current["p95"] > limit:
+            regressions.append(f"{name}: p95 {current['p95']:.2f} ms > baseline {base['p95']:.2f} ms (+{tolerance:.0%})")
+        # Il numero di query è deterministico: qualsiasi aumento è una regressione (es. un N+1)
+        if current["queries"] > base["queries"]:
+            regressions.append(f"{name}: query/richiesta {current['queries']} > baseline {base['queries']}")
+        # Una risposta di errore misura il percorso sbagliato: non è mai ammessa, nemmeno se già in baseline
+        if current["errors"]:
+            regressions.append(f"{name}: {current['errors']} risposte di errore")
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", default="small", choices=["tiny", "small", "medium", "large"])
+    parser.add_argument("--iterations", type=int, default=30)
+    parser.add_argument("--warmup", type=int, default=2, help="Iterazioni iniziali non misurate per scenario")
+    parser.add_argument("--only", nargs="*", default=[], help="Esegue solo gli scenari indicati")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--update-baseline", action="store_true", help="Sovrascrive la baseline con i risultati")
+    parser.add_argument("--tolerance", type=float, default=1.0, help="Peggioramento ammesso del p95 (1.0 = +100%%)")
+    parser.add_argument("--min-delta-ms", type=float, default=10.0, help="Peggioramento minimo assoluto del p95 considerato regressione")
+    parser.add_argument("--output", help="Salva i risultati in formato JSON")
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="skill-matrix-bench-")
+    client, session_factory, spec, counter = prepare_app(args.scale, workdir)
+    results = run_scenarios(client, session_factory, spec, counter, args.iterations, args.warmup, args.only)
+    print_report(results)
+
+    report = {"scale": args.scale, "results": results}
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.update_baseline:
+        failing = [name for name, r in results.items() if r["errors"]]
+        if failing:
+            print(f"Scenari con risposte di errore, baseline non aggiornata: {', '.join(failing)}")
+            return 1
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+        print(f"Baseline aggiornata: {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("Nessuna baseline trovata: confronto saltato")
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline.get("scale") != args.scale:
+        print(f"Baseline registrata con scala '{baseline.get('scale')}': confronto saltato")
+        return 0
+    regressions = compare(results, baseline["results"], args.tolerance, args.min_delta_ms)
+    if regressions:
+        print("\nRegressioni rispetto alla baseline:")
+        for line in regressions:
+            print(f"  - {line}")
+        return 1
+    print("\nNessuna regressione rispetto alla baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,115 @@
+"""
+Scenari del benchmark: ogni scenario descrive una richiesta HTTP e, se serve,
+una preparazione non cronometrata eseguita prima di ogni iterazione.
+"""
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import insert, select, update
+
+from app import models
+from app.pagination import encode_cursor
+
+Request = Tuple[str, str, Dict]
+
+
+@dataclass
+class Context:
+    client: object
+    session_factory: Callable
+    spec: object
+    # Dati creati dalla preparazione e usati dalla richiesta
+    state: Dict = None
+
+
+@dataclass
+class Scenario:
+    name: str
+    request: Callable[[Context, int], Request]
+    setup: Optional[Callable[[Context, int], None]] = None
+    iterations: Optional[int] = None # Se None si usa il valore globale
+
+
+def _resource_id(ctx: Context, i: int) -> int:
+    # Id diversi a ogni iterazione per non misurare solo la cache HTTP
+    return (i * 7919) % ctx.spec.resources + 1
+
+
+def _get(url: str, **params) -> Callable[[Context, int], Request]:
+    return lambda ctx, i: ("GET", url, {"params": params})
+
+
+# --- Preparazioni ---
+def _prepare_skill_update(ctx: Context, i: int):
+    resource_id = _resource_id(ctx, i)
+    with ctx.session_factory() as db:
+        rows = db.execute(select(models.ResourceSkillLink.skill_id, models.ResourceSkillLink.level)
+                          .where(models.ResourceSkillLink.resource_id == resource_id)).all()
+    skills = [{"skill_id": skill_id, "level": level} for skill_id, level in rows]
+    if skills:
+        # Cambia un solo livello: è la modifica tipica dall'interfaccia
+        skills[0]["level"] = skills[0]["level"] % ctx.spec.max_level + 1
+    ctx.state = {"resource_id": resource_id, "skills": skills}
+
+def _prepare_bu(ctx: Context, i: int, with_new_resources: bool):
+    with ctx.session_factory() as db:
+        bu_id = db.execute(insert(models.BusinessUnit).values(name=f"Bench BU {i}-{with_new_resources}")).inserted_primary_key[0]
+        if with_new_resources:
+            db.execute(insert(models.Resource), [
+                {"nome": "Bench", "cognome": str(n), "email": f"bench-{bu_id}-{n}@example.com", "business_unit_id": bu_id}
+                for n in range(50)
+            ])
+            ids = [rid for (rid,) in db.execute(select(models.Resource.id).where(models.Resource.business_unit_id == bu_id))]
+            db.execute(insert(models.ResourceSkillLink), [
+                {"resource_id": rid, "skill_id": s, "level": 3} for rid in ids for s in range(1, 6)
+            ])
+        else:
+            # Sposta 50 risorse esistenti nella nuova BU
+            ids = [rid for (rid,) in db.execute(select(models.Resource.id).order_by(models.Resource.id).limit(50).offset(i * 50))]
+            db.execute(update(models.Resource).where(models.Resource.id.in_(ids)).values(business_unit_id=bu_id))
+        db.commit()
+    ctx.state = {"bu_id": bu_id}
+
+
+def build_scenarios(spec) -> List[Scenario]:
+    deep = max(spec.resources - 200, 0)
+    return [
+        Scenario("resources_first_page", _get("/api/resources", limit=100)),
+        Scenario("resources_page_1000", _get("/api/resources", limit=1000), iterations=10),
+        Scenario("resources_deep_page_cursor", _get("/api/resources", limit=100, cursor=encode_cursor(deep))),
+        Scenario("resources_deep_page_offset", _get("/api/resources", limit=100, skip=deep)),
+        Scenario("resource_single", lambda ctx, i: ("GET", f"/api/resources/{_resource_id(ctx, i)}", {})),
+        Scenario("skills_list", _get("/api/skills", limit=1000)),
+        Scenario("business_units_list", _get("/api/business_units")),
+        Scenario("search_one_skill", _get("/api/resources/search", skill="1:5")),
+        Scenario("search_two_skills_all", _get("/api/resources/search", skill=["1:3", "2:3"])),
+        Scenario("search_by_link_label", _get("/api/resources/search", label="label-1")),
+        Scenario("labels_all", _get("/api/skills/labels/all")),
+        Scenario("skills_by_label", _get("/api/skills/by-label/label-1")),
+        Scenario("stats_summary", _get("/api/stats")),
+        Scenario(
+            "skills_put_one_change",
+            lambda ctx, i: ("PUT", f"/api/resources/{ctx.state['resource_id']}/skills", {"json": ctx.state["skills"]}),
+            setup=_prepare_skill_update,
+        ),
+        Scenario(
+            "skills_patch_one_change",
+            lambda ctx, i: ("PATCH", f"/api/resources/{ctx.state['resource_id']}/skills",
+                            {"json": {"upsert": ctx.state["skills"][:1]}}),
+            setup=_prepare_skill_update,
+        ),
+        Scenario(
+            "business_unit_migrate",
+            lambda ctx, i: ("DELETE", f"/api/business_units/{ctx.state['bu_id']}",
+                            {"json": {"action": "migrate", "target_bu_id": 1}}),
+            setup=lambda ctx, i: _prepare_bu(ctx, i, with_new_resources=False),
+            iterations=10,
+        ),
+        Scenario(
+            "business_unit_delete",
+            lambda ctx, i: ("DELETE", f"/api/business_units/{ctx.state['bu_id']}", {"json": {"action": "delete"}}),
+            setup=lambda ctx, i: _prepare_bu(ctx, i, with_new_resources=True),
+            iterations=10,
+        ),
+        Scenario("export_matrix_ndjson", _get("/api/export/matrix", format="ndjson"), iterations=3),
+    ]
@@ -0,0 +1,71 @@
+"""
+Confronto tra serializzazione ORM (format_resource_response + validazione
+response_model + jsonable_encoder) e percorso veloce (query a sole colonne +
+ORJSONResponse) su pagine grandi di risorse.
+
+    python -m benchmarks.serialization --resources 5000 --page 1000
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--resources", type=int, default=5000)
+    parser.add_argument("--skills", type=int, default=200)
+    parser.add_argument("--skills-per-resource", type=float, default=15)
+    parser.add_argument("--page", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    # Il database va configurato prima di importare l'applicazione
+    workdir = tempfile.mkdtemp(prefix="skill-matrix-bench-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+
+    from fastapi.encoders import jsonable_encoder
+    from pydantic import TypeAdapter
+    from typing import List
+
+    from app import crud, models
+    from app.database import SessionLocal, engine
+    from app.migrations import upgrade
+    from app.routers.resources import format_resource_response
+    from app.serialization import FastJSONResponse
+    from benchmarks.generator import OrgSpec, generate_org
+
+    upgrade(engine)
+    with SessionLocal() as db:
+        generate_org(db, OrgSpec(business_units=10, skills=args.skills, resources=args.resources,
+                                 skills_per_resource=args.skills_per_resource))
+
+    adapter = TypeAdapter(List[models.ResourceSchema])
+
+    def orm_path():
+        session = SessionLocal()
+        try:
+            data = [format_resource_response(r) for r in crud.get_resources(session, limit=args.page)]
+            validated = adapter.validate_python(data, from_attributes=True)
+            return FastJSONResponse(jsonable_encoder(validated)).body
+        finally:
+            session.close()
+
+    def fast_path():
+        session = SessionLocal()
+        try:
+            return FastJSONResponse(crud.get_resource_dicts(session, limit=args.page)).body
+        finally:
+            session.close()
+
+    assert orm_path() == fast_path(), "I due percorsi devono produrre lo stesso JSON"
+    for name, fn in (("orm", orm_path), ("fast", fast_path)):
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            fn()
+            timings.append((time.perf_counter() - start) * 1000)
+        print(f"{name:>5}: median {statistics.median(timings):8.1f} ms  min {min(timings):8.1f} ms  (page={args.page})")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,6 @@
+import os
+import tempfile
+
+# Database SQLite temporaneo condiviso dai test, impostato prima che un modulo di
+# test importi l'applicazione (database.py legge DATABASE_URL all'importazione)
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'tests.db')}")
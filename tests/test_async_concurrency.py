@@ -0,0 +1,98 @@
+"""
+Richieste concorrenti in modalità asincrona (DB_ASYNC=true) sugli endpoint che
+costruiscono strutture in memoria al primo accesso. Con db_endpoint ogni query
+cede l'event loop: un caricamento che tenesse un threading.Lock durante le query
+bloccherebbe il loop alla seconda richiesta concorrente.
+"""
+import asyncio
+import os
+import threading
+
+# DATABASE_URL è impostato in conftest.py
+os.environ.setdefault("DB_ASYNC", "true")
+
+import httpx
+import pytest
+
+from app import database
+from app.autocomplete import autocomplete_index
+from app.main import app
+from app.matching import skill_matrix
+from app.recommendations import recommender
+from app.search_index import skill_index
+from app.stats_cache import stats_cache
+
+pytestmark = pytest.mark.skipif(not database.DB_ASYNC, reason="l'app è già stata importata in modalità sincrona")
+
+CONCURRENCY = 4
+# Con l'event loop bloccato nemmeno asyncio.wait_for può scadere: lo scenario gira
+# in un thread daemon e il test fallisce se non termina entro questo tempo
+TIMEOUT = 60
+
+
+async def _seed(client: httpx.AsyncClient):
+    bu = (await client.post("/api/business_units", json={"name": "Concorrenza"})).json()
+    skills = [
+        (await client.post("/api/skills", json={"name": f"Concorrenza {i}"})).json()["id"]
+        for i in range(3)
+    ]
+    for i in range(6):
+        resource = (await client.post("/api/resources", json={
+            "nome": f"Nome{i}", "cognome": "Cognome", "email": f"concorrenza{i}@example.com",
+            "business_unit_id": bu["id"],
+        })).json()
+        await client.put(f"/api/resources/{resource['id']}/skills", json=[
+            {"skill_id": skill_id, "level": 1 + (i + j) % 5} for j, skill_id in enumerate(skills)
+        ])
+    return skills, resource["id"]
+
+
+async def _concurrently(client: httpx.AsyncClient, method: str, url: str, **kwargs):
+    responses = await asyncio.gather(*[client.request(method, url, **kwargs) for _ in range(CONCURRENCY)])
+    assert [r.status_code for r in responses] == [200] * CONCURRENCY, [r.text for r in responses]
+    return responses
+
+
+def test_concurrent_loads_do_not_block_the_event_loop():
+    async def scenario():
+        async with app.router.lifespan_context(app):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                skills, resource_id = await _seed(client)
+
+                stats_cache.invalidate()
+                responses = await _concurrently(client, "GET", "/api/stats")
+                assert all(r.json()["total_resources"] >= 6 for r in responses)
+
+                skill_index.reset()
+                await _concurrently(client, "GET", "/api/resources/search", params={"skill": f"{skills[0]}:1"})
+
+                skill_matrix.reset()
+                await _concurrently(client, "POST", "/api/match", json={
+                    "skills": [{"skill_id": skills[0], "level": 3}],
+                })
+
+                autocomplete_index.reset()
+                responses = await _concurrently(client, "GET", "/api/autocomplete", params={"q": "concorr"})
+                assert all(r.json() for r in responses)
+
+                recommender.reset()
+                await _concurrently(client, "GET", f"/api/resources/{resource_id}/similar")
+                await _concurrently(client, "GET", f"/api/skills/{skills[0]}/related")
+        # Chiude le connessioni aiosqlite, i cui thread impedirebbero l'uscita dell'interprete
+        await database.async_engine.dispose()
+
+    errors = []
+
+    def run():
+        try:
+            asyncio.run(scenario())
+        except BaseException as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    thread.join(TIMEOUT)
+    assert not thread.is_alive(), "event loop bloccato: richieste concorrenti in stallo"
+    if errors:
+        raise errors[0]
@@ -0,0 +1,33 @@
+"""
+Ordinamento dei suggerimenti di GET /api/autocomplete: i primi `limit` vanno
+scelti tra tutti gli elementi che corrispondono alla query, non tra i primi
+trovati scorrendo i token in ordine alfabetico.
+"""
+from app.autocomplete import AutocompleteIndex, _named_entry, _resource_entry
+
+
+def _index(*entries) -> AutocompleteIndex:
+    index = AutocompleteIndex()
+    for entry in entries:
+        index._add(entry)
+    index.loaded = True
+    return index
+
+
+def test_ranking_considers_every_prefix_match():
+    # I token "roberto00".."roberto59" precedono "rollout" nella lista ordinata
+    index = _index(
+        *[_resource_entry(i, f"Roberto{i:02d}", "Bianchi", f"roberto{i:02d}@example.com") for i in range(1, 61)],
+        _named_entry("skill", 1, "Ro"),
+        _named_entry("skill", 2, "Rollout"),
+    )
+    labels = [entry.label for entry in index.search("ro", limit=5)]
+    assert labels == ["Ro", "Rollout", "Roberto01 Bianchi", "Roberto02 Bianchi", "Roberto03 Bianchi"]
+
+
+def test_ranking_considers_every_substring_match():
+    index = _index(
+        *[_resource_entry(i, f"Carlo{i:02d}", "Bianchi", f"carlo{i:02d}@example.com") for i in range(1, 61)],
+        _named_entry("skill", 1, "Branch"),
+    )
+    assert [entry.label for entry in index.search("anch", limit=1)] == ["Branch"]
@@ -0,0 +1,242 @@
+"""
+Le strutture in memoria aggiornate dagli eventi di crud.py (indice di ricerca,
+matrice del matching, cache delle statistiche, autocomplete, raccomandazioni e
+feed delle modifiche) devono coincidere, dopo ogni tipo di scrittura, con le
+stesse strutture ricostruite da zero con load() dal database.
+"""
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import models
+from app.autocomplete import AutocompleteIndex, autocomplete_index
+from app.changefeed import change_feed
+from app.database import SessionLocal
+from app.main import app
+from app.matching import SkillMatrix, skill_matrix
+from app.recommendations import build_snapshot, recommender
+from app.search_index import SkillIndex, skill_index
+from app.stats_cache import StatsCache, stats_cache
+
+JOB_TIMEOUT = 30
+
+
+# --- Stato delle strutture in una forma confrontabile ---
+def _search_state(index: SkillIndex):
+    postings = {
+        skill_id: {level: list(ids) for level, ids in levels.items() if ids}
+        for skill_id, levels in index._postings.items()
+    }
+    return (
+        index._resource_bu,
+        {rid: skills for rid, skills in index._resource_skills.items() if skills},
+        {skill_id: levels for skill_id, levels in postings.items() if levels},
+    )
+
+def _matrix_state(matrix: SkillMatrix):
+    return {
+        resource_id: (
+            int(matrix._bu_ids[row]),
+            {skill_id: int(matrix._levels[row, col]) for skill_id, col in matrix._cols.items() if matrix._levels[row, col]},
+        )
+        for resource_id, row in matrix._rows.items()
+    }
+
+def _stats_state(cache: StatsCache):
+    return cache.totals(), cache.skills(), cache.business_units(), cache.levels()
+
+def _autocomplete_state(index: AutocompleteIndex):
+    return index._entries, sorted(index._tokens), {gram: keys for gram, keys in index._trigrams.items() if keys}
+
+def _snapshot_state(snapshot):
+    """Valori non nulli per id: risorse e skill senza link non contano (la loro creazione non invalida)"""
+    vectors, cooccurrence = snapshot.vectors.tocoo(), snapshot.cooccurrence.tocoo()
+    return (
+        {
+            (int(snapshot.resource_ids[row]), int(snapshot.skill_ids[col])): round(float(value), 9)
+            for row, col, value in zip(vectors.row, vectors.col, vectors.data) if value
+        },
+        {
+            (int(snapshot.skill_ids[row]), int(snapshot.skill_ids[col])): int(value)
+            for row, col, value in zip(cooccurrence.row, cooccurrence.col, cooccurrence.data) if value
+        },
+    )
+
+def _feed_view(events, view):
+    """Risorse (id -> BU) ottenute applicando gli eventi del feed come fa il frontend"""
+    view = dict(view)
+    for event in events:
+        if event.entity == "resource" and event.op in ("create", "update"):
+            view[event.id] = event.data["business_unit_id"]
+        elif event.entity == "resource" and event.op == "delete":
+            view.pop(event.id, None)
+        elif event.entity == "business_unit" and event.op == "delete":
+            residents = [rid for rid, bu_id in view.items() if bu_id == event.id]
+            for resource_id in residents:
+                if event.data["action"] == "migrate":
+                    view[resource_id] = event.data["target_bu_id"]
+                else:
+                    del view[resource_id]
+    return view
+
+def _resource_bus(db):
+    return dict(db.query(models.Resource.id, models.Resource.business_unit_id).all())
+
+
+@pytest.fixture(scope="module")
+def client():
+    with TestClient(app) as client:
+        yield client
+
+@pytest.fixture(scope="module")
+def feed_start():
+    """Sequenza del feed e risorse nel database prima delle scritture del test"""
+    with SessionLocal() as db:
+        return change_feed.seq, _resource_bus(db)
+
+@pytest.fixture(autouse=True, scope="module")
+def loaded_indexes(client):
+    # Strutture già caricate, così le scritture passano dall'aggiornamento incrementale;
+    # nessuna ricostruzione a tempo delle raccomandazioni durante il test
+    rebuild_delay, recommender.rebuild_delay = recommender.rebuild_delay, 3600
+    with SessionLocal() as db:
+        for index in (skill_index, skill_matrix, stats_cache, autocomplete_index):
+            index.load(db)
+        recommender.refresh(db)
+    yield
+    recommender.reset()
+    recommender.rebuild_delay = rebuild_delay
+
+
+def assert_consistent():
+    with SessionLocal() as db:
+        fresh_index = SkillIndex()
+        fresh_index.load(db)
+        assert _search_state(skill_index) == _search_state(fresh_index)
+
+        fresh_matrix = SkillMatrix()
+        fresh_matrix.load(db)
+        assert _matrix_state(skill_matrix) == _matrix_state(fresh_matrix)
+
+        # Alcune scritture (eliminazione di una BU con le sue risorse) svuotano la cache
+        stats_cache.ensure_loaded(db)
+        fresh_stats = StatsCache()
+        fresh_stats.load(db)
+        assert _stats_state(stats_cache) == _stats_state(fresh_stats)
+
+        fresh_autocomplete = AutocompleteIndex()
+        fresh_autocomplete.load(db)
+        assert _autocomplete_state(autocomplete_index) == _autocomplete_state(fresh_autocomplete)
+
+        # Lo snapshot delle raccomandazioni non si aggiorna: o è segnato come obsoleto o è ancora esatto
+        if not recommender.stale:
+            assert _snapshot_state(recommender.snapshot) == _snapshot_state(build_snapshot(db))
+        recommender.refresh(db)
+
+
+def _ok(response, status=200):
+    assert response.status_code == status, response.text
+    return response.json() if response.content else None
+
+def _bu(client, name):
+    return _ok(client.post("/api/business_units", json={"name": name}), 201)["id"]
+
+def _skill(client, name):
+    return _ok(client.post("/api/skills", json={"name": name}), 201)["id"]
+
+def _resource(client, name, bu_id, skills=()):
+    resource = _ok(client.post("/api/resources", json={
+        "nome": name, "cognome": "Coerenza", "email": f"{name.lower()}@coerenza.example.com", "business_unit_id": bu_id,
+    }), 201)
+    if skills:
+        _ok(client.put(f"/api/resources/{resource['id']}/skills", json=[
+            {"skill_id": skill_id, "level": level} for skill_id, level in skills
+        ]))
+    return resource["id"]
+
+
+def test_indexes_follow_every_kind_of_write(client, feed_start):
+    nord, sud = _bu(client, "Coerenza Nord"), _bu(client, "Coerenza Sud")
+    python, sql, rust = _skill(client, "Coerenza Python"), _skill(client, "Coerenza SQL"), _skill(client, "Coerenza Rust")
+    anna = _resource(client, "Anna", nord, [(python, 4), (sql, 2)])
+    bruno = _resource(client, "Bruno", nord, [(python, 2), (rust, 5)])
+    carla = _resource(client, "Carla", sud, [(sql, 3)])
+    assert_consistent()
+
+    # PATCH delle skill: aggiunta, modifica e rimozione
+    _ok(client.patch(f"/api/resources/{anna}/skills", json={
+        "upsert": [{"skill_id": rust, "level": 1}, {"skill_id": python, "level": 5}], "remove": [sql],
+    }))
+    assert_consistent()
+
+    # Upsert per email: cambio di nome e di BU, poi una lista con una risorsa nuova
+    _ok(client.put("/api/resources/by-email/bruno@coerenza.example.com", json={
+        "nome": "Bruno Maria", "cognome": "Coerenza", "business_unit_id": sud,
+    }))
+    results = _ok(client.put("/api/resources", json=[
+        {"nome": "Carla", "cognome": "Rinominata", "email": "carla@coerenza.example.com", "business_unit_id": nord},
+        {"nome": "Dario", "cognome": "Coerenza", "email": "dario@coerenza.example.com", "business_unit_id": sud},
+    ]))
+    dario = results[1]["id"]
+    _ok(client.put("/api/skills", json=[{"name": "Coerenza Go"}, {"name": "Coerenza SQL", "labels": ["db"]}]))
+    _ok(client.put("/api/business_units", json=[{"name": "Coerenza Est"}, {"name": "Coerenza Nord"}]))
+    assert_consistent()
+
+    # Batch confermato, con riferimenti agli id creati
+    response = _ok(client.post("/api/batch", json={"operations": [
+        {"op": "skill.create", "data": {"name": "Coerenza Kotlin"}},
+        {"op": "resource.create", "data": {
+            "nome": "Elena", "cognome": "Coerenza", "email": "elena@coerenza.example.com", "business_unit_id": sud,
+        }},
+        {"op": "resource.skills.put", "id": "$1", "data": [{"skill_id": sql, "level": 4}, {"skill_id": rust, "level": 2}]},
+        {"op": "resource.skills.patch", "id": dario, "data": {"upsert": [{"skill_id": python, "level": 3}]}},
+        {"op": "resource.delete", "id": carla},
+        {"op": "resource.upsert", "data": {
+            "nome": "Anna", "cognome": "Spostata", "email": "anna@coerenza.example.com", "business_unit_id": sud,
+        }},
+    ]}))
+    assert response["committed"]
+    elena = response["results"][1]["result"]["id"]
+    assert_consistent()
+
+    # Batch annullato: nessun evento, nessuna modifica
+    response = _ok(client.post("/api/batch", json={"operations": [
+        {"op": "resource.skills.put", "id": elena, "data": [{"skill_id": python, "level": 1}]},
+        {"op": "resource.delete", "id": 10 ** 9},
+    ]}), 404)
+    assert not response["committed"]
+    assert_consistent()
+
+    _ok(client.delete(f"/api/resources/{dario}"), 204)
+    _ok(client.delete(f"/api/skills/{rust}"), 204)
+    assert_consistent()
+
+    # Eliminazione di BU: migrazione delle risorse, poi eliminazione insieme alle risorse
+    ovest = _bu(client, "Coerenza Ovest")
+    _resource(client, "Fabio", ovest, [(python, 1), (sql, 5)])
+    _ok(client.request("DELETE", f"/api/business_units/{ovest}", params={"background": "false"},
+                       json={"action": "migrate", "target_bu_id": nord}))
+    assert_consistent()
+    _ok(client.request("DELETE", f"/api/business_units/{sud}", params={"background": "false"},
+                       json={"action": "delete"}))
+    assert_consistent()
+
+    # Eliminazione in background, dal thread dei job
+    centro = _bu(client, "Coerenza Centro")
+    _resource(client, "Gino", centro, [(sql, 2)])
+    job = _ok(client.request("DELETE", f"/api/business_units/{centro}", params={"background": "true"},
+                             json={"action": "migrate", "target_bu_id": nord}), 202)
+    deadline = time.monotonic() + JOB_TIMEOUT
+    while _ok(client.get(f"/api/jobs/{job['id']}"))["status"] in ("queued", "running"):
+        assert time.monotonic() < deadline, "job di eliminazione non concluso"
+        time.sleep(0.05)
+    assert _ok(client.get(f"/api/jobs/{job['id']}"))["status"] == "succeeded"
+    assert_consistent()
+
+    # Il feed, applicato alle risorse lette all'inizio, riporta allo stato del database
+    seq, initial = feed_start
+    reset, events = change_feed.since(seq)
+    assert not reset
+    with SessionLocal() as db:
+        assert _feed_view(events, initial) == _resource_bus(db)